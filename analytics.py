@@ -0,0 +1,471 @@
+"""Columnar in-memory engine behind the /api/analytics endpoints (top items and customers, margins, period comparisons).
+
+Every line item is loaded once, joined with its invoice's date and customer and its
+item's category and HSN code, into one NumPy array per column. A query masks the
+lines in its date range and sums them per group with np.bincount, so top-k and margin
+reports cost a few vectorised passes over flat arrays instead of a SQL GROUP BY over
+three joined tables.
+
+The arrays are saved to SNAPSHOT_DIR (default: next to the database) as .npy files and
+memory-mapped on startup, so a restarted worker does not re-read SQLite, and the
+workers on one host share the pages. After that:
+
+- Line items with an id above the highest one loaded are appended as a small
+  in-memory segment (at most every `refresh_interval` seconds).
+- Invoices changed through the API (invoices_changed()) have their old lines masked
+  out and are reloaded on the next query.
+- Every `verify_interval` seconds the row count, sales total and summed invoice
+  versions of the loaded id range are compared with SQLite. A mismatch (an invoice edited by another process or
+  outside the API, or a reseeded database) triggers a full rebuild.
+- Once the appended segments hold COMPACT_ROWS rows, everything is written back as a
+  new snapshot.
+
+Profit and margin follow the dashboard's rule: quantity * (price_per_unit -
+purchase_price), using the purchase price stored on the line and counting only lines
+that have one.
+
+NumPy is imported by the functions that use it, so a process that never serves an
+analytics request does not load it (see bench_pdf_startup.py).
+
+    python analytics.py rebuild    # rebuild the snapshot from the database
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+DEFAULT_REFRESH_INTERVAL = 5
+DEFAULT_VERIFY_INTERVAL = 300
+LOAD_BATCH_SIZE = 100_000
+COMPACT_ROWS = 100_000  # rows in appended segments (or masked out) before the snapshot is rewritten
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MIN_DAY, MAX_DAY = -2 ** 31, 2 ** 31 - 1  # the range of the int32 day column
+
+# column -> dtype; one row per Invoice_Items row
+COLUMNS = {
+    'invoice_id': 'int32',
+    'day': 'int32',           # invoice date as days since 1970-01-01
+    'customer_id': 'int32',
+    'item_id': 'int32',
+    'category_id': 'int32',   # 0 when the item has no category
+    'hsn': 'int32',           # index into the store's hsn_codes
+    'quantity': 'float64',
+    'sales': 'float64',       # quantity * price_per_unit
+    'cost': 'float64',        # quantity * purchase_price, NaN when the purchase price is unknown
+    'version': 'int32',       # the invoice's version when the line was loaded
+}
+
+# ?by= value -> grouping column
+GROUPS = {'item': 'item_id', 'customer': 'customer_id', 'category': 'category_id', 'hsn': 'hsn'}
+METRICS = ('sales', 'profit', 'quantity', 'lines')
+
+LOAD_SQL = """
+    SELECT ii.id, ii.invoice_id, CAST(julianday(inv.date) - 2440587.5 AS INTEGER), inv.customer_id, ii.item_id,
+           COALESCE(i.category_id, 0), COALESCE(NULLIF(ii.hsn_code, ''), i.hsn_code, ''),
+           ii.quantity, ii.quantity * ii.price_per_unit, ii.quantity * ii.purchase_price, inv.version
+    FROM Invoice_Items ii
+    JOIN Invoices inv ON inv.id = ii.invoice_id
+    JOIN Items i ON i.id = ii.item_id
+    WHERE {line_filter}
+    ORDER BY ii.id
+"""
+
+# Same joins as LOAD_SQL, so line items left behind by a deleted invoice or item are not counted.
+# Every update bumps the invoice's version, so the version sum also catches edits that keep the totals.
+VERIFY_SQL = """
+    SELECT COUNT(*), TOTAL(ii.quantity * ii.price_per_unit), TOTAL(inv.version)
+    FROM Invoice_Items ii
+    JOIN Invoices inv ON inv.id = ii.invoice_id
+    JOIN Items i ON i.id = ii.item_id
+    WHERE ii.id <= ?
+"""
+
+LABEL_SQL = {
+    'item': "SELECT id, name FROM Items WHERE id IN (SELECT value FROM json_each(?))",
+    'customer': "SELECT id, name FROM Customers WHERE id IN (SELECT value FROM json_each(?))",
+    'category': "SELECT id, name FROM Categories WHERE id IN (SELECT value FROM json_each(?))",
+}
+
+
+def to_day(value, default):
+    """Days since 1970-01-01 for a YYYY-MM-DD string (None gives `default`)."""
+    if not value:
+        return default
+    return date.fromisoformat(value).toordinal() - EPOCH_ORDINAL
+
+
+class Segment:
+    """A run of rows: one array per column plus a mask of the rows still live (None: all of them)."""
+    __slots__ = ('arrays', 'live')
+
+    def __init__(self, arrays, live=None):
+        self.arrays = arrays
+        self.live = live
+
+    def __len__(self):
+        return len(self.arrays['day'])
+
+    def live_count(self):
+        import numpy as np
+        return len(self) if self.live is None else int(np.count_nonzero(self.live))
+
+    def live_arrays(self):
+        if self.live is None:
+            return self.arrays
+        return {name: column[self.live] for name, column in self.arrays.items()}
+
+
+class AnalyticsStore:
+    def __init__(self, snapshot_dir=None, refresh_interval=DEFAULT_REFRESH_INTERVAL,
+                 verify_interval=DEFAULT_VERIFY_INTERVAL):
+        self.snapshot_dir = snapshot_dir
+        self.refresh_interval = refresh_interval
+        self.verify_interval = verify_interval
+        self.hsn_codes = []     # hsn column value -> code
+        self._hsn_index = {}    # code -> hsn column value
+        self._segments = ()     # replaced, never mutated, so queries can read it without the lock
+        self._max_line_id = 0
+        self._changed = set()   # invoice ids to reload
+        self._refreshed_at = None
+        self._verified_at = None
+        self._loaded_from = None
+        self._build_seconds = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    # --- Loading ---
+
+    def ensure_fresh(self, connect):
+        """Loads the snapshot on first use, then applies new and changed lines (see the module docstring)."""
+        if not self._due():
+            return
+        with self._load_lock:
+            if not self._due():  # another thread refreshed while this one waited
+                return
+            conn = connect()
+            try:
+                if self._refreshed_at is None and not self._open_snapshot():
+                    self.rebuild(conn)
+                    return
+                self._refresh(conn)
+                if ((self._verified_at is None or time.monotonic() - self._verified_at >= self.verify_interval)
+                        and not self._verify(conn)):
+                    self.rebuild(conn)
+            finally:
+                conn.close()
+
+    def _due(self):
+        with self._lock:
+            return (self._refreshed_at is None or bool(self._changed)
+                    or time.monotonic() - self._refreshed_at >= self.refresh_interval)
+
+    def invoices_changed(self, invoice_ids):
+        """Marks invoices written through the API; their lines are reloaded before the next query."""
+        with self._lock:
+            self._changed.update(invoice_ids)
+
+    def rebuild(self, conn):
+        """Reloads every line item from SQLite and writes a new snapshot."""
+        start = time.perf_counter()
+        with self._lock:
+            self._changed.clear()
+        arrays, max_line_id = self._load(conn, "ii.id > ?", (0,))
+        self._replace([Segment(arrays)], max_line_id)
+        self._verified_at = time.monotonic()
+        self._build_seconds = round(time.perf_counter() - start, 3)
+        self._loaded_from = 'database'
+        self._save()
+
+    def _refresh(self, conn):
+        import numpy as np
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        segments = list(self._segments)
+        if changed:
+            changed_ids = np.fromiter(changed, dtype=np.int64, count=len(changed))
+            for position, segment in enumerate(segments):
+                stale = np.isin(segment.arrays['invoice_id'], changed_ids)
+                if stale.any():
+                    live = ~stale if segment.live is None else segment.live & ~stale
+                    segments[position] = Segment(segment.arrays, live)
+        arrays, max_line_id = self._load(conn, "ii.id > ?", (self._max_line_id,))
+        if changed:
+            # Lines above the old maximum were just read; the second query only takes the ones below it.
+            reloaded, _ = self._load(conn, "ii.invoice_id IN (SELECT value FROM json_each(?)) AND ii.id <= ?",
+                                     (json.dumps(sorted(changed)), self._max_line_id))
+            arrays = {name: np.concatenate((reloaded[name], arrays[name])) for name in COLUMNS}
+        if len(arrays['day']):
+            segments.append(Segment(arrays))
+        self._replace(segments, max(max_line_id, self._max_line_id))
+
+        appended = sum(len(segment) for segment in segments[1:])
+        masked = sum(len(segment) - segment.live_count() for segment in segments)
+        if appended + masked >= COMPACT_ROWS:
+            self._replace([Segment(self._concatenate(segments))], self._max_line_id)
+            self._save()
+
+    def _load(self, conn, line_filter, params):
+        """Reads the matching line items into column arrays; returns (arrays, highest line id read)."""
+        import numpy as np
+        chunks = {name: [] for name in COLUMNS}
+        max_line_id = 0
+        cursor = conn.cursor()
+        cursor.row_factory = None  # plain tuples; zip(*rows) below transposes them into columns
+        cursor.execute(LOAD_SQL.format(line_filter=line_filter), params)
+        while True:
+            rows = cursor.fetchmany(LOAD_BATCH_SIZE)
+            if not rows:
+                break
+            (line_ids, invoice_ids, days, customer_ids, item_ids, category_ids, hsn_codes,
+             quantities, sales, costs, versions) = zip(*rows)
+            max_line_id = max(max_line_id, line_ids[-1])
+            chunks['invoice_id'].append(np.array(invoice_ids, dtype=np.int32))
+            chunks['day'].append(np.array(days, dtype=np.int32))
+            chunks['customer_id'].append(np.array(customer_ids, dtype=np.int32))
+            chunks['item_id'].append(np.array(item_ids, dtype=np.int32))
+            chunks['category_id'].append(np.array(category_ids, dtype=np.int32))
+            chunks['hsn'].append(np.array([self._hsn_code(code) for code in hsn_codes], dtype=np.int32))
+            chunks['quantity'].append(np.array(quantities, dtype=np.float64))
+            chunks['sales'].append(np.array(sales, dtype=np.float64))
+            # None (no purchase price) becomes NaN
+            chunks['cost'].append(np.array(costs, dtype=np.float64))
+            chunks['version'].append(np.array(versions, dtype=np.int32))
+        arrays = {name: np.concatenate(parts) if parts else np.empty(0, dtype=COLUMNS[name])
+                  for name, parts in chunks.items()}
+        return arrays, max_line_id
+
+    def _hsn_code(self, code):
+        index = self._hsn_index.get(code)
+        if index is None:
+            with self._lock:
+                index = self._hsn_index[code] = len(self.hsn_codes)
+                self.hsn_codes.append(code)
+        return index
+
+    def _verify(self, conn):
+        """Whether the loaded id range still matches SQLite (same row count, sales total and invoice versions)."""
+        import numpy as np
+        self._verified_at = time.monotonic()
+        count, total, versions = conn.execute(VERIFY_SQL, (self._max_line_id,)).fetchone()
+        live = [segment.live_arrays() for segment in self._segments]
+        loaded = sum(len(arrays['day']) for arrays in live)
+        loaded_total = sum(float(np.sum(arrays['sales'])) for arrays in live)
+        loaded_versions = sum(int(np.sum(arrays['version'], dtype=np.int64)) for arrays in live)
+        return (count == loaded and versions == loaded_versions
+                and abs(total - loaded_total) <= 0.01 + abs(total) * 1e-9)
+
+    def _replace(self, segments, max_line_id):
+        with self._lock:
+            self._segments = tuple(segments)
+            self._max_line_id = max_line_id
+            self._refreshed_at = time.monotonic()
+
+    @staticmethod
+    def _concatenate(segments):
+        import numpy as np
+        live = [segment.live_arrays() for segment in segments]
+        return {name: np.concatenate([arrays[name] for arrays in live]) for name in COLUMNS}
+
+    # --- Snapshot ---
+
+    def _meta_path(self):
+        return os.path.join(self.snapshot_dir, 'meta.json')
+
+    def _save(self):
+        import numpy as np
+        if not self.snapshot_dir:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        arrays = self._concatenate(self._segments)
+        generation = f'{time.time_ns()}-{os.getpid()}'
+        for name, column in arrays.items():
+            np.save(os.path.join(self.snapshot_dir, f'{name}.{generation}.npy'), column)
+        meta = {'generation': generation, 'rows': len(arrays['day']), 'max_line_id': self._max_line_id,
+                'hsn_codes': list(self.hsn_codes)}
+        temp_path = f'{self._meta_path()}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self._meta_path())
+        # Workers that still map an older generation keep their pages until they reload.
+        for filename in os.listdir(self.snapshot_dir):
+            if filename.endswith('.npy') and generation_key(filename.split('.')[-2]) < generation_key(generation):
+                try:
+                    os.remove(os.path.join(self.snapshot_dir, filename))
+                except OSError:
+                    pass
+        # Reopen the files just written, so the data is the shared, memory-mapped copy.
+        self._open_snapshot()
+
+    def _open_snapshot(self):
+        """Memory-maps the saved snapshot; returns False if there is none (or it is incomplete)."""
+        import numpy as np
+        if not self.snapshot_dir:
+            return False
+        try:
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(self.snapshot_dir, f"{name}.{meta['generation']}.npy"), mmap_mode='r')
+                      for name in COLUMNS}
+        except (OSError, ValueError, KeyError):
+            return False
+        if any(len(column) != meta['rows'] for column in arrays.values()):
+            return False
+        with self._lock:
+            self.hsn_codes = list(meta['hsn_codes'])
+            self._hsn_index = {code: index for index, code in enumerate(self.hsn_codes)}
+        self._replace([Segment(arrays)], meta['max_line_id'])
+        if self._loaded_from is None:
+            self._loaded_from = 'snapshot'
+            # The database may have changed while no process was running; check before first use.
+            self._verified_at = None
+        return True
+
+    # --- Queries ---
+
+    def group_totals(self, by, start_date=None, end_date=None):
+        """Sums the lines dated start_date..end_date (inclusive, YYYY-MM-DD; None leaves that side open) per group.
+
+        Returns (keys, totals): the sorted group keys that have lines in the range, and a
+        dict of arrays aligned with them: lines, quantity, sales, costed_sales (sales of
+        the lines with a purchase price), cost and profit.
+        """
+        import numpy as np
+        column = GROUPS[by]
+        start, end = to_day(start_date, MIN_DAY), to_day(end_date, MAX_DAY)
+        parts = {name: [] for name in (column, 'quantity', 'sales', 'cost')}
+        for segment in self._segments:
+            days = segment.arrays['day']
+            mask = (days >= start) & (days <= end)
+            if segment.live is not None:
+                mask &= segment.live
+            for name in parts:
+                parts[name].append(segment.arrays[name][mask])
+        values = {name: np.concatenate(chunks) if chunks else np.empty(0, dtype=COLUMNS[name])
+                  for name, chunks in parts.items()}
+
+        codes = values[column].astype(np.int64)
+        size = int(codes.max()) + 1 if len(codes) else 0
+        costed = ~np.isnan(values['cost'])
+        lines = np.bincount(codes, minlength=size)
+        costed_sales = np.bincount(codes[costed], weights=values['sales'][costed], minlength=size)
+        cost = np.bincount(codes[costed], weights=values['cost'][costed], minlength=size)
+        keys = np.flatnonzero(lines)
+        return keys, {
+            'lines': lines[keys],
+            'quantity': np.bincount(codes, weights=values['quantity'], minlength=size)[keys],
+            'sales': np.bincount(codes, weights=values['sales'], minlength=size)[keys],
+            'costed_sales': costed_sales[keys],
+            'cost': cost[keys],
+            'profit': (costed_sales - cost)[keys],
+        }
+
+    def top(self, by, metric='sales', start_date=None, end_date=None, limit=10):
+        """The `limit` groups with the highest `metric` in the date range, as report rows (best first)."""
+        keys, totals = self.group_totals(by, start_date, end_date)
+        order = top_positions(totals[metric], limit)
+        return [report_row(int(keys[position]), totals, position) for position in order]
+
+    def compare(self, by, current, previous, metric='sales', limit=10):
+        """The top `limit` groups of the `current` (start, end) range by `metric`, next to their `previous` figures.
+
+        Also returns the overall totals of both ranges: (rows, current_totals, previous_totals).
+        """
+        import numpy as np
+        keys, totals = self.group_totals(by, *current)
+        previous_keys, previous_totals = self.group_totals(by, *previous)
+        rows = []
+        for position in top_positions(totals[metric], limit):
+            key = int(keys[position])
+            row = report_row(key, totals, position)
+            found = np.searchsorted(previous_keys, key)
+            previous_row = None
+            if found < len(previous_keys) and previous_keys[found] == key:
+                previous_row = report_row(key, previous_totals, found)
+                del previous_row['key']
+            previous_value = previous_row[metric] if previous_row else 0
+            row['previous'] = previous_row
+            row['change_pct'] = round((row[metric] - previous_value) / previous_value * 100, 1) if previous_value else None
+            rows.append(row)
+        return rows, summary(totals), summary(previous_totals)
+
+    def labels(self, conn, by, keys):
+        """Display names for group keys: item, customer and category names, or the HSN code."""
+        if by == 'hsn':
+            return {key: self.hsn_codes[key] or 'Unknown' for key in keys}
+        names = {row[0]: row[1] for row in conn.execute(LABEL_SQL[by], (json.dumps(list(keys)),))}
+        if by == 'category':
+            names.setdefault(0, 'Uncategorised')
+        return names
+
+    def stats(self):
+        segments = self._segments
+        return {
+            'rows': sum(len(segment) for segment in segments),
+            'live_rows': sum(segment.live_count() for segment in segments),
+            'segments': len(segments),
+            'max_line_id': self._max_line_id,
+            'loaded_from': self._loaded_from,
+            'build_seconds': self._build_seconds,
+            'snapshot_dir': self.snapshot_dir,
+        }
+
+
+def generation_key(generation):
+    """Sort key of a snapshot generation (`<time_ns>-<pid>`), so a save only removes older files."""
+    written_at, _, pid = generation.partition('-')
+    return int(written_at), int(pid or 0)
+
+
+def top_positions(values, limit):
+    """Positions of the `limit` largest values, largest first."""
+    import numpy as np
+    if len(values) > limit:
+        candidates = np.argpartition(-values, limit - 1)[:limit]
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+def report_row(key, totals, position):
+    costed_sales = float(totals['costed_sales'][position])
+    profit = float(totals['profit'][position])
+    return {
+        'key': key,
+        'lines': int(totals['lines'][position]),
+        'quantity': round(float(totals['quantity'][position]), 3),
+        'sales': round(float(totals['sales'][position]), 2),
+        'profit': round(profit, 2),
+        'margin_pct': round(profit / costed_sales * 100, 2) if costed_sales else None,
+    }
+
+
+def summary(totals):
+    import numpy as np
+    costed_sales = float(np.sum(totals['costed_sales']))
+    profit = float(np.sum(totals['profit']))
+    return {
+        'lines': int(np.sum(totals['lines'])),
+        'sales': round(float(np.sum(totals['sales'])), 2),
+        'profit': round(profit, 2),
+        'margin_pct': round(profit / costed_sales * 100, 2) if costed_sales else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain the analytics snapshot.')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--db', default='invoice_app.db', help='Path to the SQLite database')
+    parser.add_argument('--snapshot-dir', help='Where to write the snapshot (default: <db>.analytics)')
+    args = parser.parse_args()
+
+    store = AnalyticsStore(args.snapshot_dir or f'{args.db}.analytics')
+    conn = sqlite3.connect(f'file:{args.db}?mode=ro', uri=True)
+    store.rebuild(conn)
+    conn.close()
+    stats = store.stats()
+    print(f"✅ Rebuilt the analytics snapshot ({stats['rows']} line items in {stats['build_seconds']}s) "
+          f"in {store.snapshot_dir}.")
@@ -0,0 +1,227 @@
+"""ASGI (asyncio) variant of the API: `uvicorn asgi:app --port 8000`.
+
+The short, frequent reads the invoice editor and dashboard make are served by async
+handlers: invoice listing and details, customer details and ledger, item search,
+suggest, units, prefixes, the next invoice number and the sales figures. The
+synchronous PDF route is served the same way. While one of these requests waits on SQLite or on a PDF render,
+the event loop keeps answering the others, so a few slow requests cannot hold every
+worker thread the way they can with server.py's thread-per-request model.
+
+- SQLite calls run on db_executor, a dedicated thread pool (ASGI_DB_THREADS, by default
+  DB_POOL_SIZE threads) using server.py's connection pools, loaders and caches. sqlite3
+  has no non-blocking mode, so an async driver would also run the queries on threads.
+- PDF renders are awaited on pdf_service's process pool, which takes the CPU-heavy
+  layout off the event loop and out of the GIL.
+- Every other route (writes, bulk import, exports, PDF jobs, /metrics, ...) is passed
+  to the Flask app from server.py, running on its own thread pool (ASGI_FLASK_THREADS).
+  A slow export therefore never takes a thread the native handlers need.
+
+Both halves share one process, so caches, the suggest index and PDF jobs stay
+consistent between them. The native routes are timed under the same /metrics
+histogram as the Flask ones, labelled with their Starlette path pattern.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import metrics
+import server
+from invoice_store import peek_invoice_number
+
+DB_THREADS = int(os.environ.get('ASGI_DB_THREADS', server.DB_POOL_SIZE))
+FLASK_THREADS = int(os.environ.get('ASGI_FLASK_THREADS', 16))
+
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='asgi-db')
+
+
+# --- Helpers ---
+
+def read(func, *args):
+    """Calls func(conn, *args) with a connection from the read-only pool."""
+    conn = server.reader_pool.acquire()
+    try:
+        return func(conn, *args)
+    finally:
+        conn.close()
+
+async def run_db(func, *args):
+    """Runs a blocking call that uses SQLite on db_executor and waits for it without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, func, *args)
+
+def error(message, status_code):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+def etag_matches(request, etag):
+    """Whether the request's If-None-Match lists `etag` (or is *)."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix('W/').strip('"') for tag in header.split(',')]
+    return '*' in tags or etag in tags
+
+async def reference_response(request, cache, key=None):
+    """Async counterpart of server.reference_response()."""
+    entry = await run_db(cache.entry, server.reader_pool.acquire, key)
+    headers = {'ETag': f'"{entry.etag}"', 'Cache-Control': 'private, no-cache'}
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type='application/json', headers=headers)
+
+
+# --- API Endpoints ---
+
+async def get_invoices(request):
+    args = request.query_params
+    stream_format = args.get('format')
+    if stream_format and stream_format not in server.STREAM_FORMATS:
+        return error(f"Invalid format; expected one of: {', '.join(server.STREAM_FORMATS)}", 400)
+    if stream_format and not server.is_paginated_listing(args):
+        query, params = server.invoice_listing_query(args)
+        encode, mimetype = server.STREAM_FORMATS[stream_format]
+        # Starlette pulls the rows from this (blocking) generator on its own thread pool.
+        return StreamingResponse(server.iter_query(query, params, encode), media_type=mimetype)
+    try:
+        return JSONResponse(await run_db(read, server.list_invoices, args))
+    except ValueError as e:
+        return error(str(e), 400)
+
+async def get_invoice_details(request):
+    details = await run_db(read, server.load_invoice_details, request.path_params['invoice_id'])
+    if details is None:
+        return error('Invoice not found', 404)
+    return JSONResponse(details)
+
+async def generate_invoice_pdf(request):
+    theme = request.query_params.get('theme', 'default')
+    if theme not in server.PDF_THEMES:
+        return PlainTextResponse("Invalid theme selected", 400)
+    template_name = server.PDF_THEMES[theme]
+    invoice_id = request.path_params['invoice_id']
+
+    data = await run_db(server.get_pdf_data, invoice_id)
+    if not data:
+        return PlainTextResponse("Invoice not found", 404)
+
+    etag, headers = server.pdf_response_headers(template_name, data)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    pdf = server.pdf_cache.get(invoice_id, etag)
+    if pdf is None:
+        pdf = await server.pdf_service.render_async(template_name, data)
+        server.pdf_cache.put(invoice_id, etag, pdf)
+    return Response(pdf, media_type='application/pdf', headers=headers)
+
+async def get_customer(request):
+    customer = await run_db(read, server.load_customer, request.path_params['customer_id'])
+    if customer is None:
+        return error('Customer not found', 404)
+    return JSONResponse(customer)
+
+async def get_customer_ledger(request):
+    try:
+        ledger = await run_db(read, server.load_customer_ledger, request.path_params['customer_id'], request.query_params)
+    except ValueError as e:
+        return error(str(e), 400)
+    if ledger is None:
+        return error('Customer not found', 404)
+    return JSONResponse(ledger)
+
+async def get_items(request):
+    return await reference_response(request, server.item_search, request.query_params.get('search', '').strip().lower())
+
+async def suggest(request):
+    try:
+        index, query, limit, seq = server.parse_suggest_args(request.query_params)
+    except ValueError as e:
+        return error(str(e), 400)
+    results = await run_db(server.suggest_matches, index, query, limit)
+    return JSONResponse({'seq': seq, 'q': query, 'results': results})
+
+async def get_units(request):
+    return await reference_response(request, server.units)
+
+async def get_invoice_prefixes(request):
+    return await reference_response(request, server.invoice_prefixes)
+
+async def get_latest_invoice_number(request):
+    prefix = request.query_params.get('prefix')
+    if not prefix:
+        return error('Prefix is required', 400)
+    next_num = await run_db(read, peek_invoice_number, prefix)
+    return JSONResponse({'next_number': f"{next_num:04d}"})
+
+async def get_sales_data(request):
+    return JSONResponse(await run_db(server.sales_data, request.query_params))
+
+async def get_financial_year_summary(request):
+    return JSONResponse(await run_db(server.financial_year_summary))
+
+
+# --- Metrics ---
+
+class RequestTimer:
+    """Times the natively served routes for /metrics; the Flask app times the requests it handles."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = []
+
+        async def send_and_record(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            await send(message)
+
+        await self.app(scope, receive, send_and_record)
+        route = scope.get('route')
+        if isinstance(route, Route) and status:
+            metrics.http_requests.observe((scope['method'], route.path, str(status[0])), time.perf_counter() - start)
+
+
+# --- App Setup ---
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    db_executor.shutdown(wait=False)
+    server.pdf_service.shutdown()
+
+routes = [
+    Route('/api/invoices', get_invoices, methods=['GET']),
+    Route('/api/invoices/{invoice_id:int}', get_invoice_details, methods=['GET']),
+    Route('/api/invoices/{invoice_id:int}/pdf', generate_invoice_pdf, methods=['GET']),
+    Route('/api/customers/{customer_id:int}', get_customer, methods=['GET']),
+    Route('/api/customers/{customer_id:int}/ledger', get_customer_ledger, methods=['GET']),
+    Route('/api/items', get_items, methods=['GET']),
+    Route('/api/suggest', suggest, methods=['GET']),
+    Route('/api/units', get_units, methods=['GET']),
+    Route('/api/invoice_prefixes', get_invoice_prefixes, methods=['GET']),
+    Route('/api/latest_invoice_number', get_latest_invoice_number, methods=['GET']),
+    Route('/api/sales_data', get_sales_data, methods=['GET']),
+    Route('/api/financial_year_summary', get_financial_year_summary, methods=['GET']),
+    # Requests the routes above do not take (including other methods on the same paths) go to Flask.
+    Mount('/', app=WSGIMiddleware(server.app, workers=FLASK_THREADS)),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(RequestTimer),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,144 @@
+"""Benchmark: /api/analytics reports from analytics.py's column arrays vs the same GROUP BY in SQLite.
+
+Seeds a throwaway database like load_test.py (or uses --db), then times each report
+both ways: a SQL GROUP BY over Invoice_Items joined with Invoices and Items, and
+AnalyticsStore's masked np.bincount. Also times the engine's full build, reopening the
+memory-mapped snapshot, and the incremental refresh after new invoices.
+
+    python benchmarks/bench_analytics.py --invoices 500000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from load_test import build_database
+
+import analytics  # noqa: E402 (load_test puts the repo root on sys.path)
+
+GROUP_SQL = {
+    'item': 'ii.item_id',
+    'customer': 'inv.customer_id',
+    'category': 'COALESCE(i.category_id, 0)',
+    'hsn': "COALESCE(NULLIF(ii.hsn_code, ''), i.hsn_code, '')",
+}
+METRIC_SQL = {
+    'sales': 'TOTAL(ii.quantity * ii.price_per_unit)',
+    'profit': 'TOTAL(CASE WHEN ii.purchase_price IS NOT NULL THEN ii.quantity * (ii.price_per_unit - ii.purchase_price) END)',
+}
+
+REPORTS = [
+    # (name, by, metric, date range given as months back from the latest invoice: None = all time)
+    ('top items, all time', 'item', 'sales', None),
+    ('top items, last month', 'item', 'profit', 1),
+    ('top customers, last year', 'customer', 'sales', 12),
+    ('margin by category, last quarter', 'category', 'profit', 3),
+    ('margin by hsn, all time', 'hsn', 'profit', None),
+]
+
+
+def sql_report(conn, by, metric, start_date, end_date, limit):
+    return conn.execute(f"""
+        SELECT {GROUP_SQL[by]} AS grp, COUNT(*), {METRIC_SQL['sales']}, {METRIC_SQL['profit']}
+        FROM Invoice_Items ii
+        JOIN Invoices inv ON inv.id = ii.invoice_id
+        JOIN Items i ON i.id = ii.item_id
+        WHERE inv.date BETWEEN ? AND ?
+        GROUP BY grp ORDER BY {METRIC_SQL[metric]} DESC LIMIT ?
+    """, (start_date, end_date, limit)).fetchall()
+
+
+def best_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def months_back(latest, months):
+    year, month = int(latest[:4]), int(latest[5:7]) - months + 1
+    while month < 1:
+        year, month = year - 1, month + 12
+    return f'{year:04d}-{month:02d}-01'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='use this database instead of seeding one')
+    parser.add_argument('--invoices', type=int, default=200_000)
+    parser.add_argument('--customers', type=int, default=5_000)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db
+        if not db_file:
+            db_file = os.path.join(tmp, 'analytics.db')
+            print(f'Seeding {args.invoices:,} invoices...')
+            build_database(db_file, args)
+        conn = sqlite3.connect(db_file)
+        snapshot_dir = os.path.join(tmp, 'snapshot')
+
+        store = analytics.AnalyticsStore(snapshot_dir)
+        start = time.perf_counter()
+        store.ensure_fresh(lambda: sqlite3.connect(db_file))
+        build_ms = (time.perf_counter() - start) * 1000
+        reopened = analytics.AnalyticsStore(snapshot_dir)
+        start = time.perf_counter()
+        reopened.ensure_fresh(lambda: sqlite3.connect(db_file))
+        open_ms = (time.perf_counter() - start) * 1000
+        stats = store.stats()
+        print(f"\n{stats['rows']:,} line items: full build {build_ms:.0f} ms, "
+              f"snapshot open (with its consistency check) {open_ms:.0f} ms")
+
+        latest = conn.execute("SELECT MAX(date) FROM Invoices").fetchone()[0]
+        print(f"\n{'report':<36}{'SQL ms':>10}{'numpy ms':>10}{'speedup':>9}")
+        for name, by, metric, months in REPORTS:
+            start_date = months_back(latest, months) if months else '0001-01-01'
+            end_date = latest if months else '9999-12-31'
+            sql_ms = best_ms(lambda: sql_report(conn, by, metric, start_date, end_date, args.limit), args.repeat)
+            numpy_ms = best_ms(lambda: store.top(by, metric, start_date, end_date, args.limit), args.repeat)
+            expected = [round(row[2 if metric == 'sales' else 3], 2) for row in sql_report(
+                conn, by, metric, start_date, end_date, args.limit)]
+            got = [row[metric] for row in store.top(by, metric, start_date, end_date, args.limit)]
+            if any(abs(a - b) > 0.01 for a, b in zip(expected, got)) or len(expected) != len(got):
+                sys.exit(f'{name}: results differ\nSQL:   {expected}\nnumpy: {got}')
+            print(f'{name:<36}{sql_ms:>10.1f}{numpy_ms:>10.1f}{sql_ms / max(numpy_ms, 1e-6):>8.1f}x')
+
+        # Incremental refresh: copy the last 100 invoices' lines as new invoices and time picking them up.
+        with conn:
+            conn.execute("""
+                INSERT INTO Invoices (invoice_no, date, customer_id, sale_type, total_value, taxable_value,
+                                      cgst, sgst, igst, cess, round_off, status)
+                SELECT 'BENCH-' || id, date, customer_id, sale_type, total_value, taxable_value,
+                       cgst, sgst, igst, cess, round_off, status
+                FROM Invoices ORDER BY id DESC LIMIT 100
+            """)
+            conn.execute("""
+                INSERT INTO Invoice_Items (invoice_id, item_id, quantity, free_quantity, unit, price_per_unit, discount,
+                                           gst_rate, cgst_amount, sgst_amount, igst_amount, cess_amount, total_amount,
+                                           hsn_code, is_reverse_charge, purchase_price)
+                SELECT new.id, ii.item_id, ii.quantity, ii.free_quantity, ii.unit, ii.price_per_unit, ii.discount,
+                       ii.gst_rate, ii.cgst_amount, ii.sgst_amount, ii.igst_amount, ii.cess_amount, ii.total_amount,
+                       ii.hsn_code, ii.is_reverse_charge, ii.purchase_price
+                FROM Invoices new
+                JOIN Invoices old ON 'BENCH-' || old.id = new.invoice_no
+                JOIN Invoice_Items ii ON ii.invoice_id = old.id
+            """)
+        store.refresh_interval = 0
+        start = time.perf_counter()
+        store.ensure_fresh(lambda: sqlite3.connect(db_file))
+        print(f"\nIncremental refresh after 100 new invoices: {(time.perf_counter() - start) * 1000:.1f} ms "
+              f"({store.stats()['segments']} segments)")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Tail latency of short API requests under mixed load: Flask under gunicorn vs asgi.py under uvicorn.
+
+Seeds a throwaway database like load_test.py (or uses --db), then for each server runs
+two groups of clients at the same time against it:
+
+- --slow-clients threads that keep requesting slow routes: synchronous PDF renders,
+  CSV exports and the full streamed invoice listing;
+- --short-clients threads doing the editor's and dashboard's quick calls: suggest,
+  invoice and customer lookups, the first listing page, units, sales figures.
+
+It reports p50/p95/p99 of the short requests (overall and per endpoint) and the slow
+routes' throughput. Flask runs under gunicorn's pdf profile (one worker whose threads hand
+renders to the process pool, see gunicorn.conf.py) and asgi.py under a single uvicorn
+worker, so both render PDFs on the same kind of pool and the difference is in how
+requests wait.
+
+    python benchmarks/bench_asgi_tail.py --invoices 100000 --slow-clients 8 --short-clients 8
+
+PDF scenarios need WeasyPrint; pass --no-pdf to leave them out.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from load_test import ROOT, SCENARIOS, build_database, free_port, load_sample, run_load, summarize
+
+SHORT_SCENARIOS = ('invoices.page', 'invoices.get', 'customers.get', 'items.search', 'suggest.customers',
+                   'suggest.items', 'units', 'invoice_prefixes', 'latest_invoice_number', 'sales_data',
+                   'financial_year_summary')
+SLOW_SCENARIOS = [
+    # (name, weight, kind, builder, expected statuses), as in load_test.SCENARIOS
+    ('invoices.stream', 1, 'read', lambda s, r: ('GET', '/api/invoices?format=ndjson', None), (200,)),
+] + [scenario for scenario in SCENARIOS if scenario[0] in ('pdf', 'exports.invoices', 'exports.hsn_summary')]
+
+SERVERS = {
+    # name: (command, extra environment)
+    'flask': (lambda port: [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+              {'SERVER_PROFILE': 'pdf'}),
+    'asgi': (lambda port: [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port), '--no-access-log'],
+             {'PDF_WARMUP': '1'}),
+}
+
+
+def start_server(name, db_file):
+    port = free_port()
+    command, env = SERVERS[name]
+    process = subprocess.Popen(command(port), cwd=ROOT, env=dict(os.environ, INVOICE_DB=db_file, **env),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f'{name} server exited during startup')
+        try:
+            client = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            client.request('GET', '/api/units')
+            client.getresponse().read()
+            client.close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit(f'{name} server did not start within 60 seconds')
+
+
+def mixed_load(base_url, sample, short, slow, args):
+    """Runs the short and slow client groups side by side; returns both results."""
+    results = {}
+
+    def group(key, scenarios, concurrency, seed):
+        results[key] = run_load(base_url, scenarios, sample, concurrency, args.duration, seed)
+
+    threads = [threading.Thread(target=group, args=('short', short, args.short_clients, args.seed)),
+               threading.Thread(target=group, args=('slow', slow, args.slow_clients, args.seed + 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results['short'], results['slow']
+
+
+def measure(name, db_file, short, slow, args):
+    process, base_url = start_server(name, db_file)
+    try:
+        sample = load_sample(db_file, base_url, random.Random(args.seed))
+        if args.warmup:
+            saved, args.duration = args.duration, args.warmup
+            mixed_load(base_url, sample, short, slow, args)
+            args.duration = saved
+        short_results, slow_results = mixed_load(base_url, sample, short, slow, args)
+    finally:
+        process.terminate()
+        process.wait()
+
+    ok = {scenario[0]: scenario[4] for scenario in short + slow}
+    short_samples = [value for values in short_results.values() for value in values]
+    slow_samples = [value for values in slow_results.values() for value in values]
+    return {
+        'short': summarize(short_samples, (200,), args.duration),
+        'short_endpoints': {key: summarize(values, ok[key], args.duration) for key, values in short_results.items()},
+        'slow': summarize(slow_samples, (200,), args.duration),
+    }
+
+
+def print_results(results):
+    print(f"\n{'short requests':<26}{'reqs':>8}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, report in results.items():
+        stats = report['short']
+        print(f"{name:<26}{stats['requests']:>8}{stats['errors']:>6}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+    print(f"\n{'p99 ms by endpoint':<26}" + ''.join(f'{name:>10}' for name in results))
+    for endpoint in SHORT_SCENARIOS:
+        cells = [results[name]['short_endpoints'].get(endpoint) for name in results]
+        if all(cells):
+            print(f'{endpoint:<26}' + ''.join(f"{stats['p99_ms']:>10.2f}" for stats in cells))
+    print(f"\n{'slow requests':<26}{'reqs':>8}{'errs':>6}{'rps':>9}{'p50 ms':>10}")
+    for name, report in results.items():
+        stats = report['slow']
+        print(f"{name:<26}{stats['requests']:>8}{stats['errors']:>6}{stats['throughput_rps']:>9.1f}{stats['p50_ms']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='use this database instead of seeding one')
+    parser.add_argument('--invoices', type=int, default=100_000)
+    parser.add_argument('--customers', type=int, default=5_000)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--short-clients', type=int, default=8)
+    parser.add_argument('--slow-clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of measured load per server')
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--no-pdf', action='store_true', help='leave PDF renders out of the slow mix')
+    parser.add_argument('--servers', default=','.join(SERVERS), help='comma-separated: %(default)s')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    short = [scenario for scenario in SCENARIOS if scenario[0] in SHORT_SCENARIOS]
+    slow = [scenario for scenario in SLOW_SCENARIOS if not (args.no_pdf and scenario[2] == 'pdf')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db
+        if not db_file:
+            db_file = os.path.join(tmp, 'load.db')
+            print(f'Seeding {args.invoices:,} invoices...')
+            build_database(db_file, args)
+        results = {}
+        for name in args.servers.split(','):
+            print(f'Measuring {name} ({args.short_clients} short + {args.slow_clients} slow clients, {args.duration:g}s)...')
+            results[name] = measure(name, db_file, short, slow, args)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
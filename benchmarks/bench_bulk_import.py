@@ -0,0 +1,109 @@
+"""Benchmark: bulk invoice import vs one POST /api/invoices per invoice.
+
+Seeds a throwaway database, then imports the same generated invoices through the
+single-invoice endpoint, the bulk endpoint as a JSON array and the bulk endpoint as
+NDJSON at a few chunk sizes, and reports invoices/second for each.
+
+    python benchmarks/bench_bulk_import.py --invoices 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import seed_database  # noqa: E402
+
+
+def build_database(db_file):
+    seed_database.DB_FILE = db_file
+    seed_database.SCHEMA_FILE = os.path.join(ROOT, 'schema.sql')
+    seed_database.NUM_CUSTOMERS = 500
+    seed_database.random.seed(7)
+    if not seed_database.apply_schema():
+        sys.exit(1)
+    conn = seed_database.get_db_connection()
+    seed_database.seed_base_data(conn.cursor())
+    conn.commit()
+    conn.close()
+
+
+def generate_invoices(count, customer_ids, items, rng):
+    invoices = []
+    for n in range(count):
+        lines = []
+        for item in rng.sample(items, rng.randint(1, 5)):
+            quantity = rng.randint(1, 4)
+            taxable = round(item['default_sale_price'] * quantity, 2)
+            half_tax = round(taxable * item['default_tax_rate'] / 200, 2)
+            lines.append({
+                'item_id': item['id'], 'quantity': quantity, 'unit': 'PCS',
+                'price_per_unit': item['default_sale_price'], 'gst_rate': item['default_tax_rate'],
+                'cgst_amount': half_tax, 'sgst_amount': half_tax, 'total_amount': round(taxable + 2 * half_tax, 2),
+            })
+        taxable_value = round(sum(line['total_amount'] - 2 * line['cgst_amount'] for line in lines), 2)
+        cgst = round(sum(line['cgst_amount'] for line in lines), 2)
+        invoices.append({
+            'date': f"2025-{rng.randint(4, 12):02d}-{rng.randint(1, 28):02d}",
+            'customer_id': rng.choice(customer_ids), 'sale_type': 'CASH',
+            'taxable_value': taxable_value, 'cgst': cgst, 'sgst': cgst, 'round_off': 0,
+            'total_value': round(taxable_value + 2 * cgst, 2), 'items': lines,
+        })
+    return invoices
+
+
+def report(label, count, seconds):
+    print(f"{label:<32} {count:>7} invoices {seconds:>8.2f}s {count / seconds:>10.0f} invoices/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--invoices', type=int, default=2000)
+    parser.add_argument('--single', type=int, default=500, help='invoices to send one request at a time')
+    parser.add_argument('--chunk-sizes', default='100,500,2000')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_file = os.path.join(workdir, 'invoice_app.db')
+        build_database(db_file)
+        os.environ['INVOICE_DB'] = db_file
+        import server
+
+        client = server.app.test_client()
+        conn = server.get_db_connection(readonly=True)
+        customer_ids = [row['id'] for row in conn.execute("SELECT id FROM Customers")]
+        items = [dict(row) for row in conn.execute("SELECT id, default_sale_price, default_tax_rate FROM Items")]
+        conn.close()
+        rng = random.Random(7)
+
+        invoices = generate_invoices(args.single, customer_ids, items, rng)
+        start = time.perf_counter()
+        for n, invoice in enumerate(invoices):
+            response = client.post('/api/invoices', json=dict(invoice, invoice_no=f'SINGLE/{n:06d}'))
+            assert response.status_code == 201, response.get_json()
+        report('POST /api/invoices (one each)', len(invoices), time.perf_counter() - start)
+
+        for chunk_size in map(int, args.chunk_sizes.split(',')):
+            for body_format in ('json', 'ndjson'):
+                prefix = f'{body_format.upper()}{chunk_size}/'
+                invoices = generate_invoices(args.invoices, customer_ids, items, rng)
+                if body_format == 'json':
+                    body, content_type = json.dumps(invoices), 'application/json'
+                else:
+                    body, content_type = '\n'.join(map(json.dumps, invoices)), 'application/x-ndjson'
+                start = time.perf_counter()
+                response = client.post(f'/api/invoices/bulk?prefix={prefix}&chunk_size={chunk_size}',
+                                       data=body, content_type=content_type)
+                elapsed = time.perf_counter() - start
+                summary = response.get_json()
+                assert summary['imported'] == len(invoices), summary['errors'][:5]
+                report(f'bulk {body_format}, chunk {chunk_size}', len(invoices), elapsed)
+
+
+if __name__ == '__main__':
+    main()
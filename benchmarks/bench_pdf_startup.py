@@ -0,0 +1,77 @@
+"""Benchmark: first-PDF latency after a restart, cold vs warmed up (PDF_WARMUP=1).
+
+Seeds a throwaway database, then starts fresh Python processes that import server.py
+and request one invoice PDF per theme, with and without the startup warm-up.
+Reports the import time (which includes the warm-up when it is on) and the latency of
+the first and second render of each theme.
+
+    python benchmarks/bench_pdf_startup.py --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import seed_database  # noqa: E402
+
+# Runs in a fresh interpreter so nothing is imported, compiled or cached beforehand.
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import server
+timings = {'import': time.perf_counter() - start, 'loaded': sorted(m for m in ('weasyprint', 'num2words', 'numpy') if m in sys.modules)}
+client = server.app.test_client()
+invoice_id = server.get_db_connection(readonly=True).execute('SELECT MAX(id) FROM Invoices').fetchone()[0]
+for theme in server.PDF_THEMES:
+    for attempt in ('first', 'second'):
+        server.pdf_cache.invalidate_invoice(invoice_id)
+        start = time.perf_counter()
+        assert client.get(f'/api/invoices/{invoice_id}/pdf?theme={theme}').status_code == 200
+        timings[f'{theme}:{attempt}'] = time.perf_counter() - start
+server.pdf_service.shutdown()
+print(json.dumps(timings))
+"""
+
+
+def build_database(db_file):
+    seed_database.DB_FILE = db_file
+    seed_database.SCHEMA_FILE = os.path.join(ROOT, 'schema.sql')
+    seed_database.MONTHS_TO_GENERATE = 1
+    if not seed_database.seed(7):
+        sys.exit(1)
+
+
+def probe(db_file, warm_up):
+    env = dict(os.environ, INVOICE_DB=db_file, PDF_WORKERS='1', PDF_WARMUP='1' if warm_up else '0')
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_file = os.path.join(workdir, 'invoice_app.db')
+        build_database(db_file)
+        for warm_up in (False, True):
+            runs = [probe(db_file, warm_up) for _ in range(args.runs)]
+            median = lambda key: statistics.median(run[key] for run in runs) * 1000  # noqa: E731
+            label = 'PDF_WARMUP=1' if warm_up else 'cold (lazy)'
+            print(f"\n{label}: import server {median('import'):.0f} ms"
+                  f" (loaded: {', '.join(runs[0]['loaded']) or 'none of weasyprint, num2words, numpy'})")
+            for key in sorted(key for key in runs[0] if key.endswith(':first')):
+                theme = key.split(':')[0]
+                print(f"  {theme:<11} first render {median(key):8.1f} ms   second {median(theme + ':second'):8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark: trigram FTS5 search vs the old leading-wildcard LIKE search.
+
+Builds a synthetic database (schema.sql + migrations) and times the customer, item and
+invoice search queries both ways for a handful of typical autocomplete terms.
+
+    python benchmarks/bench_search.py --customers 100000 --invoices 300000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import migrations  # noqa: E402
+import search_index  # noqa: E402
+from seed_database import FIRST_NAMES, LAST_NAMES, ITEM_ADJECTIVES, ITEM_TYPES, ITEM_SUFFIXES  # noqa: E402
+
+TERMS = ['sha', 'Sharma', 'aarav', '98765', 'Serum', 'Gold', 'FY25-26/01', '1756']
+
+QUERIES = {
+    'customers': (
+        "SELECT COUNT(*) FROM Customers WHERE (name LIKE ? OR phone LIKE ? OR gstin LIKE ?)",
+        "SELECT COUNT(*) FROM Customers_FTS WHERE Customers_FTS MATCH ?",
+        lambda term: (f'%{term}%',) * 3,
+        lambda term: (search_index.match_expression(term),),
+    ),
+    'items': (
+        "SELECT * FROM Items WHERE name LIKE ? LIMIT 20",
+        "SELECT Items.* FROM Items_FTS JOIN Items ON Items.id = Items_FTS.rowid WHERE Items_FTS MATCH ? ORDER BY Items_FTS.rank LIMIT 20",
+        lambda term: (f'%{term}%',),
+        lambda term: (search_index.match_expression(term),),
+    ),
+    'invoices': (
+        """SELECT i.id FROM Invoices i JOIN Customers c ON i.customer_id = c.id
+           WHERE (i.invoice_no LIKE ? OR c.name LIKE ? OR i.total_value LIKE ?) ORDER BY i.date DESC, i.id DESC""",
+        """SELECT i.id FROM Invoices i JOIN Customers c ON i.customer_id = c.id
+           WHERE (i.id IN (SELECT rowid FROM Invoices_FTS WHERE Invoices_FTS MATCH ?)
+              OR i.customer_id IN (SELECT rowid FROM Customers_FTS WHERE Customers_FTS MATCH ?))
+           ORDER BY i.date DESC, i.id DESC""",
+        lambda term: (f'%{term}%',) * 3,
+        lambda term: (search_index.match_expression(term, ['invoice_no', 'total_value']),
+                      search_index.match_expression(term, ['name'])),
+    ),
+}
+
+
+def build_database(db_file, num_customers, num_items, num_invoices):
+    rng = random.Random(7)
+    conn = sqlite3.connect(db_file)
+    with open(os.path.join(ROOT, 'schema.sql')) as f:
+        conn.executescript(f.read())
+    conn.executemany(
+        "INSERT INTO Customers (name, phone, address, place_of_supply) VALUES (?, ?, 'Main Road', 'Delhi')",
+        ((f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {n}", f"9{rng.randint(100000000, 999999999)}")
+         for n in range(num_customers)))
+    conn.executemany(
+        "INSERT INTO Items (name, default_mrp, default_sale_price, default_tax_rate) VALUES (?, 100, 90, 18)",
+        ((f"{rng.choice(ITEM_ADJECTIVES)} {rng.choice(ITEM_TYPES)} {rng.choice(ITEM_SUFFIXES)} {n}",)
+         for n in range(num_items)))
+    conn.executemany("""
+        INSERT INTO Invoices (invoice_no, date, customer_id, sale_type, total_value, taxable_value, cgst, sgst, igst, cess)
+        VALUES (?, ?, ?, 'CASH', ?, 0, 0, 0, 0, 0)
+    """, ((f"FY25-26/{n:06d}", f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+           rng.randint(1, num_customers), rng.randint(100, 50000)) for n in range(num_invoices)))
+    conn.commit()
+    conn.close()
+    migrations.apply_migrations(db_file)
+
+
+def time_query(conn, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=50000)
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--invoices', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_file = os.path.join(workdir, 'bench.db')
+        print(f"Building database: {args.customers} customers, {args.items} items, {args.invoices} invoices...")
+        build_database(db_file, args.customers, args.items, args.invoices)
+        conn = sqlite3.connect(db_file)
+
+        print(f"\n{'endpoint':<10} {'term':<12} {'LIKE ms':>10} {'FTS ms':>10} {'speedup':>9}")
+        for endpoint, (like_sql, fts_sql, like_params, fts_params) in QUERIES.items():
+            for term in TERMS:
+                like_ms = time_query(conn, like_sql, like_params(term), args.repeat)
+                fts_ms = time_query(conn, fts_sql, fts_params(term), args.repeat)
+                print(f"{endpoint:<10} {term:<12} {like_ms:>10.2f} {fts_ms:>10.2f} {like_ms / max(fts_ms, 1e-6):>8.1f}x")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark: picker lookups from suggest_index vs the LIKE + COUNT queries behind /api/customers?search=.
+
+Fills an in-memory database with generated customers, loads the suggest index from it
+and times the same keystroke sequences (names, surnames and phone numbers typed one
+character at a time) both ways, reporting per-lookup latency percentiles.
+
+    python benchmarks/bench_suggest.py --customers 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import seed_database  # noqa: E402
+from suggest_index import SuggestIndex, customer_tokens  # noqa: E402
+
+LIKE_QUERY = "SELECT * FROM Customers WHERE name LIKE ? OR phone LIKE ? OR gstin LIKE ? ORDER BY name LIMIT 15"
+COUNT_QUERY = "SELECT COUNT(*) FROM Customers WHERE name LIKE ? OR phone LIKE ? OR gstin LIKE ?"
+
+
+def build_database(count, rng):
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE Customers (id INTEGER PRIMARY KEY, name TEXT, phone TEXT, gstin TEXT, "
+                 "address TEXT, place_of_supply TEXT)")
+    rows = [(n, f"{rng.choice(seed_database.FIRST_NAMES)} {rng.choice(seed_database.LAST_NAMES)} {n}",
+             f"9{rng.randint(100000000, 999999999)}", None, 'Somewhere', 'Delhi') for n in range(1, count + 1)]
+    conn.executemany("INSERT INTO Customers VALUES (?, ?, ?, ?, ?, ?)", rows)
+    return conn, rows
+
+
+def keystrokes(rows, rng, count):
+    """Every prefix of `count` random names, surnames and phone numbers, as typed one character at a time."""
+    typed = []
+    for _, name, phone, *_ in rng.sample(rows, count):
+        for text in (name, name.split()[1], phone):
+            typed.extend(text[:length] for length in range(1, min(len(text), 10) + 1))
+    return typed
+
+
+def percentiles(label, samples):
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6  # noqa: E731
+    print(f"{label:<26} p50 {p(0.50):9.1f} us  p95 {p(0.95):9.1f} us  p99 {p(0.99):9.1f} us"
+          f"  mean {statistics.fmean(samples) * 1e6:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=100_000)
+    parser.add_argument('--names', type=int, default=200, help='customers looked up by name, surname and phone')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    conn, rows = build_database(args.customers, rng)
+    typed = keystrokes(rows, rng, args.names)
+
+    index = SuggestIndex('customers', 'Customers', ('id', 'name', 'phone', 'gstin', 'address', 'place_of_supply'),
+                         customer_tokens)
+    start = time.perf_counter()
+    index.load(conn)
+    print(f"{args.customers} customers, index built in {time.perf_counter() - start:.2f}s "
+          f"({index.stats()['tokens']} tokens); {len(typed)} keystrokes")
+
+    samples = []
+    for query in typed:
+        start = time.perf_counter()
+        index.search(query, 10)
+        samples.append(time.perf_counter() - start)
+    percentiles('suggest_index.search', samples)
+
+    samples = []
+    for query in typed[:len(typed) // 10]:
+        like = f'%{query}%'
+        start = time.perf_counter()
+        conn.execute(COUNT_QUERY, (like, like, like)).fetchone()
+        conn.execute(LIKE_QUERY, (like, like, like)).fetchall()
+        samples.append(time.perf_counter() - start)
+    percentiles('LIKE + COUNT (SQLite)', samples)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark: per-line cost of tax_engine's scalar (Decimal) and batch (NumPy) modes.
+
+Generates random invoices, times compute_invoice() over a sample and compute_batch()
+over every line, and checks that both modes produce the same amounts on the sample.
+
+    python benchmarks/bench_tax_engine.py --lines 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tax_engine import compute_batch, compute_invoice  # noqa: E402
+
+GST_RATES = np.array([0, 5, 12, 18, 28])
+
+
+def generate(num_lines, seed):
+    rng = np.random.default_rng(seed)
+    # 1-6 lines per invoice, like the seeded data.
+    per_invoice = rng.integers(1, 7, size=num_lines)
+    per_invoice = per_invoice[:np.searchsorted(np.cumsum(per_invoice), num_lines) + 1]
+    per_invoice[-1] -= per_invoice.sum() - num_lines
+    invoice_count = len(per_invoice)
+    lines = {
+        'invoice': np.repeat(np.arange(invoice_count), per_invoice),
+        'quantity': rng.integers(1, 11, size=num_lines).astype(np.float64),
+        'price_per_unit': np.round(rng.uniform(10, 5000, size=num_lines), 2),
+        'gst_rate': rng.choice(GST_RATES, size=num_lines).astype(np.float64),
+        'discount': np.where(rng.random(num_lines) < 0.2, np.round(rng.uniform(0, 5, size=num_lines), 2), 0),
+        'inclusive_of_tax': rng.random(num_lines) < 0.3,
+    }
+    invoices = {
+        'inter_state': rng.random(invoice_count) < 0.4,
+        'discount': np.where(rng.random(invoice_count) < 0.1, np.round(rng.uniform(0, 5, size=invoice_count), 2), 0),
+    }
+    return lines, invoices
+
+
+def scalar_inputs(lines, invoices, invoice_count):
+    """Rebuilds the first `invoice_count` invoices as the dicts compute_invoice() takes."""
+    end = np.searchsorted(lines['invoice'], invoice_count)
+    payloads = [([], float(invoices['discount'][n]), bool(invoices['inter_state'][n])) for n in range(invoice_count)]
+    for i in range(end):
+        payloads[lines['invoice'][i]][0].append({
+            'quantity': float(lines['quantity'][i]), 'price_per_unit': float(lines['price_per_unit'][i]),
+            'gst_rate': float(lines['gst_rate'][i]), 'discount': float(lines['discount'][i]),
+            'inclusive_of_tax': bool(lines['inclusive_of_tax'][i]),
+        })
+    return payloads, end
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--scalar-invoices', type=int, default=20_000, help='invoices timed in scalar mode')
+    args = parser.parse_args()
+
+    lines, invoices = generate(args.lines, seed=7)
+    invoice_count = len(invoices['inter_state'])
+    print(f"{args.lines} lines in {invoice_count} invoices")
+
+    start = time.perf_counter()
+    line_amounts, totals, errors = compute_batch(lines, invoices)
+    batch_seconds = time.perf_counter() - start
+    print(f"batch  (NumPy):   {batch_seconds:8.3f}s  {batch_seconds / args.lines * 1e9:10.0f} ns/line")
+
+    sample = min(args.scalar_invoices, invoice_count)
+    payloads, sample_lines = scalar_inputs(lines, invoices, sample)
+    start = time.perf_counter()
+    results = [compute_invoice(items, discount, inter_state) for items, discount, inter_state in payloads]
+    scalar_seconds = time.perf_counter() - start
+    print(f"scalar (Decimal): {scalar_seconds:8.3f}s  {scalar_seconds / sample_lines * 1e9:10.0f} ns/line"
+          f"  ({sample_lines} lines; ~{scalar_seconds / sample_lines * args.lines:.1f}s for all)")
+    print(f"speedup: {scalar_seconds / sample_lines / (batch_seconds / args.lines):.0f}x")
+
+    mismatches = sum(
+        abs(float(result[field]) - totals[field][n]) > 1e-9
+        for n, result in enumerate(results)
+        for field in ('taxable_value', 'cgst', 'igst', 'round_off', 'total_value')
+    )
+    print(f"scalar/batch mismatches on the sample: {mismatches}; invoices rejected: {int(errors.sum())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+"""Load test: drives the API endpoints in server.py over HTTP and records latency percentiles per endpoint.
+
+Seeds a reproducible throwaway database with seed_database.py (or uses --db), starts
+server.py on it in a separate process (or targets an already-running server with
+--url), then runs --concurrency client threads for --duration seconds. Each thread
+keeps one HTTP connection and picks endpoints from the weighted mix in SCENARIOS.
+Per endpoint it records throughput, error count and p50/p95/p99 latency.
+
+--output writes the results as JSON (with the git commit and the dataset size), and
+--compare checks a run against such a baseline. It exits 1 when an endpoint's p95 got
+worse by more than --threshold.
+
+    python benchmarks/load_test.py --invoices 200000 --concurrency 16 --output baseline.json
+    python benchmarks/load_test.py --invoices 200000 --concurrency 16 --compare baseline.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --db invoice_app.db --read-only
+
+Write scenarios add invoices (under the LOAD/ prefix), customers and items to the
+database, and PDF scenarios need WeasyPrint; see --read-only and --no-pdf.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import seed_database  # noqa: E402
+
+LOAD_PREFIX = 'LOAD/'
+END_DATE = '2026-03-31'  # fixed so a seed gives the same data on any day
+MIN_COMPARE_SAMPLES = 20
+MIN_COMPARE_DELTA_MS = 1.0  # p95 changes smaller than this are noise, whatever the ratio
+
+SERVER_CODE = "import server; server.app.run(host='127.0.0.1', port={port}, threaded=True)"
+
+
+# --- Scenarios ---
+# Each builder takes (sample, rng) and returns (method, path, JSON body or None).
+
+def pick_month(sample, rng):
+    month = rng.choice(sample['months'])
+    return f'{month}-01', f'{month}-28'
+
+
+def invoice_payload(sample, rng):
+    return dict(sample['invoice'], invoice_no=None, prefix=LOAD_PREFIX,
+                customer_id=rng.choice(sample['customer_ids']))
+
+
+SCENARIOS = [
+    # (name, weight, kind, builder, expected statuses)
+    ('invoices.page', 10, 'read', lambda s, r: ('GET', '/api/invoices?page_size=50', None), (200,)),
+    ('invoices.page_total', 3, 'read', lambda s, r: ('GET', '/api/invoices?page_size=50&include_total=1', None), (200,)),
+    ('invoices.month', 4, 'read', lambda s, r: ('GET', '/api/invoices?page_size=50&start_date={}&end_date={}'.format(
+        *pick_month(s, r)), None), (200,)),
+    ('invoices.search', 4, 'read', lambda s, r: (
+        'GET', f"/api/invoices?page_size=50&search={r.choice(seed_database.LAST_NAMES)}", None), (200,)),
+    ('invoices.get', 12, 'read', lambda s, r: ('GET', f"/api/invoices/{r.choice(s['invoice_ids'])}", None), (200,)),
+    ('sales_data', 3, 'read', lambda s, r: ('GET', '/api/sales_data?period=custom&start_date={}&end_date={}'.format(
+        *pick_month(s, r)), None), (200,)),
+    ('financial_year_summary', 2, 'read', lambda s, r: ('GET', '/api/financial_year_summary', None), (200,)),
+    ('customers.list', 4, 'read', lambda s, r: ('GET', '/api/customers?cursor=', None), (200,)),
+    ('customers.search', 4, 'read', lambda s, r: (
+        'GET', f"/api/customers?search={r.choice(seed_database.LAST_NAMES)}", None), (200,)),
+    ('customers.get', 6, 'read', lambda s, r: ('GET', f"/api/customers/{r.choice(s['customer_ids'])}", None), (200,)),
+    ('items.list', 3, 'read', lambda s, r: ('GET', '/api/items', None), (200,)),
+    ('items.search', 4, 'read', lambda s, r: (
+        'GET', f"/api/items?search={urllib.parse.quote(r.choice(seed_database.ITEM_TYPES))}", None), (200,)),
+    ('suggest.customers', 12, 'read', lambda s, r: (
+        'GET', f"/api/suggest?type=customers&q={urllib.parse.quote(r.choice(s['customer_names'])[:r.randint(1, 4)])}", None), (200,)),
+    ('suggest.items', 8, 'read', lambda s, r: (
+        'GET', f"/api/suggest?type=items&q={urllib.parse.quote(r.choice(s['item_names'])[:r.randint(1, 4)])}", None),
+     (200,)),
+    ('units', 2, 'read', lambda s, r: ('GET', '/api/units', None), (200,)),
+    ('invoice_prefixes', 2, 'read', lambda s, r: ('GET', '/api/invoice_prefixes', None), (200,)),
+    ('latest_invoice_number', 2, 'read', lambda s, r: (
+        'GET', f"/api/latest_invoice_number?prefix={urllib.parse.quote(s['prefix'])}", None), (200,)),
+    ('exports.invoices', 1, 'read', lambda s, r: ('GET', '/api/exports/invoices?start_date={}&end_date={}'.format(
+        *pick_month(s, r)), None), (200,)),
+    ('exports.hsn_summary', 1, 'read', lambda s, r: ('GET', '/api/exports/hsn_summary?start_date={}&end_date={}'.format(
+        *pick_month(s, r)), None), (200,)),
+    ('metrics', 1, 'read', lambda s, r: ('GET', '/metrics', None), (200,)),
+    ('invoices.create', 4, 'write', lambda s, r: ('POST', '/api/invoices', invoice_payload(s, r)), (201,)),
+    ('invoices.update', 2, 'write', lambda s, r: (
+        'PUT', f"/api/invoices/{s['invoice']['id']}", s['invoice']), (200,)),
+    ('invoices.bulk', 1, 'write', lambda s, r: (
+        'POST', f'/api/invoices/bulk?prefix={urllib.parse.quote(LOAD_PREFIX)}',
+        [invoice_payload(s, r) for _ in range(10)]), (200,)),
+    ('invoice_numbers.reserve', 1, 'write', lambda s, r: (
+        'POST', '/api/invoice_numbers/reserve', {'prefix': LOAD_PREFIX, 'count': 10}), (201,)),
+    ('customers.create', 2, 'write', lambda s, r: ('POST', '/api/customers', {
+        'name': f"Load {r.choice(seed_database.FIRST_NAMES)} {r.randrange(10 ** 6)}", 'phone': f'9{r.randrange(10 ** 9):09d}',
+        'address': 'Load Test Road', 'place_of_supply': 'Delhi'}), (201,)),
+    ('customers.update', 1, 'write', lambda s, r: (
+        'PUT', f"/api/customers/{s['customer']['id']}", s['customer']), (200,)),
+    ('items.create', 1, 'write', lambda s, r: ('POST', '/api/items', {
+        'name': f'Load Item {r.randrange(10 ** 9)}', 'default_mrp': 100, 'purchase_price': 50,
+        'default_sale_price': 80, 'default_tax_rate': 18}), (201,)),
+    ('pdf', 2, 'pdf', lambda s, r: ('GET', f"/api/invoices/{r.choice(s['invoice_ids'])}/pdf", None), (200,)),
+    ('pdf.job', 1, 'pdf', lambda s, r: (
+        'POST', f"/api/invoices/{r.choice(s['invoice_ids'])}/pdf/jobs?theme=modern", None), (202,)),
+]
+
+
+# --- Setup ---
+
+def build_database(db_file, args):
+    seed_database.DB_FILE = db_file
+    seed_database.SCHEMA_FILE = os.path.join(ROOT, 'schema.sql')
+    seed_database.NUM_CUSTOMERS = args.customers
+    seed_database.MONTHS_TO_GENERATE = args.months
+    seed_database.INVOICES_PER_MONTH_AVG = -(-args.invoices // args.months)
+    seed_database.END_DATE = datetime.strptime(END_DATE, '%Y-%m-%d')
+    if not seed_database.seed(args.seed):
+        sys.exit(1)
+
+
+def load_sample(db_file, base_url, rng):
+    """Ids, names and months for the scenarios to pick from, plus one invoice and customer as API payloads."""
+    conn = sqlite3.connect(f'file:{db_file}?mode=ro', uri=True)
+    invoice_ids = [row[0] for row in conn.execute("SELECT id FROM Invoices")]
+    sample = {
+        'invoice_ids': rng.sample(invoice_ids, min(len(invoice_ids), 5000)),
+        'customer_ids': [row[0] for row in conn.execute("SELECT id FROM Customers")],
+        'customer_names': [row[0] for row in conn.execute("SELECT name FROM Customers LIMIT 2000")],
+        'item_names': [row[0] for row in conn.execute("SELECT name FROM Items")],
+        'months': [row[0] for row in conn.execute("SELECT DISTINCT substr(date, 1, 7) FROM Daily_Sales_Rollup")],
+        'prefix': conn.execute("SELECT prefix FROM Invoice_Prefixes ORDER BY is_default DESC LIMIT 1").fetchone()[0],
+        'dataset': {table.lower(): conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ('Invoices', 'Invoice_Items', 'Customers', 'Items')},
+    }
+    conn.close()
+
+    url = urllib.parse.urlsplit(base_url)
+    client = http.client.HTTPConnection(url.hostname, url.port)
+    client.request('GET', f"/api/invoices/{sample['invoice_ids'][0]}")
+    details = json.loads(client.getresponse().read())
+    client.close()
+    sample['invoice'] = dict(details['invoice'], items=details['items'])
+    sample['customer'] = details['customer']
+    return sample
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db_file):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, '-c', SERVER_CODE.format(port=port)], cwd=ROOT,
+                               env=dict(os.environ, INVOICE_DB=db_file),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit('server.py exited during startup')
+        try:
+            client = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            client.request('GET', '/api/units')
+            client.getresponse().read()
+            client.close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit('server.py did not start within 60 seconds')
+
+
+# --- Load ---
+
+def run_load(base_url, scenarios, sample, concurrency, duration, seed):
+    """Runs `concurrency` client threads for `duration` seconds; returns {name: [(status, seconds), ...]}."""
+    url = urllib.parse.urlsplit(base_url)
+    names = [scenario[0] for scenario in scenarios]
+    weights = [scenario[1] for scenario in scenarios]
+    results = defaultdict(list)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client_thread(number):
+        rng = random.Random(seed * 1000 + number)
+        client = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+        samples = defaultdict(list)
+        while time.monotonic() < deadline:
+            position = rng.choices(range(len(scenarios)), weights)[0]
+            method, path, body = scenarios[position][3](sample, rng)
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            start = time.perf_counter()
+            try:
+                client.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+                response = client.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 0
+                client.close()
+            samples[names[position]].append((status, time.perf_counter() - start))
+        client.close()
+        with lock:
+            for name, values in samples.items():
+                results[name].extend(values)
+
+    threads = [threading.Thread(target=client_thread, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def summarize(samples, ok_statuses, duration):
+    latencies = sorted(seconds for _, seconds in samples)
+    statuses = defaultdict(int)
+    for status, _ in samples:
+        statuses[str(status)] += 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for status, _ in samples if status not in ok_statuses),
+        'throughput_rps': round(len(samples) / duration, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'statuses': dict(statuses),
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+# --- Reporting ---
+
+def print_results(report):
+    print(f"\n{'endpoint':<26}{'reqs':>8}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in sorted(report['endpoints'].items()) + [('TOTAL', report['overall'])]:
+        print(f"{name:<26}{stats['requests']:>8}{stats['errors']:>6}{stats['throughput_rps']:>9.1f}"
+              f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+
+def compare(report, baseline, threshold):
+    """Prints the change against `baseline` per endpoint; returns the endpoints whose p95 regressed."""
+    print(f"\nAgainst {baseline['meta'].get('commit') or 'baseline'} ({baseline['meta'].get('timestamp')}):")
+    print(f"{'endpoint':<26}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>10}")
+    regressions = []
+    rows = sorted(report['endpoints'].items()) + [('TOTAL', report['overall'])]
+    for name, stats in rows:
+        old = baseline['overall'] if name == 'TOTAL' else baseline['endpoints'].get(name)
+        if not old:
+            continue
+        change = {key: (stats[key] - old[key]) / old[key] if old[key] else 0.0
+                  for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')}
+        regressed = (change['p95_ms'] > threshold and stats['p95_ms'] - old['p95_ms'] > MIN_COMPARE_DELTA_MS
+                     and min(stats['requests'], old['requests']) >= MIN_COMPARE_SAMPLES)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<26}" + ''.join(f"{change[key]:>+10.1%}" for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'))
+              + ('  ❌ p95 regression' if regressed else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_argument_group('target')
+    target.add_argument('--url', help='an already-running server (requires --db, the database it serves)')
+    target.add_argument('--db', help='use this database instead of seeding one (write scenarios modify it)')
+    dataset = parser.add_argument_group('seeded dataset')
+    dataset.add_argument('--invoices', type=int, default=100_000)
+    dataset.add_argument('--customers', type=int, default=5_000)
+    dataset.add_argument('--months', type=int, default=24)
+    dataset.add_argument('--seed', type=int, default=42, help='seeds the data and every client thread')
+    load = parser.add_argument_group('load')
+    load.add_argument('--concurrency', type=int, default=8)
+    load.add_argument('--duration', type=float, default=30, help='seconds of measured load')
+    load.add_argument('--warmup', type=float, default=5, help='seconds of unmeasured load first')
+    load.add_argument('--read-only', action='store_true', help='skip the write scenarios')
+    load.add_argument('--no-pdf', action='store_true', help='skip the PDF scenarios')
+    load.add_argument('--only', help='comma-separated scenario names to run')
+    results = parser.add_argument_group('results')
+    results.add_argument('--output', help='write the results to this JSON file')
+    results.add_argument('--compare', help='compare with a JSON file written by --output')
+    results.add_argument('--threshold', type=float, default=0.15, help='allowed p95 increase (default: %(default)s)')
+    args = parser.parse_args()
+    if args.url and not args.db:
+        parser.error('--url needs --db to pick invoice and customer ids from')
+
+    scenarios = [scenario for scenario in SCENARIOS
+                 if not (args.read_only and scenario[2] == 'write') and not (args.no_pdf and scenario[2] == 'pdf')
+                 and (not args.only or scenario[0] in args.only.split(','))]
+    if not scenarios:
+        parser.error('no scenarios left to run')
+
+    workdir = tempfile.TemporaryDirectory()
+    process = None
+    try:
+        db_file = args.db
+        if not db_file:
+            db_file = os.path.join(workdir.name, 'invoice_app.db')
+            build_database(db_file, args)
+        base_url = args.url
+        if not base_url:
+            process, base_url = start_server(db_file)
+
+        sample = load_sample(db_file, base_url, random.Random(args.seed))
+        print(f"\nTarget {base_url}: {sample['dataset']['invoices']} invoices, {len(scenarios)} scenarios, "
+              f"{args.concurrency} clients, {args.warmup:g}s warm-up + {args.duration:g}s measured")
+        if args.warmup:
+            run_load(base_url, scenarios, sample, args.concurrency, args.warmup, args.seed + 1)
+        samples = run_load(base_url, scenarios, sample, args.concurrency, args.duration, args.seed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        workdir.cleanup()
+
+    expected = {scenario[0]: scenario[4] for scenario in scenarios}
+    commit, dirty = git_revision()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'target': args.url or 'server.py (spawned)',
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'seed': args.seed,
+            'dataset': sample['dataset'],
+        },
+        'endpoints': {name: summarize(values, expected[name], args.duration) for name, values in samples.items()},
+        'overall': summarize([(200 if status in expected[name] else status, seconds)
+                              for name, values in samples.items() for status, seconds in values],
+                             (200,), args.duration),
+    }
+    del report['overall']['statuses']
+    print_results(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ p95 regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\n✅ No endpoint's p95 regressed by more than {args.threshold:.0%}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Bulk invoice import: validates records and inserts them in chunked transactions.
+
+Records are the same JSON objects POST /api/invoices accepts, and as there, every line
+amount and invoice total is recomputed (with tax_engine's vectorized batch mode, one
+call per chunk) rather than trusted. A record may leave out
+`invoice_no` and give a `prefix` instead (or the import can supply a default prefix);
+the numbers then come from that prefix's counter inside the chunk's write transaction,
+so concurrent imports and single-invoice saves never hand out the same number. Each
+chunk is one transaction (one commit and one fsync for the whole chunk), and each
+record is wrapped in a savepoint so a bad record is reported and skipped
+without failing its neighbours.
+"""
+import json
+from datetime import datetime
+from itertools import islice
+
+import customer_stats
+import sales_rollup
+from reference_cache import business_profile
+from tax_engine import compute_batch, is_inter_state
+from invoice_store import (advance_invoice_counter, format_invoice_number, insert_invoice, record_invoice_number,
+                           reserve_invoice_numbers, split_invoice_number)
+
+IMPORT_CHUNK_SIZE = 500
+MAX_IMPORT_CHUNK_SIZE = 5000
+
+REQUIRED_INVOICE_FIELDS = ('customer_id', 'date')
+REQUIRED_ITEM_FIELDS = ('item_id', 'price_per_unit', 'gst_rate')
+INVOICE_STATUSES = ('PAID', 'PENDING')
+NUMERIC_ITEM_FIELDS = ('quantity', 'price_per_unit', 'gst_rate', 'discount', 'cess_amount')
+
+
+class RecordError(ValueError):
+    """A record that cannot be imported; the message is reported back for that record."""
+
+
+def iter_ndjson(lines):
+    """Yields one decoded record per non-blank NDJSON line, or a RecordError for lines that are not JSON."""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield RecordError(f'Invalid JSON: {e}')
+
+
+def validate_record(record, default_prefix=None):
+    """Raises RecordError if the record is missing data or has malformed values."""
+    if not isinstance(record, dict):
+        raise RecordError('Record must be a JSON object')
+    missing = [field for field in REQUIRED_INVOICE_FIELDS if record.get(field) in (None, '')]
+    if missing:
+        raise RecordError(f"Missing required fields: {', '.join(missing)}")
+    if not isinstance(record['customer_id'], int):
+        raise RecordError('customer_id must be an integer')
+    if not record.get('invoice_no') and not (record.get('prefix') or default_prefix):
+        raise RecordError('Either invoice_no or prefix is required')
+    try:
+        datetime.strptime(record['date'], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise RecordError('date must be in YYYY-MM-DD format')
+    if not isinstance(record.get('discount') or 0, (int, float)):
+        raise RecordError('discount must be a number')
+    if record.get('status', 'PAID') not in INVOICE_STATUSES:
+        raise RecordError(f"status must be one of: {', '.join(INVOICE_STATUSES)}")
+    items = record.get('items')
+    if not isinstance(items, list) or not items:
+        raise RecordError('At least one item is required')
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise RecordError(f'Item {position} must be a JSON object')
+        missing = [field for field in REQUIRED_ITEM_FIELDS if item.get(field) in (None, '')]
+        if missing:
+            raise RecordError(f"Item {position} is missing: {', '.join(missing)}")
+        if not isinstance(item['item_id'], int):
+            raise RecordError(f'Item {position} item_id must be an integer')
+        if not all(isinstance(item.get(field) or 0, (int, float)) for field in NUMERIC_ITEM_FIELDS):
+            raise RecordError(f"Item {position}: {', '.join(NUMERIC_ITEM_FIELDS)} must be numbers")
+
+
+def lookup(conn, table, column, ids):
+    """Returns {id: column} for the ids that exist in `table`, with one query."""
+    return {row[0]: row[1] for row in conn.execute(
+        f"SELECT id, {column} FROM {table} WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(sorted(ids)),))}
+
+
+def compute_amounts(records, inter_state):
+    """Recomputes every record's amounts with one vectorized call.
+
+    Returns the updated records and a parallel list of error messages (None if the record is fine).
+    """
+    lines = {'invoice': [], 'quantity': [], 'price_per_unit': [], 'gst_rate': [],
+             'discount': [], 'cess_amount': [], 'inclusive_of_tax': []}
+    for position, record in enumerate(records):
+        for item in record['items']:
+            lines['invoice'].append(position)
+            lines['quantity'].append(item.get('quantity', 1))
+            lines['price_per_unit'].append(item['price_per_unit'])
+            lines['gst_rate'].append(item['gst_rate'])
+            lines['discount'].append(item.get('discount') or 0)
+            lines['cess_amount'].append(item.get('cess_amount') or 0)
+            lines['inclusive_of_tax'].append(bool(item.get('inclusive_of_tax')))
+    invoices = {'inter_state': inter_state, 'discount': [record.get('discount') or 0 for record in records]}
+    line_amounts, totals, errors = compute_batch(lines, invoices)
+
+    computed, messages, line = [], [], 0
+    for position, record in enumerate(records):
+        data = dict(record)
+        for field in ('taxable_value', 'cgst', 'sgst', 'igst', 'cess', 'round_off', 'total_value'):
+            data[field] = float(totals[field][position])
+        data['items'] = []
+        for item in record['items']:
+            item = dict(item)
+            for field in ('price_per_unit', 'discount', 'cgst_amount', 'sgst_amount', 'igst_amount',
+                          'cess_amount', 'total_amount'):
+                item[field] = float(line_amounts[field][line])
+            data['items'].append(item)
+            line += 1
+        computed.append(data)
+        messages.append('Amounts cannot be taxed: a value is negative or a discount is larger than the amount'
+                        if errors[position] else None)
+    return computed, messages
+
+
+def import_chunk(conn, chunk, default_prefix, summary):
+    """Imports one chunk of (index, record) pairs in a single write transaction."""
+    valid = []
+    for index, record in chunk:
+        try:
+            if isinstance(record, RecordError):
+                raise record
+            validate_record(record, default_prefix)
+            valid.append((index, record))
+        except RecordError as e:
+            summary['errors'].append({'index': index, 'error': str(e)})
+    if not valid:
+        return
+
+    errors = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        customers = lookup(conn, 'Customers', 'place_of_supply', {record['customer_id'] for _, record in valid})
+        items = lookup(conn, 'Items', 'id', {item['item_id'] for _, record in valid for item in record['items']})
+        known = []
+        for index, record in valid:
+            if record['customer_id'] not in customers:
+                errors.append({'index': index, 'error': f"Customer {record['customer_id']} does not exist"})
+                continue
+            unknown = sorted({item['item_id'] for item in record['items']} - items.keys())
+            if unknown:
+                errors.append({'index': index, 'error': f"Items do not exist: {', '.join(map(str, unknown))}"})
+                continue
+            known.append((index, record))
+
+        business_gstin = business_profile.get(conn).get('gstin')
+        inter_state = [is_inter_state(business_gstin, customers[record['customer_id']]) for _, record in known]
+        computed, messages = compute_amounts([record for _, record in known], inter_state) if known else ([], [])
+
+        next_numbers = {}
+        imported, dates, customer_ids = [], set(), set()
+        for (index, record), data, message in zip(known, computed, messages):
+            if message:
+                errors.append({'index': index, 'error': message})
+                continue
+
+            if not data.get('invoice_no'):
+                prefix = data.get('prefix') or default_prefix
+                if prefix not in next_numbers:
+                    # Read the counter without reserving: records that fail below leave no gaps.
+                    next_numbers[prefix] = reserve_invoice_numbers(conn, prefix, 0)
+                data['invoice_no'] = format_invoice_number(prefix, next_numbers[prefix])
+
+            conn.execute("SAVEPOINT import_record")
+            try:
+                invoice_id = insert_invoice(conn.cursor(), data, data.get('status', 'PAID'))
+            except Exception as e:
+                conn.execute("ROLLBACK TO import_record")
+                conn.execute("RELEASE import_record")
+                errors.append({'index': index, 'invoice_no': data['invoice_no'], 'error': str(e)})
+                continue
+            conn.execute("RELEASE import_record")
+            if record.get('invoice_no'):
+                record_invoice_number(conn, data['invoice_no'])
+                parsed = split_invoice_number(data['invoice_no'])
+                if parsed and parsed[0] in next_numbers:
+                    next_numbers[parsed[0]] = max(next_numbers[parsed[0]], parsed[1] + 1)
+            else:
+                next_numbers[prefix] += 1
+            imported.append({'index': index, 'invoice_id': invoice_id, 'invoice_no': data['invoice_no']})
+            dates.add(data['date'])
+            customer_ids.add(data['customer_id'])
+
+        for prefix, next_number in next_numbers.items():
+            advance_invoice_counter(conn, prefix, next_number)
+        sales_rollup.refresh_days(conn, dates)
+        customer_stats.refresh_customers(conn, customer_ids)
+        conn.commit()
+    except Exception as e:
+        # Nothing from this chunk was saved; report every record in it and carry on with the next.
+        conn.rollback()
+        summary['errors'].extend({'index': index, 'error': f'Chunk failed: {e}'} for index, _ in valid)
+        return
+    summary['errors'].extend(errors)
+    summary['invoices'].extend(imported)
+    summary['imported'] += len(imported)
+
+
+def import_invoices(conn, records, chunk_size=IMPORT_CHUNK_SIZE, default_prefix=None):
+    """Imports an iterable of invoice records (dicts, or RecordErrors from parsing) chunk by chunk.
+
+    `records` is consumed lazily, so an NDJSON upload is never held in memory whole. Returns
+    {'imported', 'failed', 'invoices': [{index, invoice_id, invoice_no}], 'errors': [{index, error}]}.
+    """
+    summary = {'imported': 0, 'failed': 0, 'invoices': [], 'errors': []}
+    records = enumerate(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        import_chunk(conn, chunk, default_prefix, summary)
+    summary['errors'].sort(key=lambda error: error['index'])
+    summary['failed'] = len(summary['errors'])
+    return summary
@@ -0,0 +1,203 @@
+"""Query-plan regression check for every SQL statement the API runs.
+
+Seeds a large throwaway database, drives every endpoint in server.py through Flask's
+test client while recording each SQL statement that reaches SQLite, then runs
+EXPLAIN QUERY PLAN on every distinct statement. The check fails (exit code 1) if any
+statement falls back to a full table SCAN that is not on the allow-list below.
+
+    python check_query_plans.py                 # seed a throwaway database first
+    python check_query_plans.py --db big.db     # reuse an already seeded database
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+# Statements that are allowed to scan, with the reason. Keep this list short: every
+# entry is a query whose cost grows with the table.
+ALLOWED_SCANS = [
+    (re.compile(r"\bFROM (Units|Invoice_Prefixes|Business|Categories|HSN_Codes)\b"), 'small reference table'),
+    (re.compile(r"\bFROM Daily_Sales_Rollup$"), 'unfiltered listing total, one rollup row per day'),
+    (re.compile(r"^SELECT \* FROM Items LIMIT \d+$"), 'unfiltered picker list, bounded by LIMIT'),
+    (re.compile(r"^SELECT id, name, .* FROM (Customers|Items)$"), 'suggest index load, once per process and max_age'),
+    (re.compile(r"LIKE '%"), 'search terms under 3 characters fall back to LIKE (too short for trigrams)'),
+]
+
+SQL_KEYWORDS = {'WHERE', 'JOIN', 'ON', 'LEFT', 'INNER', 'ORDER', 'GROUP', 'LIMIT', 'SET', 'VALUES', 'USING', 'AS'}
+SKIPPED_PREFIXES = ('--', 'PRAGMA', 'BEGIN', 'COMMIT', 'ROLLBACK', 'CREATE', 'DROP', 'ANALYZE', 'SAVEPOINT', 'RELEASE')
+
+
+def seed_large_database(db_file, months, invoices_per_month):
+    import seed_database
+
+    seed_database.DB_FILE = db_file
+    seed_database.NUM_CUSTOMERS = 2000
+    seed_database.MONTHS_TO_GENERATE = months
+    seed_database.INVOICES_PER_MONTH_AVG = invoices_per_month
+    if not seed_database.seed(42):
+        sys.exit(1)
+
+
+def record_statements(server):
+    """Drives every API route once and returns the distinct SQL statements executed."""
+    statements = []
+
+    def trace(conn):
+        conn.set_trace_callback(statements.append)
+
+    conn = server.get_db_connection(readonly=True)
+    invoice = dict(conn.execute("SELECT * FROM Invoices ORDER BY id DESC LIMIT 1").fetchone())
+    invoice_date = invoice['date']
+    customer_id = invoice['customer_id']
+    prefix = invoice['invoice_no'].split('/')[0] + '/'
+    conn.close()
+
+    for pool in (server.writer_pool, server.reader_pool):
+        pool.close_all()
+        pool.connect_hooks.append(trace)
+
+    client = server.app.test_client()
+    details = client.get(f"/api/invoices/{invoice['id']}").get_json()
+    payload = dict(details['invoice'], items=details['items'])
+    customer = details['customer']
+
+    requests = [
+        ('GET', '/api/invoices', None),
+        ('GET', '/api/invoices?limit=5', None),
+        ('GET', f'/api/invoices?start_date={invoice_date[:8]}01&end_date={invoice_date}', None),
+        ('GET', '/api/invoices?search=Sharma', None),
+        ('GET', '/api/invoices?page_size=50&include_total=1', None),
+        ('GET', '/api/invoices?page_size=50&include_total=1&search=Sharma', None),
+        ('GET', f"/api/invoices?page_size=50&cursor={server.encode_cursor(invoice_date, invoice['id'])}", None),
+        ('GET', '/api/sales_data?period=this-month', None),
+        ('GET', '/api/sales_data?period=this-year', None),
+        ('GET', f'/api/sales_data?period=custom&start_date=2000-01-01&end_date={invoice_date}', None),
+        ('GET', '/api/financial_year_summary', None),
+        ('GET', '/api/analytics/top_items?metric=profit', None),
+        ('GET', f'/api/analytics/top_customers?start_date={invoice_date[:8]}01&end_date={invoice_date}', None),
+        ('GET', '/api/analytics/margins?by=category', None),
+        ('GET', f'/api/analytics/compare?by=hsn&start_date={invoice_date[:8]}01&end_date={invoice_date}', None),
+        ('GET', '/api/customers', None),
+        ('GET', '/api/customers?page=3&limit=15', None),
+        ('GET', '/api/customers?search=Sharma', None),
+        ('GET', '/api/customers?cursor=&include_total=1', None),
+        ('GET', f"/api/customers?cursor={server.encode_cursor('M', 1)}&search=Sharma", None),
+        ('GET', f'/api/customers/{customer_id}', None),
+        ('GET', f'/api/customers/{customer_id}/ledger?limit=5', None),
+        ('GET', f"/api/customers/{customer_id}/ledger?cursor={server.encode_cursor(invoice_date, invoice['id'], 0)}", None),
+        ('PUT', f'/api/customers/{customer_id}', customer),
+        ('DELETE', f'/api/customers/{customer_id}', None),
+        ('POST', '/api/customers', {'name': 'Plan Check', 'phone': '9000000000', 'address': 'Somewhere',
+                                    'place_of_supply': 'Delhi'}),
+        ('GET', '/api/items', None),
+        ('GET', '/api/items?search=Serum', None),
+        ('POST', '/api/items', {'name': 'Plan Check Item', 'default_mrp': 10, 'purchase_price': 5,
+                                'default_sale_price': 8, 'default_tax_rate': 18}),
+        ('GET', '/api/suggest?type=customers&q=sha&seq=1', None),
+        ('GET', '/api/suggest?type=items&q=ser&seq=2', None),
+        ('GET', '/api/units', None),
+        ('GET', '/api/invoice_prefixes', None),
+        ('GET', f'/api/latest_invoice_number?prefix={prefix}', None),
+        ('GET', f"/api/invoices/{invoice['id']}", None),
+        ('PUT', f"/api/invoices/{invoice['id']}", payload),
+        ('POST', '/api/invoices', dict(payload, invoice_no='PLAN/0001')),
+        ('POST', '/api/invoices', dict(payload, invoice_no=None, prefix=prefix)),
+        ('POST', '/api/invoice_numbers/reserve', {'prefix': prefix, 'count': 10}),
+        ('POST', '/api/invoices/bulk?prefix=PLAN/', [dict(payload, invoice_no=None)] * 3),
+        ('DELETE', f"/api/invoices/{invoice['id']}", None),
+        # Reloads the lines of the invoices written above.
+        ('GET', '/api/analytics/margins?by=item', None),
+    ]
+    for method, url, body in requests:
+        response = client.open(url, method=method, json=body)
+        if response.status_code >= 500:
+            print(f"❌ {method} {url} failed with {response.status_code}: {response.get_data(as_text=True)}")
+            sys.exit(1)
+
+    # PDF data loading is exercised directly so the check does not need to render PDFs.
+    server.get_pdf_data(invoice['id'] - 1)
+    server.get_pdf_data_batch(list(range(invoice['id'] - 50, invoice['id'])))
+
+    seen = set()
+    distinct = []
+    for statement in statements:
+        statement = ' '.join(statement.split())
+        if statement.upper().startswith(SKIPPED_PREFIXES) or statement in seen:
+            continue
+        seen.add(statement)
+        distinct.append(statement)
+    return distinct
+
+
+def table_aliases(statement, tables):
+    """Maps every name a statement uses for a real table (the table itself and its aliases) to that table."""
+    aliases = {table: table for table in tables}
+    for table, alias in re.findall(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", statement, re.IGNORECASE):
+        if table in tables and alias and alias.upper() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def find_full_scans(conn, statement, tables):
+    """Returns the plan lines that scan a whole real table (CTEs, subqueries and virtual tables are ignored)."""
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+    details = [row[3] for row in plan]
+    aliases = table_aliases(statement, tables)
+    scans = []
+    for detail in details:
+        match = re.match(r"SCAN (\w+)$", detail)
+        if match and match.group(1) in aliases:
+            scans.append(detail)
+    return scans, details
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail if any API query falls back to a full table scan.')
+    parser.add_argument('--db', help='Use this seeded database instead of generating one (it will be modified)')
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--invoices-per-month', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = None
+    if args.db:
+        db_file = args.db
+    else:
+        workdir = tempfile.mkdtemp(prefix='query_plans_')
+        db_file = os.path.join(workdir, 'invoice_app.db')
+        seed_large_database(db_file, args.months, args.invoices_per_month)
+
+    os.environ['INVOICE_DB'] = db_file
+    import server
+
+    try:
+        statements = record_statements(server)
+        conn = server.get_db_connection(readonly=True)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        failures = []
+        for statement in statements:
+            scans, details = find_full_scans(conn, statement, tables)
+            if not scans:
+                continue
+            reasons = [reason for pattern, reason in ALLOWED_SCANS if pattern.search(statement)]
+            if reasons:
+                continue
+            failures.append((statement, details))
+        conn.close()
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Checked {len(statements)} distinct statements.")
+    for statement, details in failures:
+        print(f"\n❌ Full table scan:\n  {statement}")
+        for detail in details:
+            print(f"    {detail}")
+    if failures:
+        sys.exit(1)
+    print("✅ No unexpected full table scans.")
+
+
+if __name__ == '__main__':
+    main()
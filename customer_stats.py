@@ -0,0 +1,103 @@
+"""Per-customer invoice totals used by the customer screens, the ledger and the delete guard.
+
+Each row of Customer_Stats holds one customer's invoice count, lifetime sales, first and
+last invoice dates, CREDIT sales, and the amount still outstanding on CREDIT invoices
+whose status is PENDING. Rows are recomputed for the affected customers inside the same
+transaction that writes an invoice, so reading a customer's figures is a primary-key
+lookup instead of a pass over their invoices. The whole table can be rebuilt with:
+
+    python customer_stats.py rebuild
+"""
+import argparse
+import json
+import sqlite3
+
+STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Customer_Stats (
+    customer_id INTEGER PRIMARY KEY,
+    invoice_count INTEGER NOT NULL DEFAULT 0,
+    lifetime_sales DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    first_invoice_date DATE,
+    last_invoice_date DATE,
+    credit_sales DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    credit_outstanding DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    outstanding_invoices INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# What a ledger line still owes; Customer_Stats.credit_outstanding is its sum.
+AMOUNT_DUE_SQL = "CASE WHEN sale_type = 'CREDIT' AND status = 'PENDING' THEN total_value ELSE 0 END"
+
+_AGGREGATE_SQL = f"""
+    INSERT INTO Customer_Stats (customer_id, invoice_count, lifetime_sales, first_invoice_date, last_invoice_date,
+                                credit_sales, credit_outstanding, outstanding_invoices)
+    SELECT customer_id, COUNT(id), SUM(total_value), MIN(date), MAX(date),
+           TOTAL(CASE WHEN sale_type = 'CREDIT' THEN total_value END), TOTAL({AMOUNT_DUE_SQL}),
+           COUNT(CASE WHEN sale_type = 'CREDIT' AND status = 'PENDING' THEN 1 END)
+    FROM Invoices WHERE {{invoice_filter}}
+    GROUP BY customer_id
+"""
+
+EMPTY_STATS = {
+    'invoice_count': 0, 'lifetime_sales': 0, 'first_invoice_date': None, 'last_invoice_date': None,
+    'credit_sales': 0, 'credit_outstanding': 0, 'outstanding_invoices': 0,
+}
+
+
+def refresh_customers(conn, customer_ids):
+    """Recomputes the stats rows for the given customers. Runs inside the caller's transaction."""
+    customer_ids = sorted({customer_id for customer_id in customer_ids if customer_id})
+    if not customer_ids:
+        return
+    ids_json = json.dumps(customer_ids)
+    id_set = "(SELECT value FROM json_each(?))"
+    conn.execute(f"DELETE FROM Customer_Stats WHERE customer_id IN {id_set}", (ids_json,))
+    conn.execute(_AGGREGATE_SQL.format(invoice_filter=f"customer_id IN {id_set}"), (ids_json,))
+
+
+def rebuild(conn):
+    """Rebuilds the whole stats table from Invoices."""
+    conn.execute(STATS_SCHEMA)
+    conn.execute("DELETE FROM Customer_Stats")
+    conn.execute(_AGGREGATE_SQL.format(invoice_filter="1"))
+
+
+def get_stats(conn, customer_id):
+    """Returns the customer's figures; a customer without invoices has no row and gets EMPTY_STATS."""
+    row = conn.execute(f"SELECT {', '.join(EMPTY_STATS)} FROM Customer_Stats WHERE customer_id = ?",
+                       (customer_id,)).fetchone()
+    return dict(zip(EMPTY_STATS, row)) if row else dict(EMPTY_STATS)
+
+
+def get_ledger_lines(conn, customer_id, limit, before=None):
+    """Returns up to `limit` of the customer's invoices, newest first, as ledger lines without balances.
+
+    `before` is the (date, id) of the last line already shown; lines continue after it.
+    """
+    query = f"""
+        SELECT id AS invoice_id, invoice_no, date, sale_type, status, total_value AS amount,
+               {AMOUNT_DUE_SQL} AS amount_due
+        FROM Invoices WHERE customer_id = ?
+    """
+    params = [customer_id]
+    if before:
+        query += " AND (date, id) < (?, ?)"
+        params.extend(before)
+    query += " ORDER BY date DESC, id DESC LIMIT ?"
+    rows = conn.execute(query, params + [limit]).fetchall()
+    return [dict(zip(('invoice_id', 'invoice_no', 'date', 'sale_type', 'status', 'amount', 'amount_due'), row))
+            for row in rows]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain the Customer_Stats table.')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--db', default='invoice_app.db', help='Path to the SQLite database')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    with conn:
+        rebuild(conn)
+    customers = conn.execute("SELECT COUNT(*) FROM Customer_Stats").fetchone()[0]
+    conn.close()
+    print(f"✅ Rebuilt Customer_Stats ({customers} customers).")
@@ -0,0 +1,166 @@
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+
+# --- Connection Tuning ---
+# WAL lets readers keep working while a writer commits; NORMAL sync is safe in WAL mode
+# and avoids an fsync on every commit.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",      # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """A cursor that reports each execute()/executemany() and its duration to the pool's statement observers.
+
+    The duration covers preparing the statement and stepping to the first row; rows
+    fetched afterwards are not included.
+    """
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.observe_statement(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection.observe_statement(sql, time.perf_counter() - start)
+
+
+class PooledConnection(sqlite3.Connection):
+    """A sqlite3 connection that goes back to its pool when closed instead of being torn down."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self.checkout = None  # token of the current checkout; None while the connection sits in its pool
+
+    def _observed(self):
+        return self._pool is not None and bool(self._pool.statement_observers)
+
+    def cursor(self, factory=None):
+        if factory is None and self._observed():
+            factory = TimedCursor
+        return super().cursor(factory or sqlite3.Cursor)
+
+    # Connection.execute() runs the statement in C without going through the cursor's
+    # execute(), so the shortcuts are timed here as well.
+    def execute(self, sql, parameters=()):
+        if not self._observed():
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not self._observed():
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def observe_statement(self, sql, seconds):
+        if self._pool is not None:
+            for observer in self._pool.statement_observers:
+                observer(sql, seconds)
+
+    def close(self, checkout=None):
+        """Returns the connection to its pool.
+
+        Pass the `checkout` token read when the connection was acquired to release only that
+        checkout: once the connection has been returned (and perhaps handed to someone else),
+        closing it with an old token does nothing.
+        """
+        if self._pool is None:
+            super().close()
+            return
+        if self.checkout is None or (checkout is not None and checkout != self.checkout):
+            return
+        self.checkout = None
+        if self.in_transaction:
+            self.rollback()
+        self._pool.release(self)
+
+    def dispose(self):
+        """Really closes the underlying SQLite handle."""
+        self._pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """A small pool of ready-to-use SQLite connections.
+
+    Connections are opened lazily, handed to one thread at a time and kept open between
+    requests, so the file open, schema parse and page-cache warmup are paid once per
+    connection rather than once per request. A read-only pool opens the database with
+    mode=ro and query_only so it can never take the write lock.
+    """
+
+    def __init__(self, db_file, size=8, readonly=False):
+        self.db_file = db_file
+        self.size = size
+        self.readonly = readonly
+        self._idle = queue.LifoQueue(maxsize=size)
+        self.connect_hooks = []  # callables run on every newly opened connection
+        self.statement_observers = []  # callables given (sql, seconds) for every statement run
+        self._wal_checked = False
+        self._lock = threading.Lock()
+        self._checkouts = itertools.count(1)
+
+    def _connect(self):
+        if self.readonly:
+            conn = sqlite3.connect(f'file:{self.db_file}?mode=ro', uri=True,
+                                   check_same_thread=False, factory=PooledConnection)
+        else:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False, factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        if self.readonly:
+            conn.execute("PRAGMA query_only = 1")
+        conn._pool = self
+        for hook in self.connect_hooks:
+            hook(conn)
+        return conn
+
+    def _ensure_wal(self):
+        """Switches the database file to WAL journaling; the setting persists in the file."""
+        with self._lock:
+            if self._wal_checked:
+                return
+            conn = sqlite3.connect(self.db_file)
+            try:
+                conn.execute("PRAGMA journal_mode = WAL")
+            finally:
+                conn.close()
+            self._wal_checked = True
+
+    def acquire(self):
+        if not self._wal_checked:
+            self._ensure_wal()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        conn.checkout = next(self._checkouts)
+        return conn
+
+    def release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.dispose()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().dispose()
+            except queue.Empty:
+                break
@@ -0,0 +1,89 @@
+"""Tabular reports for GST filing (GSTR-1): invoices, line items and an HSN-wise summary.
+
+Each report is a header row and one query over a date range whose SELECT list is in
+header order. server.py streams the rows from the cursor in batches into CSV or XLSX,
+so a full financial year is exported without holding the result in memory.
+"""
+from datetime import datetime
+
+# Invoice_Items.total_amount includes tax; the taxable value is what remains without it.
+# Amounts are stored unrounded, so every money column is rounded to paise for filing.
+LINE_TAXABLE_VALUE = "ROUND(ii.total_amount - ii.cgst_amount - ii.sgst_amount - ii.igst_amount - COALESCE(ii.cess_amount, 0), 2)"
+
+INVOICE_HEADER = [
+    'Invoice No', 'Invoice Date', 'Customer', 'Customer GSTIN', 'Place of Supply', 'Sale Type',
+    'Taxable Value', 'CGST', 'SGST', 'IGST', 'Cess', 'Round Off', 'Invoice Value', 'Status',
+]
+INVOICE_QUERY = """
+    SELECT i.invoice_no, i.date, c.name AS customer_name, c.gstin AS customer_gstin, c.place_of_supply,
+           i.sale_type, ROUND(i.taxable_value, 2) AS taxable_value, ROUND(i.cgst, 2) AS cgst,
+           ROUND(i.sgst, 2) AS sgst, ROUND(i.igst, 2) AS igst, ROUND(i.cess, 2) AS cess,
+           ROUND(i.round_off, 2) AS round_off, ROUND(i.total_value, 2) AS total_value, i.status
+    FROM Invoices i JOIN Customers c ON i.customer_id = c.id
+    WHERE i.date BETWEEN ? AND ?
+    ORDER BY i.date, i.id
+"""
+
+LINE_ITEM_HEADER = [
+    'Invoice No', 'Invoice Date', 'Customer', 'Customer GSTIN', 'Item', 'HSN/SAC',
+    'Quantity', 'Free Quantity', 'Unit', 'Rate', 'Discount', 'GST Rate', 'Taxable Value',
+    'CGST', 'SGST', 'IGST', 'Cess', 'Total',
+]
+LINE_ITEM_QUERY = f"""
+    SELECT i.invoice_no, i.date, c.name AS customer_name, c.gstin AS customer_gstin,
+           it.name AS item_name, COALESCE(ii.hsn_code, it.hsn_code) AS hsn_code,
+           ii.quantity, ii.free_quantity, ii.unit, ROUND(ii.price_per_unit, 2) AS price_per_unit,
+           ROUND(ii.discount, 2) AS discount, ii.gst_rate, {LINE_TAXABLE_VALUE} AS taxable_value,
+           ROUND(ii.cgst_amount, 2) AS cgst_amount, ROUND(ii.sgst_amount, 2) AS sgst_amount,
+           ROUND(ii.igst_amount, 2) AS igst_amount, ROUND(ii.cess_amount, 2) AS cess_amount,
+           ROUND(ii.total_amount, 2) AS total_amount
+    FROM Invoices i
+    JOIN Customers c ON i.customer_id = c.id
+    JOIN Invoice_Items ii ON ii.invoice_id = i.id
+    JOIN Items it ON ii.item_id = it.id
+    WHERE i.date BETWEEN ? AND ?
+    ORDER BY i.date, i.id, ii.id
+"""
+
+# GSTR-1 Table 12: one row per HSN code, unit and tax rate.
+HSN_SUMMARY_HEADER = [
+    'HSN/SAC', 'Description', 'UQC', 'GST Rate', 'Total Quantity', 'Total Value', 'Taxable Value',
+    'IGST', 'CGST', 'SGST', 'Cess',
+]
+HSN_SUMMARY_QUERY = f"""
+    SELECT COALESCE(ii.hsn_code, it.hsn_code) AS hsn_code, MAX(h.description) AS description,
+           ii.unit, ii.gst_rate,
+           SUM(ii.quantity) AS total_quantity,
+           ROUND(SUM(ii.total_amount), 2) AS total_value,
+           ROUND(SUM({LINE_TAXABLE_VALUE}), 2) AS taxable_value,
+           ROUND(SUM(ii.igst_amount), 2) AS igst,
+           ROUND(SUM(ii.cgst_amount), 2) AS cgst,
+           ROUND(SUM(ii.sgst_amount), 2) AS sgst,
+           ROUND(SUM(COALESCE(ii.cess_amount, 0)), 2) AS cess
+    FROM Invoices i
+    JOIN Invoice_Items ii ON ii.invoice_id = i.id
+    JOIN Items it ON ii.item_id = it.id
+    LEFT JOIN HSN_Codes h ON h.code = COALESCE(ii.hsn_code, it.hsn_code)
+    WHERE i.date BETWEEN ? AND ?
+    GROUP BY 1, ii.unit, ii.gst_rate
+    ORDER BY 1, ii.gst_rate, ii.unit
+"""
+
+# report name -> (sheet title, header, query taking (start_date, end_date))
+REPORTS = {
+    'invoices': ('Invoices', INVOICE_HEADER, INVOICE_QUERY),
+    'line_items': ('Line Items', LINE_ITEM_HEADER, LINE_ITEM_QUERY),
+    'hsn_summary': ('HSN Summary', HSN_SUMMARY_HEADER, HSN_SUMMARY_QUERY),
+}
+
+
+def parse_date_range(args):
+    """Returns (start_date, end_date) from the request args; a missing bound leaves that side open.
+
+    Raises ValueError if a date is not in YYYY-MM-DD format.
+    """
+    start_date = args.get('start_date') or '0001-01-01'
+    end_date = args.get('end_date') or '9999-12-31'
+    for value in (start_date, end_date):
+        datetime.strptime(value, '%Y-%m-%d')
+    return start_date, end_date
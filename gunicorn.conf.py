@@ -0,0 +1,70 @@
+"""Production server settings for gunicorn: `gunicorn -c gunicorn.conf.py`.
+
+Two profiles, picked with SERVER_PROFILE, run as separate gunicorn instances behind a
+reverse proxy that sends the PDF routes to one and everything else to the other (see
+the README). That way a burst of slow PDF renders cannot tie up the workers that
+answer the invoice editor's fast JSON calls.
+
+api (default): preforked gthread workers, one per core, each with a few threads.
+    The app is preloaded in the master, so imports, migrations and other startup
+    work happen once and the workers share those pages copy-on-write. PDF rendering
+    is not warmed up here.
+
+pdf: one gthread worker whose threads hand renders to pdf_worker's process pool
+    (PDF_WORKERS processes, one per core by default), with PDF_WARMUP on. It is a
+    single worker because background PDF jobs are tracked in that process's memory,
+    so a job's status has to be polled from the process that queued it.
+
+With gthread workers, `timeout` restarts a worker that has stopped responding as a
+whole; one slow request does not trigger it. Per-request limits belong in the proxy
+(e.g. nginx proxy_read_timeout 30s for the api profile, 300s for merged PDF exports).
+
+Every setting can still be overridden on the command line or through
+GUNICORN_CMD_ARGS, e.g. GUNICORN_CMD_ARGS="--workers 4 --bind 0.0.0.0:8000".
+
+Graceful reload: `kill -HUP <master pid>` starts new workers and lets the old ones
+finish their requests (up to graceful_timeout). The api profile preloads the app, so
+HUP does not pick up new code; deploy new code with USR2 (start a new master
+alongside the old one), then QUIT the old master.
+"""
+import multiprocessing
+import os
+
+PROFILES = ('api', 'pdf')
+
+profile = os.environ.get('SERVER_PROFILE', 'api')
+if profile not in PROFILES:
+    raise RuntimeError(f"SERVER_PROFILE must be one of: {', '.join(PROFILES)}")
+
+cores = multiprocessing.cpu_count()
+
+wsgi_app = 'wsgi:app'
+worker_class = 'gthread'
+keepalive = 5
+graceful_timeout = 30
+accesslog = '-'
+proc_name = f'invoice-{profile}'
+# gunicorn 25+ opens a control socket; give each profile its own so both can run at once.
+control_socket = os.path.expanduser(f'~/.gunicorn/invoice-{profile}.ctl')
+
+if profile == 'api':
+    bind = os.environ.get('BIND', '127.0.0.1:8000')
+    # One per core: the threads already cover SQLite and network waits, and more processes
+    # than cores only adds context switches (measured in the README).
+    workers = int(os.environ.get('WEB_CONCURRENCY', cores))
+    threads = int(os.environ.get('API_THREADS', 4))
+    preload_app = True
+    timeout = 30
+else:
+    bind = os.environ.get('BIND', '127.0.0.1:8001')
+    workers = 1
+    # Enough threads to keep every pool process busy while others wait on SQLite or the client.
+    threads = int(os.environ.get('PDF_THREADS', 2 * cores + 2))
+    # Loading the app in the worker (not the master) keeps the render pool a child of the
+    # process that uses it.
+    preload_app = False
+    timeout = 120
+    # Read by server.py at import time.
+    os.environ.setdefault('PDF_WARMUP', '1')
+    os.environ.setdefault('PDF_RENDER_IN_POOL', '1')
+    os.environ.setdefault('PDF_WORKERS', str(cores))
@@ -4,8 +4,11 @@ document.addEventListener('DOMContentLoaded', () => {
     let isUpdatingDiscount = false; // Flag to prevent infinite loops
     let activeRowForAddItem = null; 
     let currentInvoiceId = null; 
+    let currentInvoiceVersion = null; // sent back on update so a save over someone else's changes is refused
+    let suggestedInvoiceSuffix = null; // the number shown for a new invoice; allocated by the server on save
     const API_BASE_URL = 'http://127.0.0.1:5000/api';
     const GST_RATES = [0, 5, 12, 18, 28];
+    const SUGGEST_DEBOUNCE_MS = 120; // suggestions are answered from memory, so a short pause is enough
     const GST_STATE_CODES = {"01":"Jammu and Kashmir","02":"Himachal Pradesh","03":"Punjab","04":"Chandigarh","05":"Uttarakhand","06":"Haryana","07":"Delhi","08":"Rajasthan","09":"Uttar Pradesh","10":"Bihar","11":"Sikkim","12":"Arunachal Pradesh","13":"Nagaland","14":"Manipur","15":"Mizoram","16":"Tripura","17":"Meghalaya","18":"Assam","19":"West Bengal","20":"Jharkhand","21":"Odisha","22":"Chhattisgarh","23":"Madhya Pradesh","24":"Gujarat","25":"Daman and Diu","26":"Dadra and Nagar Haveli","27":"Maharashtra","28":"Andhra Pradesh (Old)","29":"Karnataka","30":"Goa","31":"Lakshadweep","32":"Kerala","33":"Tamil Nadu","34":"Puducherry","35":"Andaman and Nicobar Islands","36":"Telangana","37":"Andhra Pradesh (New)","97":"Other Territory"};
     
     // --- DOM ELEMENT SELECTORS ---
@@ -121,7 +124,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         const customerSearchInput = document.getElementById('customer-search');
         customerSearchInput.addEventListener('focus', () => fetchAndDisplayCustomers());
-        customerSearchInput.addEventListener('input', debounce(fetchAndDisplayCustomers, 300));
+        customerSearchInput.addEventListener('input', debounce(fetchAndDisplayCustomers, SUGGEST_DEBOUNCE_MS));
 
         invoiceBody.addEventListener('focusin', (e) => {
             if (e.target.classList.contains('item-search')) {
@@ -132,7 +135,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (e.target.classList.contains('item-search')) {
                 fetchAndDisplayItems(e.target);
             }
-        }, 300));
+        }, SUGGEST_DEBOUNCE_MS));
 
         document.addEventListener('click', e => {
             if (e.target.classList.contains('add-party-btn')) {
@@ -207,12 +210,14 @@ document.addEventListener('DOMContentLoaded', () => {
             document.getElementById('invoice-number-suffix').value = suffix;
             document.getElementById('invoice-date').value = data.invoice.date;
             document.querySelector('textarea[name="description"]').value = data.invoice.notes || '';
+            currentInvoiceVersion = data.invoice.version;
 
             // Populate items table
             invoiceBody.innerHTML = ''; // Clear any empty rows
             data.items.forEach(item => {
                 addRow(); // Add a new blank row
                 const newRow = invoiceBody.querySelector('tr:last-child');
+                newRow.dataset.lineId = item.id; // lets the server update this line in place
                 fillRowWithItemData(newRow, {
                     name: item.item_name,
                     hsn_code: item.hsn_code,
@@ -337,16 +342,26 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             const numberResponse = await fetch(`${API_BASE_URL}/latest_invoice_number?prefix=${selectedPrefix}`);
             const data = await numberResponse.json();
-            if (data.next_number) suffixInput.value = data.next_number;
+            if (data.next_number) suffixInput.value = suggestedInvoiceSuffix = data.next_number;
         } catch (error) { console.error('Failed to fetch latest invoice number:', error); }
     }
 
+    // Pickers are served by /api/suggest. Each picker numbers its requests, and a response
+    // is only shown if no newer request has been sent since, so results never go backwards.
+    const suggestSeq = { customers: 0, items: 0 };
+    async function fetchSuggestions(type, query) {
+        const seq = ++suggestSeq[type];
+        const response = await fetch(`${API_BASE_URL}/suggest?type=${type}&q=${encodeURIComponent(query)}&seq=${seq}`);
+        const data = await response.json();
+        return data.seq === suggestSeq[type] ? data.results : null;
+    }
+
     async function fetchAndDisplayCustomers() {
         const inputEl = document.getElementById('customer-search');
         const resultsContainer = document.getElementById('customer-results');
         try {
-            const response = await fetch(`${API_BASE_URL}/customers?search=${inputEl.value}`);
-            const customers = await response.json();
+            const customers = await fetchSuggestions('customers', inputEl.value);
+            if (!customers) return; // superseded by a newer keystroke
             resultsContainer.innerHTML = '';
 
             const addBtn = document.createElement('div');
@@ -371,8 +386,8 @@ document.addEventListener('DOMContentLoaded', () => {
     async function fetchAndDisplayItems(targetInput) {
         const resultsContainer = targetInput.closest('.search-wrapper').querySelector('.search-results-list');
         try {
-            const response = await fetch(`${API_BASE_URL}/items?search=${targetInput.value}`);
-            const items = await response.json();
+            const items = await fetchSuggestions('items', targetInput.value);
+            if (!items) return; // superseded by a newer keystroke
             resultsContainer.innerHTML = '';
             
             const addBtn = document.createElement('div');
@@ -606,6 +621,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const taxAmount = taxableAmount * taxRate;
 
             items.push({
+                id: row.dataset.lineId ? Number(row.dataset.lineId) : undefined, // unset for rows added in this edit
                 // item_id should be stored in a data attribute when an item is selected.
                 // Hardcoding item_id = 1 for now as a placeholder.
                 item_id: 1, 
@@ -631,8 +647,15 @@ document.addEventListener('DOMContentLoaded', () => {
         const taxableValue = extractNumber(taxableTotalText);
         const totalTax = (extractNumber(document.getElementById('tax-summary').textContent.split('CGST @')[1]) * 2) || 0; // Simplified
 
+        const prefix = document.getElementById('invoice-prefix-select').value;
+        const suffix = document.getElementById('invoice-number-suffix').value;
+        // A new invoice keeping the suggested number lets the server allocate it, so two
+        // people saving at once cannot both take it; a number typed by hand is sent as is.
+        const useServerNumber = !currentInvoiceId && suffix === suggestedInvoiceSuffix;
+
         const invoiceData = {
-            invoice_no: `${document.getElementById('invoice-prefix-select').value}${document.getElementById('invoice-number-suffix').value}`,
+            invoice_no: useServerNumber ? null : `${prefix}${suffix}`,
+            prefix: prefix,
             date: document.getElementById('invoice-date').value,
             customer_id: 1, // Placeholder customer ID
             items: items,
@@ -641,7 +664,10 @@ document.addEventListener('DOMContentLoaded', () => {
             sgst: totalTax / 2,
             round_off: extractNumber(document.getElementById('round-off').textContent),
             total_value: extractNumber(grandTotalText),
-            notes: document.querySelector('textarea[name="description"]').value
+            // The server recomputes every amount from the lines; it needs the invoice-level discount to do so.
+            discount: parseFloat(document.getElementById('final-discount-amount').value) || 0,
+            notes: document.querySelector('textarea[name="description"]').value,
+            version: currentInvoiceVersion
         };
 
         return invoiceData;
@@ -673,6 +699,12 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify(invoiceData)
             });
 
+            // A 409 on update means someone else saved this invoice after it was loaded here.
+            if (method === 'PUT' && response.status === 409) {
+                alert('This invoice was changed by someone else since you opened it. Reload it to see their changes, then edit again.');
+                return;
+            }
+
             // Step 5: Handle a failed response from the server.
             if (!response.ok) {
                 const errData = await response.json();
@@ -685,7 +717,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const newInvoiceId = result.invoice_id;
 
             // Show a success message to the user.
-            showNotification(`Invoice ${invoiceData.invoice_no} ${actionText} successfully!`, 'success');
+            showNotification(`Invoice ${result.invoice_no || invoiceData.invoice_no} ${actionText} successfully!`, 'success');
 
             // Step 7: If the 'print' button was clicked, open the PDF in a new tab.
             if (isPrint) {
@@ -0,0 +1,181 @@
+"""Invoice rows as stored in SQLite, shared by the single-invoice endpoints and the bulk importer."""
+import re
+
+INSERT_INVOICE_SQL = """
+    INSERT INTO Invoices (invoice_no, date, customer_id, sale_type, notes,
+                          total_value, taxable_value, cgst, sgst, igst, cess, round_off, status)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# The Invoice_Items columns a client's line sets, in the order line_values() returns them.
+LINE_COLUMNS = ('item_id', 'quantity', 'free_quantity', 'unit', 'price_per_unit', 'discount', 'gst_rate',
+                'cgst_amount', 'sgst_amount', 'igst_amount', 'cess_amount', 'total_amount', 'hsn_code')
+
+# A line's purchase_price is its item's purchase price when the line is saved (unless one is
+# passed in), so later changes to Items.purchase_price do not rewrite past profit.
+INSERT_ITEMS_SQL = f"""
+    INSERT INTO Invoice_Items (invoice_id, {', '.join(LINE_COLUMNS)}, purchase_price)
+    VALUES (?, {', '.join('?' * len(LINE_COLUMNS))}, COALESCE(?, (SELECT purchase_price FROM Items WHERE id = ?)))
+"""
+
+# SET expressions see the row as it was, so a line keeps its purchase price unless its item changes.
+UPDATE_ITEM_SQL = f"""
+    UPDATE Invoice_Items
+    SET {', '.join(f'{column} = ?' for column in LINE_COLUMNS)},
+        purchase_price = CASE WHEN item_id = ? THEN purchase_price
+                              ELSE (SELECT purchase_price FROM Items WHERE id = ?) END
+    WHERE id = ?
+"""
+
+# Bumped on every update; a client that saves with an older version is editing a stale copy.
+UPDATE_INVOICE_SQL = """
+    UPDATE Invoices
+    SET invoice_no = ?, date = ?, customer_id = ?, sale_type = ?, notes = ?,
+        total_value = ?, taxable_value = ?, cgst = ?, sgst = ?, igst = ?,
+        cess = ?, round_off = ?, status = ?, version = version + 1
+    WHERE id = ?
+"""
+
+# An invoice number is its prefix (up to the last '/') followed by digits, e.g. FY25-26/0042.
+INVOICE_NUMBER_RE = re.compile(r'^(.*/)(\d+)$')
+
+
+def invoice_values(data, status='PAID'):
+    return (
+        data['invoice_no'], data['date'], data['customer_id'], data.get('sale_type', 'CASH'),
+        data.get('notes'), data['total_value'], data['taxable_value'], data['cgst'],
+        data['sgst'], data.get('igst', 0), data.get('cess', 0), data.get('round_off', 0), status
+    )
+
+
+def line_values(item):
+    """A client's line as values for LINE_COLUMNS."""
+    return (
+        item['item_id'], item.get('quantity', 1), item.get('free_quantity', 0),
+        item.get('unit', 'PCS'), item['price_per_unit'], item.get('discount', 0),
+        item['gst_rate'], item['cgst_amount'], item['sgst_amount'], item.get('igst_amount', 0),
+        item.get('cess_amount', 0), item['total_amount'], item.get('hsn_code')
+    )
+
+
+def item_values(invoice_id, items, purchase_prices=None):
+    """Parameters for INSERT_ITEMS_SQL; `purchase_prices` ({item_id: price}) overrides the items' current prices."""
+    purchase_prices = purchase_prices or {}
+    return [(invoice_id, *line_values(item), purchase_prices.get(item['item_id']), item['item_id'])
+            for item in items]
+
+
+def insert_invoice(cursor, data, status='PAID'):
+    """Inserts an invoice and its line items and returns the new invoice id."""
+    cursor.execute(INSERT_INVOICE_SQL, invoice_values(data, status))
+    invoice_id = cursor.lastrowid
+    cursor.executemany(INSERT_ITEMS_SQL, item_values(invoice_id, data['items']))
+    return invoice_id
+
+
+def save_invoice_lines(conn, invoice_id, items):
+    """Brings an invoice's stored lines in line with `items` and returns how many were inserted, updated and deleted.
+
+    A line that carries the `id` of one of the invoice's Invoice_Items rows updates that
+    row, and only if one of its values changed; a line without an id is inserted; stored
+    lines that are not sent are deleted. Run it inside the caller's write transaction.
+    Raises ValueError for an id that is not one of this invoice's lines, or is sent twice.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    stored = {row[0]: row[1:] for row in cursor.execute(
+        f"SELECT id, {', '.join(LINE_COLUMNS)}, purchase_price FROM Invoice_Items WHERE invoice_id = ?", (invoice_id,))}
+    kept, updates, inserts = set(), [], []
+    for item in items:
+        line_id = item.get('id')
+        values = line_values(item)
+        if line_id is None:
+            inserts.append(item)
+        elif line_id not in stored:
+            raise ValueError(f"Line {line_id} is not part of invoice {invoice_id}")
+        elif line_id in kept:
+            raise ValueError(f"Line {line_id} is sent more than once")
+        else:
+            kept.add(line_id)
+            if values != stored[line_id][:-1]:
+                updates.append((*values, item['item_id'], item['item_id'], line_id))
+    deleted = [line_id for line_id in stored if line_id not in kept]
+
+    # New lines for an item whose line was removed (e.g. by a client that does not send ids)
+    # keep the purchase price it was sold at.
+    purchase_prices = {stored[line_id][0]: stored[line_id][-1] for line_id in deleted
+                       if stored[line_id][-1] is not None}
+    cursor.executemany("DELETE FROM Invoice_Items WHERE id = ?", [(line_id,) for line_id in deleted])
+    cursor.executemany(UPDATE_ITEM_SQL, updates)
+    cursor.executemany(INSERT_ITEMS_SQL, item_values(invoice_id, inserts, purchase_prices))
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(deleted)}
+
+
+def next_invoice_number(conn, prefix):
+    """Returns the number after the highest existing invoice number for `prefix` (1 if there is none).
+
+    This scans every invoice with the prefix; the request paths read the per-prefix counter
+    instead (see reserve_invoice_numbers) and only fall back to it for an unknown prefix.
+    """
+    # A range on invoice_no (rather than LIKE 'prefix%') lets SQLite use the invoice_no index.
+    last_invoice = conn.execute(
+        "SELECT invoice_no FROM Invoices WHERE invoice_no >= ? AND invoice_no < ? "
+        "ORDER BY CAST(SUBSTR(invoice_no, INSTR(invoice_no, '/') + 1) AS INTEGER) DESC LIMIT 1",
+        (prefix, prefix + '\uffff')
+    ).fetchone()
+    if last_invoice:
+        last_num_str = re.search(r'/(\d+)$', last_invoice[0])
+        if last_num_str:
+            return int(last_num_str.group(1)) + 1
+    return 1
+
+
+def format_invoice_number(prefix, number):
+    return f"{prefix}{number:04d}"
+
+
+def split_invoice_number(invoice_no):
+    """Returns (prefix, number) for an invoice number like 'FY25-26/0042', or None if it has no numeric suffix."""
+    match = INVOICE_NUMBER_RE.match(invoice_no or '')
+    return (match.group(1), int(match.group(2))) if match else None
+
+
+def peek_invoice_number(conn, prefix):
+    """Returns the number the next allocation for `prefix` will get, without reserving it."""
+    row = conn.execute("SELECT next_number FROM Invoice_Prefixes WHERE prefix = ?", (prefix,)).fetchone()
+    return row[0] if row else next_invoice_number(conn, prefix)
+
+
+def reserve_invoice_numbers(conn, prefix, count=1):
+    """Reserves `count` consecutive numbers for `prefix` and returns the first one.
+
+    Call it inside the write transaction that uses the numbers. The UPDATE takes the write
+    lock before the counter is read, so two concurrent saves queue up and never get the
+    same number, and the reservation is undone if the transaction rolls back. A prefix
+    without a counter row yet gets one, starting after its highest existing invoice.
+    """
+    cursor = conn.execute("UPDATE Invoice_Prefixes SET next_number = next_number + ? WHERE prefix = ?", (count, prefix))
+    if cursor.rowcount:
+        return conn.execute("SELECT next_number FROM Invoice_Prefixes WHERE prefix = ?", (prefix,)).fetchone()[0] - count
+    first = next_invoice_number(conn, prefix)
+    conn.execute("INSERT INTO Invoice_Prefixes (prefix, next_number) VALUES (?, ?)", (prefix, first + count))
+    return first
+
+
+def advance_invoice_counter(conn, prefix, next_number):
+    """Moves the counter for `prefix` up to `next_number`; it never moves down."""
+    conn.execute("UPDATE Invoice_Prefixes SET next_number = MAX(next_number, ?) WHERE prefix = ?", (next_number, prefix))
+
+
+def record_invoice_number(conn, invoice_no):
+    """Moves the counter past an invoice number the client chose, so it is never allocated again."""
+    parsed = split_invoice_number(invoice_no)
+    if parsed:
+        advance_invoice_counter(conn, parsed[0], parsed[1] + 1)
+
+
+def sync_invoice_counters(conn):
+    """Sets every prefix's counter from the invoices already stored (after seeding, or when migrating)."""
+    for (prefix,) in conn.execute("SELECT prefix FROM Invoice_Prefixes").fetchall():
+        conn.execute("UPDATE Invoice_Prefixes SET next_number = ? WHERE prefix = ?",
+                     (next_invoice_number(conn, prefix), prefix))
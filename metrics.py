@@ -0,0 +1,189 @@
+"""Request, SQL and PDF timings, served at /metrics in the Prometheus text format.
+
+install(app) times every request by its route pattern (/api/invoices/<int:invoice_id>,
+not the concrete URL), so the label set stays small. Timing ends when the view returns
+its response; the body of a streamed response is still being generated after that
+point and is not included.
+
+SQL statements are timed by the connection pools (see ConnectionPool.statement_observers)
+and labelled with their text, whitespace-collapsed and with variable-length IN (...)
+lists folded, up to MAX_STATEMENT_LABELS distinct statements. PDF renders report the
+time spent per phase: loading the invoice data, rendering the template, laying out the
+HTML and writing the PDF.
+
+Every worker process keeps its own numbers; Prometheus adds them up across workers.
+
+Setting PROFILING_ENABLED=1 lets a client ask for a cProfile dump of one request by
+sending an X-Profile header. The profile is written to PROFILE_DIR and its path comes
+back in the X-Profile-File response header. Open it with `python -m pstats <file>` or
+snakeviz.
+"""
+import cProfile
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+import reference_cache
+
+# --- Buckets (seconds) ---
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PDF_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Distinct SQL statements given their own label; the rest are counted under "other".
+MAX_STATEMENT_LABELS = 200
+MAX_STATEMENT_LENGTH = 200
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_HEADER = 'X-Profile'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+WHITESPACE_RE = re.compile(r'\s+')
+PLACEHOLDER_LIST_RE = re.compile(r'\?(?:\s*,\s*\?)+')
+
+# name -> Histogram, in registration order
+REGISTRY = {}
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """A labelled latency histogram; observe() is safe to call from any thread."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def observe(self, label_values, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def render(self):
+        with self._lock:
+            series = {labels: ([*counts], total) for labels, (counts, total) in self._series.items()}
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f'{self.name}_bucket{format_labels(self.label_names, labels, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.label_names, labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+http_requests = Histogram(
+    'http_request_duration_seconds', 'Time to handle an HTTP request, by route pattern.',
+    ('method', 'route', 'status'), HTTP_BUCKETS)
+sql_statements = Histogram(
+    'sqlite_statement_duration_seconds', 'Time to execute a SQL statement (up to its first row).',
+    ('statement',), SQL_BUCKETS)
+pdf_phases = Histogram(
+    'pdf_render_phase_duration_seconds',
+    'Time per PDF render phase: data (load from SQLite), template, layout, write.',
+    ('phase', 'template'), PDF_BUCKETS)
+
+_statement_labels = {}  # raw SQL -> label
+_statement_lock = threading.Lock()
+
+
+def statement_label(sql):
+    label = _statement_labels.get(sql)
+    if label is not None:
+        return label
+    with _statement_lock:
+        if len(_statement_labels) >= MAX_STATEMENT_LABELS:
+            return 'other'
+        label = WHITESPACE_RE.sub(' ', sql).strip()
+        label = PLACEHOLDER_LIST_RE.sub('?, ...', label)[:MAX_STATEMENT_LENGTH]
+        _statement_labels[sql] = label
+        return label
+
+
+def observe_statement(sql, seconds):
+    """Statement observer for ConnectionPool.statement_observers."""
+    sql_statements.observe((statement_label(sql),), seconds)
+
+
+def observe_pdf_timings(template_name, timings):
+    """Records a render's phase timings (as returned by PdfRenderer.write_pdf)."""
+    for phase, seconds in timings.items():
+        pdf_phases.observe((phase, template_name), seconds)
+
+
+def render():
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for histogram in REGISTRY.values():
+        lines.extend(histogram.render())
+
+    caches = reference_cache.stats()
+    for field, help_text in (('hits', 'Reference cache lookups served from memory.'),
+                             ('misses', 'Reference cache lookups that went to SQLite.'),
+                             ('invalidations', 'Reference cache invalidations after writes.')):
+        name = f'reference_cache_{field}_total'
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        lines += [f'{name}{format_labels(("cache",), (cache,))} {stats[field]}' for cache, stats in caches.items()]
+    return '\n'.join(lines) + '\n'
+
+
+# --- Flask Integration ---
+
+def start_request():
+    g.metrics_start = time.perf_counter()
+    if PROFILING_ENABLED and PROFILE_HEADER in request.headers:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def finish_request(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        route = re.sub(r'\W+', '_', request.path).strip('_') or 'root'
+        path = os.path.join(PROFILE_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{route}.prof')
+        profiler.dump_stats(path)
+        response.headers['X-Profile-File'] = path
+
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_requests.observe((request.method, route, str(response.status_code)), time.perf_counter() - start)
+    return response
+
+
+def metrics_endpoint():
+    return Response(render(), content_type=CONTENT_TYPE)
+
+
+def install(app):
+    """Times every request of `app` and serves the metrics at /metrics."""
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
@@ -0,0 +1,137 @@
+"""Schema migrations for existing databases.
+
+schema.sql describes a fresh database; the functions here bring an older invoice_app.db
+up to date. Each migration is idempotent and runs once, tracked through
+PRAGMA user_version. Run them with `python migrations.py` or let server.py apply them
+on startup.
+"""
+import argparse
+import sqlite3
+
+import customer_stats
+import invoice_store
+import sales_rollup
+import search_index
+
+
+def add_daily_sales_rollup(conn):
+    # Filled by add_line_purchase_price, once the lines carry the purchase price the rollup reads.
+    conn.execute(sales_rollup.ROLLUP_SCHEMA)
+
+
+def add_lookup_indexes(conn):
+    # Covering indexes for the date-range listings/KPIs, the per-customer lookups and the
+    # invoice -> line item joins (quantity and price are included so profit needs no table reads).
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_date_total ON Invoices (date, total_value)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_customer ON Invoices (customer_id, date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice ON Invoice_Items (invoice_id, item_id, quantity, price_per_unit)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoice_items_item ON Invoice_Items (item_id)")
+
+
+def add_search_index(conn):
+    if not search_index.is_supported(conn):
+        # Older SQLite builds keep working with the LIKE-based search.
+        return
+    search_index.create(conn)
+
+
+def add_keyset_index(conn):
+    # (date, rowid) order lets keyset pages on (date, id) stream straight from the index.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_date ON Invoices (date)")
+
+
+def add_invoice_number_counters(conn):
+    # A per-prefix counter replaces the scan over every invoice with the prefix.
+    if not has_column(conn, 'Invoice_Prefixes', 'next_number'):
+        conn.execute("ALTER TABLE Invoice_Prefixes ADD COLUMN next_number INTEGER NOT NULL DEFAULT 1")
+    invoice_store.sync_invoice_counters(conn)
+
+
+def add_customer_stats(conn):
+    conn.execute(customer_stats.STATS_SCHEMA)
+    customer_stats.rebuild(conn)
+
+
+def add_line_purchase_price(conn):
+    # Profit is taken from the purchase price stored on each line, so it no longer changes when an
+    # item's price is edited, and the rollup no longer joins Items. Lines saved before this have no
+    # record of their cost, so they get the item's current price.
+    if not has_column(conn, 'Invoice_Items', 'purchase_price'):
+        conn.execute("ALTER TABLE Invoice_Items ADD COLUMN purchase_price DECIMAL(10, 2)")
+    conn.execute("""
+        UPDATE Invoice_Items SET purchase_price = (SELECT purchase_price FROM Items WHERE Items.id = Invoice_Items.item_id)
+        WHERE purchase_price IS NULL
+    """)
+    # Extend the covering index so the profit aggregate still reads no table rows.
+    if 'purchase_price' not in index_columns(conn, 'idx_invoice_items_invoice'):
+        conn.execute("DROP INDEX IF EXISTS idx_invoice_items_invoice")
+        conn.execute("CREATE INDEX idx_invoice_items_invoice ON Invoice_Items "
+                     "(invoice_id, item_id, quantity, price_per_unit, purchase_price)")
+    sales_rollup.rebuild(conn)
+
+
+def add_invoice_version(conn):
+    # Updates compare and bump this, so a save based on a stale copy of the invoice is refused.
+    if not has_column(conn, 'Invoices', 'version'):
+        conn.execute("ALTER TABLE Invoices ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+# Ordered list of (version, migration); never renumber or remove entries.
+MIGRATIONS = [
+    (1, add_daily_sales_rollup),
+    (2, add_lookup_indexes),
+    (3, add_search_index),
+    (4, add_keyset_index),
+    (5, add_invoice_number_counters),
+    (6, add_customer_stats),
+    (7, add_line_purchase_price),
+    (8, add_invoice_version),
+]
+
+
+def has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def has_column(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def index_columns(conn, index):
+    return [row[2] for row in conn.execute(f"PRAGMA index_info({index})")]
+
+
+def apply_migrations(db_file):
+    """Applies every pending migration and returns the list of versions that ran."""
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        if not has_table(conn, 'Invoices'):
+            # Nothing to migrate until seed_database.py has created the schema.
+            return []
+        # Take the write lock before reading the version so concurrently starting workers
+        # cannot both decide to run the same migration.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            applied = []
+            for version, migration in MIGRATIONS:
+                if version <= current:
+                    continue
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(version)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return applied
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply pending schema migrations.')
+    parser.add_argument('--db', default='invoice_app.db', help='Path to the SQLite database')
+    args = parser.parse_args()
+    applied = apply_migrations(args.db)
+    print(f"✅ Applied migrations: {applied}" if applied else "✅ Database is up to date.")
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class PdfCache:
+    """Content-addressed cache of rendered invoice PDFs.
+
+    Entries are keyed by a hash of the template data plus the template name and its
+    modification time, so any change to the invoice, customer, business profile or the
+    template itself yields a new key. Rendered PDFs are kept in an in-memory LRU bounded
+    by entry count and total bytes, and optionally mirrored to a directory on disk so
+    they survive restarts.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024, disk_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (invoice_id, pdf bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(data, template_name, template_mtime):
+        payload = json.dumps(data, sort_keys=True, default=str)
+        digest = hashlib.sha256()
+        digest.update(payload.encode('utf-8'))
+        digest.update(f'|{template_name}|{template_mtime}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _disk_path(self, invoice_id, key):
+        return os.path.join(self.disk_dir, f'{invoice_id}-{key}.pdf')
+
+    def get(self, invoice_id, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[1]
+        if self.disk_dir:
+            path = self._disk_path(invoice_id, key)
+            try:
+                with open(path, 'rb') as f:
+                    pdf = f.read()
+            except OSError:
+                return None
+            self._remember(invoice_id, key, pdf)
+            return pdf
+        return None
+
+    def put(self, invoice_id, key, pdf):
+        self._remember(invoice_id, key, pdf)
+        if self.disk_dir:
+            path = self._disk_path(invoice_id, key)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(pdf)
+            os.replace(tmp_path, path)
+
+    def _remember(self, invoice_id, key, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (invoice_id, pdf)
+            self._bytes += len(pdf)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def invalidate_invoice(self, invoice_id):
+        """Drops every cached rendering (all themes) of one invoice."""
+        with self._lock:
+            stale = [key for key, (owner, _) in self._entries.items() if owner == invoice_id]
+            for key in stale:
+                self._bytes -= len(self._entries.pop(key)[1])
+        if self.disk_dir:
+            prefix = f'{invoice_id}-'
+            for name in os.listdir(self.disk_dir):
+                if name.startswith(prefix):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, name))
+                    except OSError:
+                        pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
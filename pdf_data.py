@@ -0,0 +1,71 @@
+import json
+
+from reference_cache import business_profile
+
+
+def load_pdf_data(conn, invoice_ids):
+    """Loads the template data for a list of invoices, returned in the order of `invoice_ids`.
+
+    Invoices, customers, line items and the per-rate tax totals are each fetched with one
+    set-based query over the whole id list (passed as a single JSON parameter, so there is
+    no bound-variable limit), and the Business row comes from the process-wide cache.
+    Missing ids are skipped. Each entry has the same shape get_pdf_data() always returned.
+    """
+    if not invoice_ids:
+        return []
+    ids_json = json.dumps([int(invoice_id) for invoice_id in invoice_ids])
+    id_set = "(SELECT value FROM json_each(?))"
+
+    invoices = {row['id']: dict(row) for row in conn.execute(
+        f'SELECT * FROM Invoices WHERE id IN {id_set}', (ids_json,))}
+    if not invoices:
+        return []
+    customers = {row['id']: dict(row) for row in conn.execute(
+        f'SELECT * FROM Customers WHERE id IN (SELECT customer_id FROM Invoices WHERE id IN {id_set})', (ids_json,))}
+    business = business_profile.get(conn)
+
+    items = {}
+    for row in conn.execute(f"""
+        SELECT ii.*, i.name, i.hsn_code FROM Invoice_Items ii JOIN Items i ON ii.item_id = i.id
+        WHERE ii.invoice_id IN {id_set} ORDER BY ii.invoice_id, ii.id
+    """, (ids_json,)):
+        items.setdefault(row['invoice_id'], []).append(dict(row))
+
+    # Rates are ordered by their first line so the summary reads in the same order as the items table.
+    tax_summaries = {}
+    total_quantities = {}
+    for row in conn.execute(f"""
+        SELECT invoice_id, gst_rate, SUM(quantity) AS quantity,
+               SUM(cgst_amount) AS cgst, SUM(sgst_amount) AS sgst, SUM(igst_amount) AS igst
+        FROM Invoice_Items WHERE invoice_id IN {id_set}
+        GROUP BY invoice_id, gst_rate ORDER BY invoice_id, MIN(id)
+    """, (ids_json,)):
+        tax_summaries.setdefault(row['invoice_id'], {})[row['gst_rate']] = {
+            'cgst': row['cgst'], 'sgst': row['sgst'], 'igst': row['igst']}
+        total_quantities[row['invoice_id']] = total_quantities.get(row['invoice_id'], 0) + row['quantity']
+
+    # Imported here so processes that never build PDF data never load num2words' language tables.
+    from num2words import num2words
+
+    batch = []
+    for invoice_id in invoice_ids:
+        invoice = invoices.get(invoice_id)
+        if invoice is None:
+            continue
+        amount_in_rupees = int(invoice['total_value'])
+        batch.append({
+            'invoice': invoice,
+            'customer': customers[invoice['customer_id']],
+            'business': business,
+            'items': items.get(invoice_id, []),
+            'total_quantity': total_quantities.get(invoice_id, 0),
+            'tax_summary': tax_summaries.get(invoice_id, {}),
+            'amount_in_words': f"{num2words(amount_in_rupees, lang='en_IN').title()} Rupees Only"
+        })
+    return batch
+
+
+def warm_up():
+    """Loads num2words ahead of the first PDF (see PDF_WARMUP in server.py)."""
+    from num2words import num2words
+    num2words(1, lang='en_IN')
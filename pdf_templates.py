@@ -0,0 +1,132 @@
+"""Invoice PDF themes: compiled once, rendered with pre-parsed stylesheets.
+
+Each theme keeps its CSS in a single static <style> block. When a theme is compiled,
+that block is taken out of the markup: the rest becomes the Jinja template, and the CSS
+is parsed once into a WeasyPrint stylesheet that every render of the theme reuses. A
+theme is recompiled when its file changes, like Flask's template reloading.
+
+WeasyPrint (and with it Pango and fontconfig) is imported on first use, so processes
+that only serve the API never load it. warm_up() does all of the first-render work
+ahead of time: it imports WeasyPrint, compiles every theme, parses its CSS, and lays
+out a small document with each stylesheet so fontconfig has already loaded the fonts
+the theme asks for.
+"""
+import os
+import re
+import threading
+import time
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+STYLE_BLOCK_RE = re.compile(r'<style>(.*?)</style>', re.S)
+
+# Laid out once per theme by warm_up(): headings, digits, the rupee sign and a table,
+# which between them pull in the regular and bold faces the themes use.
+WARM_UP_HTML = """<html><body><h1>Tax Invoice</h1><p><strong>Total</strong> ₹ 1,234.50</p>
+<table><tr><th>Item</th><td>0123456789 Rupees Only</td></tr></table></body></html>"""
+
+
+def add_timing(timings, phase, seconds):
+    timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+class CompiledTheme:
+    __slots__ = ('template', 'stylesheet', 'mtime')
+
+    def __init__(self, template, stylesheet, mtime):
+        self.template = template
+        self.stylesheet = stylesheet
+        self.mtime = mtime
+
+
+class PdfRenderer:
+    """Renders invoice templates from `template_dir` to PDF bytes, keeping compiled themes between renders."""
+
+    def __init__(self, template_dir, template_names):
+        self.template_dir = template_dir
+        self.template_names = list(template_names)
+        self.env = Environment(loader=FileSystemLoader(template_dir), autoescape=select_autoescape(['html']))
+        self._themes = {}
+        self._weasyprint = None
+        self._font_config = None
+        self._lock = threading.Lock()
+
+    def _load_weasyprint(self):
+        with self._lock:
+            if self._weasyprint is None:
+                import weasyprint
+                from weasyprint.text.fonts import FontConfiguration
+
+                self._font_config = FontConfiguration()
+                self._weasyprint = weasyprint
+            return self._weasyprint
+
+    def theme(self, template_name):
+        """Returns the compiled theme, compiling it on first use or after the file changed."""
+        mtime = os.path.getmtime(os.path.join(self.template_dir, template_name))
+        theme = self._themes.get(template_name)
+        if theme is not None and theme.mtime == mtime:
+            return theme
+
+        weasyprint = self._load_weasyprint()
+        source, _, _ = self.env.loader.get_source(self.env, template_name)
+        styles = STYLE_BLOCK_RE.findall(source)
+        theme = CompiledTheme(
+            self.env.from_string(STYLE_BLOCK_RE.sub('', source)),
+            weasyprint.CSS(string='\n'.join(styles), font_config=self._font_config),
+            mtime
+        )
+        self._themes[template_name] = theme
+        return theme
+
+    def document(self, template_name, data, timings=None):
+        """Lays out one invoice and returns the WeasyPrint document.
+
+        When a `timings` dict is given, the seconds spent rendering the template and
+        laying out the HTML are added to its 'template' and 'layout' entries.
+        """
+        theme = self.theme(template_name)
+        start = time.perf_counter()
+        html = self._weasyprint.HTML(string=theme.template.render(**data), base_url=self.template_dir)
+        rendered = time.perf_counter()
+        document = html.render(stylesheets=[theme.stylesheet], font_config=self._font_config)
+        if timings is not None:
+            add_timing(timings, 'template', rendered - start)
+            add_timing(timings, 'layout', time.perf_counter() - rendered)
+        return document
+
+    def write_pdf(self, template_name, data, timings=None):
+        """Renders one invoice to PDF bytes; see document() for `timings` (plus 'write')."""
+        document = self.document(template_name, data, timings)
+        start = time.perf_counter()
+        pdf = document.write_pdf()
+        if timings is not None:
+            add_timing(timings, 'write', time.perf_counter() - start)
+        return pdf
+
+    def write_merged_pdf(self, template_name, payloads, timings=None):
+        """Renders several invoices into a single PDF, one after another."""
+        documents = [self.document(template_name, data, timings) for data in payloads]
+        pages = [page for document in documents for page in document.pages]
+        start = time.perf_counter()
+        pdf = documents[0].copy(pages).write_pdf()
+        if timings is not None:
+            add_timing(timings, 'write', time.perf_counter() - start)
+        return pdf
+
+    def warm_up(self):
+        """Does the first-render work for every theme now; returns seconds spent per step."""
+        timings = {}
+        start = time.perf_counter()
+        weasyprint = self._load_weasyprint()
+        timings['import'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        themes = [self.theme(name) for name in self.template_names]
+        timings['compile'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for theme in themes:
+            weasyprint.HTML(string=WARM_UP_HTML).render(stylesheets=[theme.stylesheet], font_config=self._font_config)
+        timings['fonts'] = time.perf_counter() - start
+        return timings
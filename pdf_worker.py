@@ -0,0 +1,226 @@
+import asyncio
+import collections
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from pdf_templates import PdfRenderer
+
+# --- Per-process worker state ---
+# Populated once by init_worker() in every pool process, so each job only pays for
+# template rendering and layout, never for imports, template compilation or font loading.
+_worker = {}
+
+
+def init_worker(template_dir, template_names):
+    """Process-pool initializer: imports WeasyPrint and warms up every invoice theme once."""
+    renderer = PdfRenderer(template_dir, template_names)
+    renderer.warm_up()
+    _worker['renderer'] = renderer
+
+
+def render_pdf(template_name, data):
+    """Renders one invoice inside a worker process; returns (PDF bytes, seconds per render phase)."""
+    timings = {}
+    return _worker['renderer'].write_pdf(template_name, data, timings), timings
+
+
+def render_merged_pdf(template_name, payloads):
+    """Renders several invoices into a single PDF inside a worker process; returns (PDF bytes, timings)."""
+    timings = {}
+    return _worker['renderer'].write_merged_pdf(template_name, payloads, timings), timings
+
+
+def worker_ready():
+    return os.getpid()
+
+
+class QueueFullError(Exception):
+    """Raised when the render queue is at its depth limit."""
+
+
+class PdfRenderService:
+    """Renders invoice PDFs on a bounded process pool and tracks them as pollable jobs.
+
+    At most max_workers renders run at once; submissions beyond max_queue outstanding
+    jobs are rejected with QueueFullError so callers can apply backpressure. Finished
+    jobs are kept for result_ttl seconds for the client to collect, and only the newest
+    max_finished of them: each holds its PDF bytes, so a burst of renders cannot pile up
+    memory until the TTL runs out. If given, on_timings(template_name, timings) is called with the phase timings of every render.
+    """
+
+    def __init__(self, template_dir, template_names, max_workers=None, max_queue=32,
+                 result_ttl=600, max_finished=64, on_complete=None, on_timings=None):
+        self.template_dir = template_dir
+        self.template_names = list(template_names)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self.max_finished = max_finished
+        self.on_complete = on_complete
+        self.on_timings = on_timings
+        self._executor = None
+        self._jobs = {}
+        self._finished = collections.deque()  # ids of finished jobs, oldest first
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # The pool is started on first use so processes that never render PDFs never fork.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=init_worker,
+                    initargs=(self.template_dir, self.template_names)
+                )
+            return self._executor
+
+    def warm_up(self):
+        """Starts every pool process now, so none of them is initialised by a user's request."""
+        futures = [self.executor.submit(worker_ready) for _ in range(self.max_workers)]
+        return len({future.result() for future in futures})
+
+    def pending_count(self):
+        with self._lock:
+            return self._pending_count()
+
+    def _pending_count(self):
+        return sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+
+    def submit(self, invoice_id, template_name, data, cache_key=None, pdf=None):
+        """Queues a render and returns its job record. Pass pdf to record an already-rendered result."""
+        self._expire_finished()
+        executor = self.executor if pdf is None else None
+
+        job_id = f'{next(self._ids)}-{os.urandom(4).hex()}'
+        job = {
+            'id': job_id,
+            'invoice_id': invoice_id,
+            'template': template_name,
+            'cache_key': cache_key,
+            'filename': f'invoice_{data["invoice"]["invoice_no"].replace("/", "-")}.pdf',
+            'status': 'queued',
+            'error': None,
+            'result': None,
+            'submitted_at': time.time(),
+            'finished_at': None
+        }
+        # The depth check, the render's submission and publishing the job happen under one
+        # lock, so concurrent submits cannot overshoot max_queue and a poll never sees a
+        # queued job without its future.
+        with self._lock:
+            if pdf is None:
+                if self._pending_count() >= self.max_queue:
+                    raise QueueFullError(f'PDF render queue is full ({self.max_queue} jobs pending)')
+                job['future'] = executor.submit(render_pdf, template_name, data)
+            self._jobs[job_id] = job
+
+        if pdf is not None:
+            self._finish(job, pdf, None, notify=False)
+            return job
+
+        # Added outside the lock: a future that has already finished runs the callback (and
+        # _finish, which takes the lock) right here.
+        job['future'].add_done_callback(lambda f: self._on_done(job, f))
+        return job
+
+    def _on_done(self, job, future):
+        if future.cancelled():
+            self._finish(job, None, 'cancelled')
+            return
+        error = future.exception()
+        if error:
+            self._finish(job, None, str(error))
+            return
+        self._finish(job, self._unpack(job['template'], future.result()), None)
+
+    def _unpack(self, template_name, result):
+        pdf, timings = result
+        if self.on_timings:
+            self.on_timings(template_name, timings)
+        return pdf
+
+    def _finish(self, job, pdf, error, notify=True):
+        with self._lock:
+            job['result'] = pdf
+            job['error'] = error
+            job['status'] = 'failed' if error else 'done'
+            job['finished_at'] = time.time()
+            job.pop('future', None)
+            self._finished.append(job['id'])
+            while len(self._finished) > self.max_finished:
+                self._jobs.pop(self._finished.popleft(), None)
+        if notify and pdf is not None and self.on_complete:
+            self.on_complete(job, pdf)
+
+    def render_many(self, tasks, window=None):
+        """Renders (tag, template_name, data) tasks across the pool, yielding (tag, pdf) as each one finishes.
+
+        Only `window` renders are in flight at a time, so finished PDFs are handed back
+        (and can be streamed out) before the rest of the batch is even submitted.
+        """
+        window = window or self.max_workers * 2
+        tasks = iter(tasks)
+        pending = set()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < window:
+                    try:
+                        tag, template_name, data = next(tasks)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = self.executor.submit(render_pdf, template_name, data)
+                    future.tag = tag
+                    future.template_name = template_name
+                    pending.add(future)
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.tag, self._unpack(future.template_name, future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def render(self, template_name, data):
+        """Renders one invoice on the pool and waits for it; bypasses the job queue and its depth limit."""
+        return self._unpack(template_name, self.executor.submit(render_pdf, template_name, data).result())
+
+    async def render_async(self, template_name, data):
+        """render() for asyncio callers: awaits the pool's result instead of blocking the thread on it."""
+        result = await asyncio.wrap_future(self.executor.submit(render_pdf, template_name, data))
+        return self._unpack(template_name, result)
+
+    def render_merged(self, template_name, payloads):
+        result = self.executor.submit(render_merged_pdf, template_name, payloads).result()
+        return self._unpack(template_name, result)
+
+    def get(self, job_id):
+        self._expire_finished()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            future = job.get('future') if job else None
+            if future is not None and job['status'] == 'queued' and future.running():
+                job['status'] = 'running'
+        return job
+
+    def _expire_finished(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            while self._finished:
+                job = self._jobs.get(self._finished[0])
+                if job is not None and job['finished_at'] >= cutoff:
+                    break
+                self._jobs.pop(self._finished.popleft(), None)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,138 @@
+"""In-process cache for the near-static reference tables (units, prefixes, business profile, items).
+
+Each CachedQuery keeps the result of one loader function, per key, for `ttl` seconds.
+The endpoints that change a table call invalidate(), which bumps the cache's version.
+A load that was already running when the version changed is returned to its caller
+but not stored, so a reader racing a write cannot put the old rows back in the cache.
+Every entry also keeps its JSON encoding and an ETag (a digest of that encoding), so
+the API can answer repeat requests with 304 Not Modified. The ETag depends only on
+the data, so it matches across worker processes.
+
+Invalidation only reaches the process that made the write. Other workers, and writes
+made outside the API (seed_database.py, sqlite3 shell), are picked up when the TTL
+runs out.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 300
+
+# name -> CachedQuery, for stats()
+REGISTRY = {}
+
+
+class CachedEntry:
+    __slots__ = ('data', 'body', 'etag', 'loaded_at')
+
+    def __init__(self, data):
+        self.data = data
+        self.body = json.dumps(data, default=str).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.loaded_at = time.monotonic()
+
+
+class CachedQuery:
+    """Caches `loader(conn)` (or `loader(conn, key)` for keyed caches such as search results).
+
+    Keyed caches keep at most `max_keys` entries, evicting the least recently used.
+    """
+
+    def __init__(self, name, loader, ttl=DEFAULT_TTL, max_keys=1):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def entry(self, conn, key=None):
+        """Returns the CachedEntry for `key`, loading it on a miss.
+
+        `conn` is either an open connection or a function returning one. A function is
+        called only on a miss, and the connection it returns is closed afterwards.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and now - cached.loaded_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+            version = self.version
+
+        if isinstance(conn, sqlite3.Connection):
+            loaded = CachedEntry(self._load(conn, key))
+        else:
+            connection = conn()
+            try:
+                loaded = CachedEntry(self._load(connection, key))
+            finally:
+                connection.close()
+
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = loaded
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+        return loaded
+
+    def _load(self, conn, key):
+        return self.loader(conn) if key is None else self.loader(conn, key)
+
+    def get(self, conn, key=None):
+        """Returns the cached data for `key` (see entry() for `conn`)."""
+        return self.entry(conn, key).data
+
+    def invalidate(self):
+        """Drops every entry; call after committing a write to the underlying table."""
+        with self._lock:
+            self._entries.clear()
+            self.version += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def stats():
+    return {name: cache.stats() for name, cache in REGISTRY.items()}
+
+
+def load_units(conn):
+    return [row[0] for row in conn.execute("SELECT name FROM Units ORDER BY name")]
+
+
+def load_invoice_prefixes(conn):
+    # next_number is left out: it changes with every invoice and is served by /api/latest_invoice_number.
+    return [dict(row) for row in conn.execute(
+        "SELECT id, prefix, is_default FROM Invoice_Prefixes ORDER BY is_default DESC, prefix DESC")]
+
+
+def load_business_profile(conn):
+    row = conn.execute('SELECT * FROM Business LIMIT 1').fetchone()
+    return dict(row) if row else {}
+
+
+units = CachedQuery('units', load_units)
+invoice_prefixes = CachedQuery('invoice_prefixes', load_invoice_prefixes)
+business_profile = CachedQuery('business', load_business_profile)
@@ -0,0 +1,102 @@
+"""Daily sales rollup used by the dashboard KPIs and sales chart.
+
+Each row of Daily_Sales_Rollup holds one day's invoice count, sales, tax totals and
+profit, so dashboard queries cost O(days in range) instead of O(line items). Rows are
+recomputed for the affected days inside the same transaction that writes an invoice,
+and the whole table can be rebuilt from the base tables with:
+
+    python sales_rollup.py rebuild
+"""
+import argparse
+import json
+import sqlite3
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Daily_Sales_Rollup (
+    date DATE PRIMARY KEY,
+    invoice_count INTEGER NOT NULL DEFAULT 0,
+    total_sales DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    taxable_value DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    cgst DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    sgst DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    igst DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    cess DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    total_profit DECIMAL(14, 2) NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+_AGGREGATE_SQL = """
+    WITH sales AS (
+        SELECT date, COUNT(id) AS invoice_count, SUM(total_value) AS total_sales,
+               SUM(taxable_value) AS taxable_value, SUM(cgst) AS cgst, SUM(sgst) AS sgst,
+               SUM(igst) AS igst, SUM(cess) AS cess
+        FROM Invoices WHERE {invoice_filter}
+        GROUP BY date
+    ), profit AS (
+        SELECT inv.date, SUM(ii.quantity * (ii.price_per_unit - ii.purchase_price)) AS total_profit
+        FROM Invoice_Items ii
+        JOIN Invoices inv ON ii.invoice_id = inv.id
+        WHERE ii.purchase_price IS NOT NULL AND {profit_filter}
+        GROUP BY inv.date
+    )
+    INSERT INTO Daily_Sales_Rollup (date, invoice_count, total_sales, taxable_value, cgst, sgst, igst, cess, total_profit)
+    SELECT s.date, s.invoice_count, s.total_sales, s.taxable_value, s.cgst, s.sgst, s.igst, s.cess,
+           COALESCE(p.total_profit, 0)
+    FROM sales s LEFT JOIN profit p ON p.date = s.date
+"""
+
+
+def refresh_days(conn, dates):
+    """Recomputes the rollup rows for the given dates. Runs inside the caller's transaction."""
+    dates = sorted({d for d in dates if d})
+    if not dates:
+        return
+    dates_json = json.dumps(dates)
+    date_set = "(SELECT value FROM json_each(?))"
+    conn.execute(f"DELETE FROM Daily_Sales_Rollup WHERE date IN {date_set}", (dates_json,))
+    conn.execute(_AGGREGATE_SQL.format(invoice_filter=f"date IN {date_set}",
+                                       profit_filter=f"inv.date IN {date_set}"),
+                 (dates_json, dates_json))
+
+
+def rebuild(conn):
+    """Rebuilds the whole rollup table from Invoices and Invoice_Items."""
+    conn.execute(ROLLUP_SCHEMA)
+    conn.execute("DELETE FROM Daily_Sales_Rollup")
+    conn.execute(_AGGREGATE_SQL.format(invoice_filter="1", profit_filter="1"))
+
+
+def get_kpis(conn, start_date_str, end_date_str):
+    row = conn.execute("""
+        SELECT SUM(total_sales), SUM(invoice_count), SUM(total_profit)
+        FROM Daily_Sales_Rollup WHERE date BETWEEN ? AND ?
+    """, (start_date_str, end_date_str)).fetchone()
+    return {
+        'total_sales': row[0] if row[0] is not None else 0,
+        'total_profit': row[2] if row[2] is not None else 0,
+        'total_invoices': row[1] if row[1] is not None else 0
+    }
+
+
+def get_sales_by_period(conn, start_date_str, end_date_str, date_format='%Y-%m-%d'):
+    """Returns {period: total_sales}, where periods are formatted with the given STRFTIME format."""
+    rows = conn.execute("""
+        SELECT STRFTIME(?, date) AS period, SUM(total_sales) AS total_sales
+        FROM Daily_Sales_Rollup WHERE date BETWEEN ? AND ?
+        GROUP BY period ORDER BY period
+    """, (date_format, start_date_str, end_date_str)).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain the Daily_Sales_Rollup table.')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--db', default='invoice_app.db', help='Path to the SQLite database')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    with conn:
+        rebuild(conn)
+    days = conn.execute("SELECT COUNT(*) FROM Daily_Sales_Rollup").fetchone()[0]
+    conn.close()
+    print(f"✅ Rebuilt Daily_Sales_Rollup ({days} days).")
@@ -73,6 +73,7 @@ CREATE TABLE IF NOT EXISTS Invoices (
     cess DECIMAL(12, 2) NOT NULL,
     round_off DECIMAL(10, 2) DEFAULT 0, -- NEW: Added round_off column
     status VARCHAR(10) NOT NULL DEFAULT 'PENDING', -- "PENDING" or "PAID"
+    version INTEGER NOT NULL DEFAULT 1, -- bumped on every update, for optimistic concurrency
     FOREIGN KEY (customer_id) REFERENCES Customers (id)
 );
 
@@ -94,6 +95,7 @@ CREATE TABLE IF NOT EXISTS Invoice_Items (
     total_amount DECIMAL(12, 2) NOT NULL,
     hsn_code VARCHAR(8),
     is_reverse_charge BOOLEAN DEFAULT 0,
+    purchase_price DECIMAL(10, 2), -- the item's purchase price when the line was saved; NULL if unknown
     FOREIGN KEY (invoice_id) REFERENCES Invoices (id) ON DELETE CASCADE,
     FOREIGN KEY (item_id) REFERENCES Items (id)
 );
@@ -102,13 +104,46 @@ CREATE TABLE IF NOT EXISTS Invoice_Items (
 CREATE TABLE IF NOT EXISTS Invoice_Prefixes (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     prefix VARCHAR(50) UNIQUE NOT NULL,
-    is_default BOOLEAN DEFAULT 0
+    is_default BOOLEAN DEFAULT 0,
+    next_number INTEGER NOT NULL DEFAULT 1 -- next invoice number to hand out for this prefix
+);
+
+-- Creates the Daily_Sales_Rollup table: one pre-aggregated row per day for the dashboard
+-- (kept up to date by server.py; rebuild with `python sales_rollup.py rebuild`)
+CREATE TABLE IF NOT EXISTS Daily_Sales_Rollup (
+    date DATE PRIMARY KEY,
+    invoice_count INTEGER NOT NULL DEFAULT 0,
+    total_sales DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    taxable_value DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    cgst DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    sgst DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    igst DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    cess DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    total_profit DECIMAL(14, 2) NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+-- Creates the Customer_Stats table: one row of invoice totals per customer with invoices
+-- (kept up to date by server.py; rebuild with `python customer_stats.py rebuild`)
+CREATE TABLE IF NOT EXISTS Customer_Stats (
+    customer_id INTEGER PRIMARY KEY,
+    invoice_count INTEGER NOT NULL DEFAULT 0,
+    lifetime_sales DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    first_invoice_date DATE,
+    last_invoice_date DATE,
+    credit_sales DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    credit_outstanding DECIMAL(14, 2) NOT NULL DEFAULT 0, -- CREDIT invoices still PENDING
+    outstanding_invoices INTEGER NOT NULL DEFAULT 0
 );
 
 -- Add indexes for faster searching
 CREATE INDEX IF NOT EXISTS idx_invoice_no ON Invoices (invoice_no);
 CREATE INDEX IF NOT EXISTS idx_customer_name ON Customers (name);
 CREATE INDEX IF NOT EXISTS idx_item_name ON Items (name);
+CREATE INDEX IF NOT EXISTS idx_invoices_date ON Invoices (date);
+CREATE INDEX IF NOT EXISTS idx_invoices_date_total ON Invoices (date, total_value);
+CREATE INDEX IF NOT EXISTS idx_invoices_customer ON Invoices (customer_id, date);
+CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice ON Invoice_Items (invoice_id, item_id, quantity, price_per_unit, purchase_price);
+CREATE INDEX IF NOT EXISTS idx_invoice_items_item ON Invoice_Items (item_id);
 
 -- Pre-populate the Units table
 INSERT OR IGNORE INTO Units (name) VALUES
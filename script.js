@@ -2,6 +2,9 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- GLOBAL STATE ---
     let salesChart;
     let currentInvoiceData = [];
+    let invoiceNextCursor = null;
+    let filteredSalesTotal = 0;
+    const INVOICES_PER_PAGE = 100;
     let currentSort = { column: 'invoice_no', order: 'desc' };
     let activeTab = sessionStorage.getItem('activeTab') || 'home';
     const API_BASE_URL = 'http://127.0.0.1:5000/api';
@@ -9,6 +12,7 @@ document.addEventListener('DOMContentLoaded', () => {
     let currentCustomerId = null;
     let customerCurrentPage = 1;
     let customerTotalPages = 1;
+    let customerPageCursors = [''];
     const CUSTOMERS_PER_PAGE = 15;
     // NEW: Item Tab State
     let currentItemId = null;
@@ -246,15 +250,20 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- SALE TAB FUNCTIONS ---
     // ... (All existing sale tab functions remain here) ...
-    async function fetchInvoices() {
+    async function fetchInvoices(append = false) {
         const searchTerm = invoiceSearchInput.value;
         const startDate = startDateInput.value;
         const endDate = endDateInput.value;
+        const cursor = append ? invoiceNextCursor : '';
         try {
-            const response = await fetch(`${API_BASE_URL}/invoices?search=${searchTerm}&start_date=${startDate}&end_date=${endDate}`);
+            const response = await fetch(`${API_BASE_URL}/invoices?search=${searchTerm}&start_date=${startDate}&end_date=${endDate}&page_size=${INVOICES_PER_PAGE}&cursor=${cursor}&include_total=${append ? 0 : 1}`);
             if (!response.ok) throw new Error('Network response was not ok');
-            currentInvoiceData = await response.json();
+            const data = await response.json();
+            currentInvoiceData = append ? currentInvoiceData.concat(data.invoices) : data.invoices;
+            invoiceNextCursor = data.next_cursor;
+            if (data.summary) filteredSalesTotal = data.summary.total_value;
             sortAndRenderInvoices();
+            renderInvoiceLoadMore();
         } catch (error) {
             console.error('Failed to fetch invoices:', error);
             invoiceListBody.innerHTML = '<tr><td colspan="6" style="text-align: center;">Error loading invoices.</td></tr>';
@@ -299,29 +308,41 @@ document.addEventListener('DOMContentLoaded', () => {
             filteredSalesTotalEl.textContent = '₹0.00';
             return;
         }
-        let totalSales = 0;
         currentInvoiceData.forEach(invoice => {
-            totalSales += parseFloat(invoice.total_value);
             const row = document.createElement('tr');
             row.setAttribute('data-invoice-id', invoice.id);
             const statusClass = `status-${invoice.status.toLowerCase()}`;
             row.innerHTML = `<td>${invoice.invoice_no}</td><td>${invoice.customer_name}</td><td>${new Date(invoice.date).toLocaleDateString('en-IN')}</td><td>₹${parseFloat(invoice.total_value).toLocaleString('en-IN')}</td><td><span class="status-badge ${statusClass}">${invoice.status}</span></td><td class="actions-cell"><button class="action-btn edit-btn" title="Edit">✏️</button><button class="action-btn download-pdf-btn" title="Download PDF">📄</button><div class="more-actions-btn"><button class="action-btn" title="More Options">⋮</button><div class="dropdown-menu"><button class="dropdown-item delete-btn" style="color: #dc3545;">Delete</button></div></div></td>`;
             invoiceListBody.appendChild(row);
         });
-        filteredSalesTotalEl.textContent = `₹${totalSales.toLocaleString('en-IN', {minimumFractionDigits: 2, maximumFractionDigits: 2})}`;
+        filteredSalesTotalEl.textContent = `₹${parseFloat(filteredSalesTotal).toLocaleString('en-IN', {minimumFractionDigits: 2, maximumFractionDigits: 2})}`;
+    }
+    function renderInvoiceLoadMore() {
+        const paginationFooter = document.querySelector('#sale .pagination-footer');
+        paginationFooter.innerHTML = '';
+        if (!invoiceNextCursor) return;
+        const loadMoreBtn = document.createElement('button');
+        loadMoreBtn.textContent = 'Load more';
+        loadMoreBtn.className = 'action-button secondary';
+        loadMoreBtn.addEventListener('click', () => fetchInvoices(true));
+        paginationFooter.appendChild(loadMoreBtn);
     }
 
     // --- CUSTOMER TAB FUNCTIONS ---
     // ... (All existing customer tab functions remain here) ...
     async function fetchCustomers(page = 1) {
         const searchTerm = customerSearchInput.value;
+        // Pages are fetched by cursor; the cursor for each page we have reached is remembered so Prev works.
+        if (page === 1) customerPageCursors = [''];
+        const cursor = customerPageCursors[page - 1] ?? '';
         try {
-            const response = await fetch(`${API_BASE_URL}/customers?search=${searchTerm}&page=${page}&limit=${CUSTOMERS_PER_PAGE}`);
+            const response = await fetch(`${API_BASE_URL}/customers?search=${searchTerm}&cursor=${cursor}&limit=${CUSTOMERS_PER_PAGE}&include_total=${page === 1 ? 1 : 0}`);
             if (!response.ok) throw new Error('Network response was not ok');
             const data = await response.json();
             renderCustomers(data.customers);
-            customerCurrentPage = data.page;
-            customerTotalPages = Math.ceil(data.total / data.limit);
+            customerCurrentPage = page;
+            if (data.next_cursor) customerPageCursors[page] = data.next_cursor;
+            if (data.total !== undefined) customerTotalPages = Math.max(1, Math.ceil(data.total / data.limit));
             renderCustomerPagination();
         } catch (error) {
             console.error('Failed to fetch customers:', error);
@@ -733,6 +754,12 @@ document.addEventListener('DOMContentLoaded', () => {
             fetchInvoices();
         }
     }
+    function handleExportReport(e) {
+        // Exports cover the whole date range selected in the filters (all time if none).
+        const report = document.getElementById('export-report-select').value;
+        const format = e.currentTarget.dataset.format;
+        window.location.href = `${API_BASE_URL}/exports/${report}?format=${format}&start_date=${startDateInput.value}&end_date=${endDateInput.value}`;
+    }
     function handleSortClick(e) {
         const header = e.target.closest('th[data-sort]');
         if (!header) return;
@@ -774,11 +801,12 @@ document.addEventListener('DOMContentLoaded', () => {
         customStartDateInput?.addEventListener('change', handleCustomDateChange);
         customEndDateInput?.addEventListener('change', handleCustomDateChange);
         document.getElementById('add-sale-btn-home')?.addEventListener('click', () => window.open('invoice.html', '_blank'));
-        invoiceSearchInput?.addEventListener('input', debounce(fetchInvoices, 300));
+        invoiceSearchInput?.addEventListener('input', debounce(() => fetchInvoices(), 300));
         dateRangeFilter?.addEventListener('change', handleSaleDateFilterChange);
-        startDateInput?.addEventListener('change', fetchInvoices);
-        endDateInput?.addEventListener('change', fetchInvoices);
+        startDateInput?.addEventListener('change', () => fetchInvoices());
+        endDateInput?.addEventListener('change', () => fetchInvoices());
         saleTableHead?.addEventListener('click', handleSortClick);
+        document.querySelectorAll('.export-report-btn').forEach(btn => btn.addEventListener('click', handleExportReport));
         const sortBySelect = document.getElementById('sort-by-select');
         if (sortBySelect) sortBySelect.addEventListener('change', (e) => { const [col, ord] = e.target.value.split('_'); updateSortState(col, ord); });
         const pdfThemeSelector = document.getElementById('pdf-theme-selector');
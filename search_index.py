@@ -0,0 +1,111 @@
+"""FTS5 full-text search over invoices, customers and items.
+
+The trigram tokenizer indexes every 3-character window, so a MATCH on a quoted phrase
+behaves like the old `LIKE '%term%'` substring search but is answered from the index.
+Each FTS table uses its base table as external content and is kept in sync by triggers.
+Terms shorter than three characters cannot be matched by trigrams; callers fall back to
+LIKE for those.
+"""
+import sqlite3
+
+MIN_MATCH_LENGTH = 3
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS Customers_FTS USING fts5(
+    name, phone, gstin, content='Customers', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS customers_fts_insert AFTER INSERT ON Customers BEGIN
+    INSERT INTO Customers_FTS (rowid, name, phone, gstin) VALUES (new.id, new.name, new.phone, new.gstin);
+END;
+CREATE TRIGGER IF NOT EXISTS customers_fts_delete AFTER DELETE ON Customers BEGIN
+    INSERT INTO Customers_FTS (Customers_FTS, rowid, name, phone, gstin) VALUES ('delete', old.id, old.name, old.phone, old.gstin);
+END;
+CREATE TRIGGER IF NOT EXISTS customers_fts_update AFTER UPDATE OF name, phone, gstin ON Customers BEGIN
+    INSERT INTO Customers_FTS (Customers_FTS, rowid, name, phone, gstin) VALUES ('delete', old.id, old.name, old.phone, old.gstin);
+    INSERT INTO Customers_FTS (rowid, name, phone, gstin) VALUES (new.id, new.name, new.phone, new.gstin);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS Items_FTS USING fts5(
+    name, content='Items', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON Items BEGIN
+    INSERT INTO Items_FTS (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON Items BEGIN
+    INSERT INTO Items_FTS (Items_FTS, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF name ON Items BEGIN
+    INSERT INTO Items_FTS (Items_FTS, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO Items_FTS (rowid, name) VALUES (new.id, new.name);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS Invoices_FTS USING fts5(
+    invoice_no, total_value, content='Invoices', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS invoices_fts_insert AFTER INSERT ON Invoices BEGIN
+    INSERT INTO Invoices_FTS (rowid, invoice_no, total_value) VALUES (new.id, new.invoice_no, new.total_value);
+END;
+CREATE TRIGGER IF NOT EXISTS invoices_fts_delete AFTER DELETE ON Invoices BEGIN
+    INSERT INTO Invoices_FTS (Invoices_FTS, rowid, invoice_no, total_value) VALUES ('delete', old.id, old.invoice_no, old.total_value);
+END;
+CREATE TRIGGER IF NOT EXISTS invoices_fts_update AFTER UPDATE OF invoice_no, total_value ON Invoices BEGIN
+    INSERT INTO Invoices_FTS (Invoices_FTS, rowid, invoice_no, total_value) VALUES ('delete', old.id, old.invoice_no, old.total_value);
+    INSERT INTO Invoices_FTS (rowid, invoice_no, total_value) VALUES (new.id, new.invoice_no, new.total_value);
+END;
+"""
+
+FTS_TABLES = ('Customers_FTS', 'Items_FTS', 'Invoices_FTS')
+
+
+def is_supported(conn):
+    """True if this SQLite build has FTS5 with the trigram tokenizer (SQLite 3.34+)."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+        conn.execute("DROP TABLE temp.fts_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def split_statements(script):
+    """Splits a SQL script into complete statements (trigger bodies included) without executescript's implicit COMMIT."""
+    statements, pending = [], ''
+    for line in script.splitlines(keepends=True):
+        pending += line
+        if sqlite3.complete_statement(pending):
+            statements.append(pending.strip())
+            pending = ''
+    return statements
+
+
+def create(conn):
+    """Creates the FTS tables and triggers, then (re)indexes the existing rows."""
+    for statement in split_statements(FTS_SCHEMA):
+        conn.execute(statement)
+    for table in FTS_TABLES:
+        conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+
+def is_installed(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        found = conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?, ?)", FTS_TABLES
+        ).fetchone()[0]
+        return found == len(FTS_TABLES)
+    finally:
+        conn.close()
+
+
+def match_expression(term, columns=None):
+    """Builds an FTS5 MATCH expression for a substring search, or None if the term is too short.
+
+    The term is quoted as a phrase so user input can never be parsed as FTS5 query syntax.
+    """
+    term = term.strip()
+    if len(term) < MIN_MATCH_LENGTH:
+        return None
+    phrase = '"' + term.replace('"', '""') + '"'
+    if columns:
+        return '{' + ' '.join(columns) + '} : ' + phrase
+    return phrase
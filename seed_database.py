@@ -1,10 +1,18 @@
+import argparse
 import sqlite3
 import os
-from datetime import datetime
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import random
 import time
 
+import invoice_store
+import customer_stats
+import sales_rollup
+from tax_engine import compute_batch, is_inter_state
+
 # --- CONFIGURATION ---
 DB_FILE = 'invoice_app.db'
 SCHEMA_FILE = 'schema.sql'
@@ -12,6 +20,10 @@ NUM_CUSTOMERS = 200
 NUM_ITEMS = 80
 MONTHS_TO_GENERATE = 18
 INVOICES_PER_MONTH_AVG = 120
+SEED = 42
+END_DATE = None  # last day to generate invoices for; None means today
+BATCH_SIZE = 5000  # invoices per executemany batch
+LOAD_CACHE_SIZE = -262144  # page cache during the load, in KiB (256 MB)
 
 # --- DATA FOR PROCEDURAL GENERATION ---
 FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Ayaan', 'Krishna', 'Ishaan', 'Saanvi', 'Aanya', 'Aadhya', 'Aaradhya', 'Ananya', 'Pari', 'Diya', 'Myra', 'Anika', 'Avni','Rishabh','Suraj']
@@ -27,6 +39,8 @@ ITEM_ADJECTIVES = ['Premium', 'Organic', 'Herbal', 'Advanced', 'Gentle', 'Radian
 ITEM_TYPES = ['Face Wash', 'Lipstick', 'Foundation', 'Serum', 'Moisturizer', 'Shampoo', 'Conditioner', 'Hair Oil', 'Sunscreen', 'Toner', 'Cleanser', 'Exfoliator', 'Mask', 'Eye Cream', 'Body Lotion']
 ITEM_SUFFIXES = ['Plus', 'Pro', 'Max', 'for Men', 'for Women', '200ml', '50g', 'Kit', 'for Oily Skin', 'for Dry Skin', 'UV Protect', 'Intense Repair', 'Classic', 'Gold']
 
+MAX_ITEM_NAMES = len(ITEM_ADJECTIVES) * len(ITEM_TYPES) * len(ITEM_SUFFIXES)
+
 # --- HELPER FUNCTIONS ---
 def get_db_connection():
     conn = sqlite3.connect(DB_FILE)
@@ -56,7 +70,8 @@ def clear_all_data():
     print("\n🧹 Clearing all existing data...")
     tables = [
         'Invoice_Items', 'Invoices', 'Items', 'Customers',
-        'Categories', 'Business', 'HSN_Codes', 'Invoice_Prefixes', 'Units'
+        'Categories', 'Business', 'HSN_Codes', 'Invoice_Prefixes', 'Units',
+        'Daily_Sales_Rollup', 'Customer_Stats'
     ]
     for table in tables:
         try:
@@ -115,6 +130,9 @@ def seed_base_data(cursor):
     item_names = set()
     while len(items_to_add) < NUM_ITEMS:
         name = f"{random.choice(ITEM_ADJECTIVES)} {random.choice(ITEM_TYPES)} {random.choice(ITEM_SUFFIXES)}"
+        if len(item_names) >= MAX_ITEM_NAMES:
+            # Every combination is taken; number the rest.
+            name = f"{name} {len(items_to_add) + 1}"
         if name in item_names:
             continue
         item_names.add(name)
@@ -132,109 +150,191 @@ def seed_base_data(cursor):
     """, items_to_add)
     print(f"✅ Seeded {NUM_CUSTOMERS} customers and {NUM_ITEMS} items.")
 
+def month_windows(end_date, months):
+    """Yields (first day, last day) for each of the `months` months ending with the month of `end_date`."""
+    current = end_date.replace(day=1) - relativedelta(months=months - 1)
+    for _ in range(months):
+        last = current + relativedelta(months=1) - relativedelta(days=1)
+        yield current, min(last, end_date)
+        current += relativedelta(months=1)
+
+
+def financial_year(date):
+    year = date.year if date.month >= 4 else date.year - 1
+    return f"FY{str(year)[-2:]}-{str(year + 1)[-2:]}"
+
+
+def new_batch():
+    """Column lists for a batch of generated invoices and their lines, in the shape compute_batch() takes."""
+    return {
+        'invoices': {'invoice_no': [], 'date': [], 'customer_id': [], 'inter_state': []},
+        'lines': {'invoice': [], 'item_id': [], 'unit': [], 'quantity': [], 'price_per_unit': [], 'gst_rate': [],
+                  'purchase_price': []},
+    }
+
+
+def insert_invoice_batch(cursor, batch, first_id):
+    """Computes the amounts for a batch of generated invoices and inserts them with two executemany calls."""
+    invoices, lines = batch['invoices'], batch['lines']
+    line_amounts, totals, _ = compute_batch(lines, invoices)
+    invoice_ids = range(first_id, first_id + len(invoices['invoice_no']))
+    cursor.executemany("""
+        INSERT INTO Invoices
+        (id, invoice_no, date, customer_id, sale_type, status, total_value, taxable_value, cgst, sgst, igst, cess, round_off)
+        VALUES (?, ?, ?, ?, 'CASH', 'PAID', ?, ?, ?, ?, ?, ?, ?)
+    """, zip(invoice_ids, invoices['invoice_no'], invoices['date'], invoices['customer_id'],
+             *(totals[field].tolist() for field in ('total_value', 'taxable_value', 'cgst', 'sgst', 'igst', 'cess',
+                                                    'round_off'))))
+    cursor.executemany("INSERT INTO Invoice_Items (invoice_id, item_id, unit, quantity, price_per_unit, gst_rate, cgst_amount, sgst_amount, igst_amount, total_amount, purchase_price) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       zip([first_id + position for position in lines['invoice']], lines['item_id'], lines['unit'],
+                           lines['quantity'], line_amounts['price_per_unit'].tolist(), lines['gst_rate'],
+                           *(line_amounts[field].tolist() for field in ('cgst_amount', 'sgst_amount', 'igst_amount',
+                                                                        'total_amount')),
+                           lines['purchase_price']))
+
+
 def seed_invoices(cursor):
+    end_date = END_DATE or datetime.now()
+    end_date = datetime(end_date.year, end_date.month, end_date.day)
+    spread = max(1, INVOICES_PER_MONTH_AVG // 6)
     print(f"\n⏳ Generating approx. {INVOICES_PER_MONTH_AVG * MONTHS_TO_GENERATE} invoices...")
     start_time = time.time()
-    cursor.execute("SELECT id FROM Customers")
-    customer_ids = [row['id'] for row in cursor.fetchall()]
-    cursor.execute("SELECT id, default_sale_price, default_tax_rate, default_unit FROM Items")
+    cursor.execute("SELECT id, place_of_supply FROM Customers")
+    customer_states = {row['id']: row['place_of_supply'] for row in cursor.fetchall()}
+    customer_ids = list(customer_states)
+    cursor.execute("SELECT gstin FROM Business LIMIT 1")
+    business_gstin = cursor.fetchone()['gstin']
+    cursor.execute("SELECT id, default_sale_price, default_tax_rate, default_unit, purchase_price FROM Items ORDER BY id")
     items = [dict(row) for row in cursor.fetchall()]
-    
+    inter_state_by_customer = {customer_id: is_inter_state(business_gstin, state)
+                               for customer_id, state in customer_states.items()}
+    next_id = cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM Invoices").fetchone()[0]
+
     invoice_counters = {}
     total_invoices_created = 0
-    
-    # Start generating from MONTHS_TO_GENERATE months ago
-    current_date = datetime.now().replace(day=1) - relativedelta(months=MONTHS_TO_GENERATE - 1)
-
-    for _ in range(MONTHS_TO_GENERATE):
-        # Determine the financial year string based on the current month
-        year = current_date.year
-        month = current_date.month
-        if month < 4:
-            fy_str = f"FY{str(year-1)[-2:]}-{str(year)[-2:]}"
-        else:
-            fy_str = f"FY{str(year)[-2:]}-{str(year+1)[-2:]}"
-        
-        # Reset invoice counter for the new financial year
-        if fy_str not in invoice_counters:
-            invoice_counters[fy_str] = 1
-
-        invoices_this_month = random.randint(INVOICES_PER_MONTH_AVG - 20, INVOICES_PER_MONTH_AVG + 20)
-        
-        # Ensure we don't go past the current date if generating for the present month
-        end_of_month = (current_date.replace(day=28) + relativedelta(days=4)).replace(day=1) - relativedelta(days=1)
-        if datetime.now() < end_of_month:
-            end_of_month = datetime.now()
-
-        for _ in range(invoices_this_month):
-            # Ensure the generated date doesn't exceed the end of the month or today's date
-            if current_date > end_of_month:
-                break
-            
-            invoice_date = current_date
+    batch = new_batch()
+    invoices, lines = batch['invoices'], batch['lines']
+
+    for first_day, last_day in month_windows(end_date, MONTHS_TO_GENERATE):
+        invoices_this_month = random.randint(INVOICES_PER_MONTH_AVG - spread, INVOICES_PER_MONTH_AVG + spread)
+        days = [(first_day + timedelta(days=offset)).strftime('%Y-%m-%d')
+                for offset in range((last_day - first_day).days + 1)]
+        fy_str = financial_year(first_day)  # months never straddle a financial year
+        for offset in sorted(random.randrange(len(days)) for _ in range(invoices_this_month)):
+            invoice_counters[fy_str] = invoice_counters.get(fy_str, 0) + 1
             customer_id = random.choice(customer_ids)
-            
-            invoice_num = invoice_counters[fy_str]
-            invoice_counters[fy_str] += 1
-            invoice_no_str = f"{fy_str}/{invoice_num:04d}"
-            
-            items_for_this_invoice = random.sample(items, k=random.randint(1, 5))
-            invoice_items_to_add = []
-            total_taxable = 0
-            total_cgst = 0
-            total_sgst = 0
-
-            for item in items_for_this_invoice:
-                qty = random.randint(1, 10)
-                price = item['default_sale_price']
-                gst_rate = item['default_tax_rate']
-                unit = item['default_unit']
-                taxable_amount = qty * price
-                tax = taxable_amount * (gst_rate / 100)
-                total_amount = taxable_amount + tax
-                invoice_items_to_add.append((item['id'], unit, qty, price, gst_rate, tax / 2, tax / 2, 0, total_amount))
-                total_taxable += taxable_amount
-                total_cgst += tax / 2
-                total_sgst += tax / 2
-            
-            exact_total_value = total_taxable + total_cgst + total_sgst
-            rounded_total_value = round(exact_total_value)
-            round_off_amount = rounded_total_value - exact_total_value
-            
-            cursor.execute("""
-                INSERT INTO Invoices 
-                (invoice_no, date, customer_id, sale_type, status, total_value, taxable_value, cgst, sgst, igst, cess, round_off) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (invoice_no_str, invoice_date.strftime('%Y-%m-%d'), customer_id, 'CASH', 'PAID', rounded_total_value, total_taxable, total_cgst, total_sgst, 0, 0, round_off_amount))
-            
-            invoice_id = cursor.lastrowid
-            for item_data in invoice_items_to_add:
-                cursor.execute("INSERT INTO Invoice_Items (invoice_id, item_id, unit, quantity, price_per_unit, gst_rate, cgst_amount, sgst_amount, igst_amount, total_amount) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (invoice_id, *item_data))
-            total_invoices_created += 1
-
-            # Increment the current date by a random number of hours to simulate passing time
-            current_date += relativedelta(hours=random.randint(1, 18))
-
-        print(f"  - Generated {invoices_this_month} invoices for {current_date.strftime('%B %Y')}")
-        # Move to the next month for the next loop iteration
-        current_date = (current_date.replace(day=28) + relativedelta(days=4)).replace(day=1)
+            position = len(invoices['invoice_no'])
+            invoices['invoice_no'].append(f"{fy_str}/{invoice_counters[fy_str]:04d}")
+            invoices['date'].append(days[offset])
+            invoices['customer_id'].append(customer_id)
+            invoices['inter_state'].append(inter_state_by_customer[customer_id])
+            for item in random.sample(items, k=random.randint(1, min(5, len(items)))):
+                lines['invoice'].append(position)
+                lines['item_id'].append(item['id'])
+                lines['unit'].append(item['default_unit'])
+                lines['quantity'].append(random.randint(1, 10))
+                lines['price_per_unit'].append(item['default_sale_price'])
+                lines['gst_rate'].append(item['default_tax_rate'])
+                lines['purchase_price'].append(item['purchase_price'])
+            if position + 1 == BATCH_SIZE:
+                insert_invoice_batch(cursor, batch, next_id)
+                next_id += BATCH_SIZE
+                batch = new_batch()
+                invoices, lines = batch['invoices'], batch['lines']
+        total_invoices_created += invoices_this_month
+        print(f"  - Generated {invoices_this_month} invoices for {first_day.strftime('%B %Y')}")
+
+    if invoices['invoice_no']:
+        insert_invoice_batch(cursor, batch, next_id)
 
     end_time = time.time()
     print(f"\n✅ Successfully generated {total_invoices_created} invoices in {end_time - start_time:.2f} seconds.")
 
-# --- MAIN EXECUTION ---
-if __name__ == '__main__':
-    if apply_schema():
-        clear_all_data()
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        try:
+
+@contextmanager
+def bulk_load(conn):
+    """Speeds up a large load into a throwaway database, then puts the database back to normal.
+
+    The rollback journal is kept in memory and fsync is off for the load, and the
+    secondary indexes on Invoices and Invoice_Items are dropped and rebuilt at the end
+    (one sort per index instead of a B-tree insert per row). Everything is committed
+    once, when the block finishes. A crash mid-load can leave a corrupt file, which
+    for seed data just means seeding again.
+    """
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute(f"PRAGMA cache_size = {LOAD_CACHE_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    indexes = conn.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name IN ('Invoices', 'Invoice_Items') AND sql IS NOT NULL
+    """).fetchall()
+    for index in indexes:
+        conn.execute(f"DROP INDEX {index['name']}")
+    try:
+        yield
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        for index in indexes:
+            conn.execute(index['sql'])
+        conn.commit()
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+
+
+def seed(seed_value=None):
+    """Applies the schema to DB_FILE, clears it and fills it with generated data using the settings above."""
+    if seed_value is not None:
+        random.seed(seed_value)
+    if not apply_schema():
+        return False
+    clear_all_data()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        with bulk_load(conn):
             seed_base_data(cursor)
             seed_invoices(cursor)
-            conn.commit()
-            print("\n🎉 Database seeding complete!")
-        except Exception as e:
-            print(f"\n❌ An error occurred during seeding: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
\ No newline at end of file
+        sales_rollup.rebuild(conn)
+        customer_stats.rebuild(conn)
+        invoice_store.sync_invoice_counters(conn)
+        conn.commit()
+        print("\n🎉 Database seeding complete!")
+        return True
+    except Exception as e:
+        print(f"\n❌ An error occurred during seeding: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Fill the invoice database with generated, reproducible data.')
+    parser.add_argument('--db', default=DB_FILE, help='database file (default: %(default)s)')
+    parser.add_argument('--customers', type=int, default=NUM_CUSTOMERS)
+    parser.add_argument('--items', type=int, default=NUM_ITEMS)
+    parser.add_argument('--months', type=int, default=MONTHS_TO_GENERATE)
+    volume = parser.add_mutually_exclusive_group()
+    volume.add_argument('--invoices-per-month', type=int, default=INVOICES_PER_MONTH_AVG)
+    volume.add_argument('--invoices', type=int, help='approximate total, spread evenly over --months')
+    parser.add_argument('--seed', type=int, default=SEED, help='random seed; the same seed and --end-date give the same data')
+    parser.add_argument('--end-date', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        help='last day to generate invoices for, YYYY-MM-DD (default: today)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='invoices per executemany batch')
+    return parser.parse_args(argv)
+
+
+# --- MAIN EXECUTION ---
+if __name__ == '__main__':
+    args = parse_args()
+    DB_FILE = args.db
+    NUM_CUSTOMERS = args.customers
+    NUM_ITEMS = args.items
+    MONTHS_TO_GENERATE = args.months
+    INVOICES_PER_MONTH_AVG = -(-args.invoices // args.months) if args.invoices else args.invoices_per_month
+    END_DATE = args.end_date
+    BATCH_SIZE = args.batch_size
+    sys.exit(0 if seed(args.seed) else 1)
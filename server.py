@@ -1,52 +1,153 @@
+import base64
+import io
+import json
+import os
 import sqlite3
-from flask import Flask, jsonify, request, render_template, Response
+import time
+from flask import Flask, jsonify, request, Response, g, has_request_context
 from flask_cors import CORS
 from datetime import datetime, timedelta
-import re
-from weasyprint import HTML
-from num2words import num2words
+from bulk_import import IMPORT_CHUNK_SIZE, MAX_IMPORT_CHUNK_SIZE, import_invoices, iter_ndjson
+from database import ConnectionPool
+from invoice_store import (UPDATE_INVOICE_SQL, format_invoice_number, insert_invoice, peek_invoice_number,
+                           record_invoice_number, reserve_invoice_numbers, save_invoice_lines)
+from pdf_cache import PdfCache
+from pdf_data import load_pdf_data, warm_up as warm_up_pdf_data
+from pdf_templates import PdfRenderer
+from pdf_worker import PdfRenderService, QueueFullError
+from reference_cache import CachedQuery, business_profile, invoice_prefixes, units
+from streaming import iter_batches, stream_csv, stream_json_array, stream_ndjson, stream_xlsx, stream_zip
+from tax_engine import TaxError, apply_to_invoice, is_inter_state
+from migrations import apply_migrations
+import analytics
+import customer_stats
+import exports
+import metrics
+import reference_cache
+import sales_rollup
+import search_index
+import suggest_index
 
 # --- Flask App Setup ---
 app = Flask(__name__, template_folder='templates')
 CORS(app)
+metrics.install(app)
 
 # --- Database Configuration ---
-DB_FILE = 'invoice_app.db'
-
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
+DB_FILE = os.environ.get('INVOICE_DB', 'invoice_app.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+
+apply_migrations(DB_FILE)
+FTS_ENABLED = search_index.is_installed(DB_FILE)
+
+writer_pool = ConnectionPool(DB_FILE, size=DB_POOL_SIZE)
+reader_pool = ConnectionPool(DB_FILE, size=DB_POOL_SIZE, readonly=True)
+
+# Per-statement timings for /metrics; SQL_METRICS=0 turns them off.
+if os.environ.get('SQL_METRICS', '1').lower() not in ('0', 'false', 'no'):
+    writer_pool.statement_observers.append(metrics.observe_statement)
+    reader_pool.statement_observers.append(metrics.observe_statement)
+
+# --- PDF Cache Configuration ---
+pdf_cache = PdfCache(
+    max_entries=int(os.environ.get('PDF_CACHE_ENTRIES', 128)),
+    disk_dir=os.environ.get('PDF_CACHE_DIR') or None
+)
+
+# --- Background PDF Rendering ---
+PDF_THEMES = {
+    'default': 'invoice_pdf.html',
+    'modern': 'invoice_pdf_modern.html',
+    'minimalist': 'invoice_pdf_minimalist.html',
+    'classic': 'invoice_pdf_classic.html',
+    'creative': 'invoice_pdf_creative.html',
+    'technical': 'invoice_pdf_technical.html'
+}
+
+# --- Pagination ---
+INVOICE_PAGE_SIZE = 50
+CUSTOMER_PAGE_SIZE = 15
+LEDGER_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# ?format= values for streamed listings: encoder and response mimetype.
+STREAM_FORMATS = {
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+    'json-stream': (stream_json_array, 'application/json'),
+}
+
+EXPORT_BATCH_SIZE = 200
+MAX_MERGED_INVOICES = 500
+MAX_RESERVED_INVOICE_NUMBERS = 10000
+
+# --- Reference Data Cache ---
+ITEM_SEARCH_CACHE_SIZE = 256  # distinct autocomplete search terms kept
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+
+# --- Analytics ---
+ANALYTICS_LIMIT = 10
+MAX_ANALYTICS_LIMIT = 500
+# Column snapshot of the line items behind /api/analytics; ANALYTICS_DIR= (empty) keeps it in memory only.
+analytics_store = analytics.AnalyticsStore(
+    os.environ.get('ANALYTICS_DIR', DB_FILE + '.analytics') or None,
+    refresh_interval=float(os.environ.get('ANALYTICS_REFRESH_SECONDS', analytics.DEFAULT_REFRESH_INTERVAL)),
+    verify_interval=float(os.environ.get('ANALYTICS_VERIFY_SECONDS', analytics.DEFAULT_VERIFY_INTERVAL))
+)
+
+def cache_rendered_pdf(job, pdf):
+    pdf_cache.put(job['invoice_id'], job['cache_key'], pdf)
+
+pdf_service = PdfRenderService(
+    os.path.join(app.root_path, app.template_folder),
+    PDF_THEMES.values(),
+    max_workers=int(os.environ.get('PDF_WORKERS', 0)) or None,
+    max_queue=int(os.environ.get('PDF_QUEUE_DEPTH', 32)),
+    max_finished=int(os.environ.get('PDF_FINISHED_JOBS', 64)),
+    on_complete=cache_rendered_pdf,
+    on_timings=metrics.observe_pdf_timings
+)
+# Renders the synchronous /pdf endpoint in this process; WeasyPrint is imported on first use.
+pdf_renderer = PdfRenderer(os.path.join(app.root_path, app.template_folder), PDF_THEMES.values())
+# PDF_RENDER_IN_POOL=1 sends synchronous renders to pdf_service's process pool instead, so a
+# single multi-threaded server process can render on every core (the "pdf" gunicorn profile).
+PDF_RENDER_IN_POOL = os.environ.get('PDF_RENDER_IN_POOL', '').lower() in ('1', 'true', 'yes')
+
+# PDF_WARMUP=1 does the first-render work (WeasyPrint import, template compilation, CSS
+# parsing, font loading) at startup, here and in every pool process, instead of in the
+# first PDF request. Leave it off for workers that only serve the JSON API.
+if os.environ.get('PDF_WARMUP', '').lower() in ('1', 'true', 'yes'):
+    warm_up_pdf_data()
+    pdf_renderer.warm_up()
+    pdf_service.warm_up()
+
+def get_db_connection(readonly=False):
+    """Checks out a pooled connection to the SQLite database.
+
+    Pass readonly=True for pure reads so they are served from the read-only pool and
+    never wait on a writer. Calling close() on the connection returns it to its pool;
+    anything a request forgets to close is returned when the request ends.
+    """
+    conn = (reader_pool if readonly else writer_pool).acquire()
+    if has_request_context():
+        g.setdefault('db_connections', []).append((conn, conn.checkout))
     return conn
 
+@app.teardown_request
+def release_db_connections(exc):
+    # Only this request's checkouts are released: a connection the view already closed may
+    # belong to another request by now, and its old token no longer matches.
+    for conn, checkout in g.pop('db_connections', []):
+        conn.close(checkout)
+
 def calculate_dashboard_kpis(start_date, end_date):
     """A helper function to calculate total sales, profit, and invoice count for a given date range."""
     if not start_date or not end_date:
         return {'total_sales': 0, 'total_profit': 0, 'total_invoices': 0}
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    start_date_str = start_date.strftime('%Y-%m-%d')
-    end_date_str = end_date.strftime('%Y-%m-%d')
-
-    cursor.execute("SELECT SUM(total_value), COUNT(id) FROM Invoices WHERE date BETWEEN ? AND ?", (start_date_str, end_date_str))
-    result = cursor.fetchone()
-    total_sales = result[0] if result and result[0] is not None else 0
-    total_invoices = result[1] if result and result[1] is not None else 0
-
-    cursor.execute("""
-        SELECT SUM(ii.quantity * (ii.price_per_unit - i.purchase_price)) 
-        FROM Invoice_Items ii
-        JOIN Items i ON ii.item_id = i.id
-        JOIN Invoices inv ON ii.invoice_id = inv.id
-        WHERE inv.date BETWEEN ? AND ? AND i.purchase_price IS NOT NULL
-    """, (start_date_str, end_date_str))
-    profit_result = cursor.fetchone()
-    total_profit = profit_result[0] if profit_result and profit_result[0] is not None else 0
-    
+    conn = get_db_connection(readonly=True)
+    kpis = sales_rollup.get_kpis(conn, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
     conn.close()
-    return {'total_sales': total_sales, 'total_profit': total_profit, 'total_invoices': total_invoices}
+    return kpis
 
 
 # --- API Endpoints ---
@@ -57,33 +158,38 @@ def delete_invoice(invoice_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        invoice = cursor.execute("SELECT date, customer_id FROM Invoices WHERE id = ?", (invoice_id,)).fetchone()
         cursor.execute("DELETE FROM Invoices WHERE id = ?", (invoice_id,))
-        conn.commit()
-        conn.close()
         if cursor.rowcount == 0:
+            conn.close()
             return jsonify({'error': 'Invoice not found'}), 404
+        sales_rollup.refresh_days(conn, [invoice['date']])
+        customer_stats.refresh_customers(conn, [invoice['customer_id']])
+        conn.commit()
+        conn.close()
+        pdf_cache.invalidate_invoice(invoice_id)
+        analytics_store.invoices_changed([invoice_id])
         return jsonify({'message': 'Invoice deleted successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/invoices', methods=['GET'])
-def get_invoices():
-    """Fetches a list of invoices with customer names, supporting search, date filtering, and limit."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    search_term = request.args.get('search', '')
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    limit = request.args.get('limit')
+def build_invoice_filters(args):
+    """Builds the WHERE clause shared by the invoice listing and exports from search/start_date/end_date args.
 
-    params = []
-    query = """
-        SELECT i.id, i.invoice_no, i.date, i.total_value, i.status, c.name as customer_name
-        FROM Invoices i JOIN Customers c ON i.customer_id = c.id
+    The clause refers to Invoices as `i` and Customers as `c`.
     """
+    search_term = args.get('search', '')
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+
+    params = []
     conditions = []
-    if search_term:
+    invoice_match = search_index.match_expression(search_term, ['invoice_no', 'total_value']) if FTS_ENABLED else None
+    if invoice_match:
+        conditions.append("""(i.id IN (SELECT rowid FROM Invoices_FTS WHERE Invoices_FTS MATCH ?)
+            OR i.customer_id IN (SELECT rowid FROM Customers_FTS WHERE Customers_FTS MATCH ?))""")
+        params.extend([invoice_match, search_index.match_expression(search_term, ['name'])])
+    elif search_term:
         conditions.append("(i.invoice_no LIKE ? OR c.name LIKE ? OR i.total_value LIKE ?)")
         params.extend([f'%{search_term}%', f'%{search_term}%', f'%{search_term}%'])
     if start_date:
@@ -92,29 +198,145 @@ def get_invoices():
     if end_date:
         conditions.append("i.date <= ?")
         params.append(end_date)
-    
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-    
-    query += " ORDER BY i.date DESC, i.id DESC"
-    
-    if limit:
+
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+def encode_cursor(*values):
+    """Packs the sort key of the last row on a page into an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(token, size):
+    """Unpacks a cursor made by encode_cursor(); raises ValueError if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+def get_invoice_listing_summary(conn, args, where_clause, params):
+    """Counts and totals every invoice matching the listing filters (not just the current page)."""
+    if not args.get('search'):
+        # Date-only filters can be answered from the daily rollup in O(days).
+        conditions, rollup_params = [], []
+        if args.get('start_date'):
+            conditions.append("date >= ?")
+            rollup_params.append(args['start_date'])
+        if args.get('end_date'):
+            conditions.append("date <= ?")
+            rollup_params.append(args['end_date'])
+        query = "SELECT SUM(invoice_count), SUM(total_sales) FROM Daily_Sales_Rollup"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        row = conn.execute(query, rollup_params).fetchone()
+    else:
+        row = conn.execute(
+            "SELECT COUNT(*), SUM(i.total_value) FROM Invoices i JOIN Customers c ON i.customer_id = c.id" + where_clause,
+            params
+        ).fetchone()
+    return {'count': row[0] or 0, 'total_value': row[1] or 0}
+
+def iter_query(query, params, encode):
+    """Yields a query's rows through `encode` (batches of rows -> chunks), reading them in fetchmany batches.
+
+    The connection is checked out inside the generator (not through the request) because the
+    body is produced after the view returns; closing it when the generator finishes or the
+    client disconnects returns it to the pool.
+    """
+    conn = reader_pool.acquire()
+    try:
+        yield from encode(iter_batches(conn.execute(query, params)))
+    finally:
+        conn.close()
+
+def stream_query(query, params, encode, mimetype, headers=None):
+    """Streams iter_query() as the response body."""
+    return Response(iter_query(query, params, encode), mimetype=mimetype, headers=headers)
+
+INVOICE_LISTING_SQL = """
+        SELECT i.id, i.invoice_no, i.date, i.total_value, i.status, c.name as customer_name
+        FROM Invoices i JOIN Customers c ON i.customer_id = c.id
+    """
+
+def is_paginated_listing(args):
+    return 'cursor' in args or 'page_size' in args
+
+def invoice_listing_query(args):
+    """The unpaginated listing query (newest first, cut off at `limit` if given) and its parameters."""
+    where_clause, params = build_invoice_filters(args)
+    query = INVOICE_LISTING_SQL + where_clause + " ORDER BY i.date DESC, i.id DESC"
+    if args.get('limit'):
         query += " LIMIT ?;"
-        params.append(int(limit))
+        params.append(int(args['limit']))
     else:
         query += ";"
+    return query, params
 
-    cursor.execute(query, params)
-    invoices = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(invoices)
+def list_invoices(conn, args):
+    """Builds the JSON body of GET /api/invoices for everything but the streamed formats.
 
+    Raises ValueError for a malformed cursor or page size.
+    """
+    if not is_paginated_listing(args):
+        query, params = invoice_listing_query(args)
+        return [dict(row) for row in conn.execute(query, params)]
+
+    where_clause, params = build_invoice_filters(args)
+    try:
+        page_size = min(max(int(args.get('page_size', INVOICE_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError('page_size must be an integer')
+    response = {}
+    if args.get('include_total') == '1':
+        response['summary'] = get_invoice_listing_summary(conn, args, where_clause, params)
+    page_where, page_params = where_clause, list(params)
+    if args.get('cursor'):
+        last_date, last_id = decode_cursor(args['cursor'], 2)
+        page_where += (" AND " if page_where else " WHERE ") + "(i.date, i.id) < (?, ?)"
+        page_params.extend([last_date, last_id])
+
+    # Fetch one extra row to learn whether there is a next page.
+    query = INVOICE_LISTING_SQL + page_where + " ORDER BY i.date DESC, i.id DESC LIMIT ?;"
+    invoices = [dict(row) for row in conn.execute(query, page_params + [page_size + 1])]
+    has_more = len(invoices) > page_size
+    invoices = invoices[:page_size]
+    response['invoices'] = invoices
+    response['next_cursor'] = encode_cursor(invoices[-1]['date'], invoices[-1]['id']) if has_more else None
+    return response
+
+@app.route('/api/invoices', methods=['GET'])
+def get_invoices():
+    """Fetches a list of invoices with customer names, supporting search, date filtering, and limit.
+
+    Passing `cursor` (empty for the first page) and/or `page_size` switches to keyset pagination
+    on (date, id): the response becomes {'invoices', 'next_cursor'} and, with include_total=1,
+    a 'summary' of the whole filtered result. Without pagination, format=ndjson or
+    format=json-stream streams the full listing instead of building it in memory.
+    """
+    stream_format = request.args.get('format')
+    if stream_format and stream_format not in STREAM_FORMATS:
+        return jsonify({'error': f"Invalid format; expected one of: {', '.join(STREAM_FORMATS)}"}), 400
+    if stream_format and not is_paginated_listing(request.args):
+        query, params = invoice_listing_query(request.args)
+        return stream_query(query, params, *STREAM_FORMATS[stream_format])
+
+    conn = get_db_connection(readonly=True)
+    try:
+        return jsonify(list_invoices(conn, request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
 
-@app.route('/api/sales_data', methods=['GET'])
-def get_sales_data():
-    period = request.args.get('period', 'this-month')
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
+
+def sales_data(args):
+    """Builds the dashboard's sales chart and KPIs for the `period` (or custom start_date/end_date) in `args`."""
+    period = args.get('period', 'this-month')
+    start_date_str = args.get('start_date')
+    end_date_str = args.get('end_date')
 
     today = datetime.now()
     
@@ -160,13 +382,10 @@ def get_sales_data():
         time_unit = 'month'
         date_format_for_query = '%Y-%m-01'
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = f"SELECT STRFTIME('{date_format_for_query}', date) as period, SUM(total_value) as total_sales FROM Invoices WHERE date BETWEEN ? AND ? GROUP BY period ORDER BY period;"
-    cursor.execute(query, (current_start.strftime('%Y-%m-%d'), current_end.strftime('%Y-%m-%d')))
-    
-    sales_data = cursor.fetchall()
-    sales_dict = {row['period']: row['total_sales'] for row in sales_data}
+    conn = get_db_connection(readonly=True)
+    sales_dict = sales_rollup.get_sales_by_period(
+        conn, current_start.strftime('%Y-%m-%d'), current_end.strftime('%Y-%m-%d'), date_format_for_query
+    )
     
     labels, data_points = [], []
     
@@ -197,11 +416,14 @@ def get_sales_data():
         'change': change_string,
         'time_unit': time_unit
     }
-    return jsonify(response_data)
+    return response_data
 
+@app.route('/api/sales_data', methods=['GET'])
+def get_sales_data():
+    return jsonify(sales_data(request.args))
 
-@app.route('/api/financial_year_summary', methods=['GET'])
-def get_financial_year_summary():
+
+def financial_year_summary():
     today = datetime.now()
     if today.month >= 4:
         fy_start = today.replace(month=4, day=1)
@@ -209,80 +431,359 @@ def get_financial_year_summary():
         fy_start = today.replace(year=today.year - 1, month=4, day=1)
     fy_end = today
     kpis = calculate_dashboard_kpis(fy_start, fy_end)
-    return jsonify({'total_sales': kpis['total_sales'], 'total_profit': kpis['total_profit']})
+    return {'total_sales': kpis['total_sales'], 'total_profit': kpis['total_profit']}
+
+@app.route('/api/financial_year_summary', methods=['GET'])
+def get_financial_year_summary():
+    return jsonify(financial_year_summary())
+
+
+def parse_analytics_args(args, by=None):
+    """Returns (by, metric, start_date, end_date, limit) for the analytics endpoints; raises ValueError."""
+    by = by or args.get('by', 'category')
+    if by not in analytics.GROUPS:
+        raise ValueError(f"by must be one of: {', '.join(analytics.GROUPS)}")
+    metric = args.get('metric', 'sales')
+    if metric not in analytics.METRICS:
+        raise ValueError(f"metric must be one of: {', '.join(analytics.METRICS)}")
+    try:
+        limit = min(max(int(args.get('limit', ANALYTICS_LIMIT)), 1), MAX_ANALYTICS_LIMIT)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    try:
+        start_date, end_date = exports.parse_date_range(args)
+    except ValueError:
+        raise ValueError('Dates must be in YYYY-MM-DD format')
+    return by, metric, start_date, end_date, limit
+
+def previous_period(start_date, end_date):
+    """The range of the same length that ends the day before start_date."""
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    previous_end = start - timedelta(days=1)
+    return (previous_end - (end - start)).strftime('%Y-%m-%d'), previous_end.strftime('%Y-%m-%d')
+
+def label_rows(conn, by, rows):
+    """Adds each group's display name (item, customer or category name, HSN code) to report rows."""
+    names = analytics_store.labels(conn, by, [row['key'] for row in rows])
+    for row in rows:
+        row['name'] = names.get(row['key'])
+    return rows
+
+def analytics_report(args, by=None):
+    """Top groups by `metric` in the date range, with sales, profit and margin."""
+    by, metric, start_date, end_date, limit = parse_analytics_args(args, by)
+    analytics_store.ensure_fresh(reader_pool.acquire)
+    rows = analytics_store.top(by, metric, start_date, end_date, limit)
+    conn = get_db_connection(readonly=True)
+    try:
+        rows = label_rows(conn, by, rows)
+    finally:
+        conn.close()
+    return {'by': by, 'metric': metric, 'start_date': args.get('start_date'), 'end_date': args.get('end_date'),
+            'groups': rows}
+
+def analytics_comparison(args):
+    """The top groups of one period next to their figures for the previous period.
+
+    start_date and end_date are required; previous_start_date/previous_end_date default
+    to the same number of days immediately before.
+    """
+    if not args.get('start_date') or not args.get('end_date'):
+        raise ValueError('start_date and end_date are required')
+    by, metric, start_date, end_date, limit = parse_analytics_args(args)
+    previous = previous_period(start_date, end_date)
+    if args.get('previous_start_date') or args.get('previous_end_date'):
+        previous = exports.parse_date_range({'start_date': args.get('previous_start_date') or previous[0],
+                                             'end_date': args.get('previous_end_date') or previous[1]})
+    analytics_store.ensure_fresh(reader_pool.acquire)
+    rows, current_totals, previous_totals = analytics_store.compare(by, (start_date, end_date), previous, metric, limit)
+    conn = get_db_connection(readonly=True)
+    try:
+        rows = label_rows(conn, by, rows)
+    finally:
+        conn.close()
+    return {
+        'by': by, 'metric': metric,
+        'current': dict(current_totals, start_date=start_date, end_date=end_date),
+        'previous': dict(previous_totals, start_date=previous[0], end_date=previous[1]),
+        'groups': rows,
+    }
+
+@app.route('/api/analytics/top_items', methods=['GET'])
+def get_top_items():
+    """Best-selling items in a date range, by sales (default), profit, quantity or lines."""
+    try:
+        return jsonify(analytics_report(request.args, 'item'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/analytics/top_customers', methods=['GET'])
+def get_top_customers():
+    """Customers with the most sales (or profit, quantity, lines) in a date range."""
+    try:
+        return jsonify(analytics_report(request.args, 'customer'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/analytics/margins', methods=['GET'])
+def get_margins():
+    """Sales, profit and margin per category (default), hsn, item or customer."""
+    args = request.args.to_dict()
+    args.setdefault('limit', MAX_ANALYTICS_LIMIT)
+    try:
+        return jsonify(analytics_report(args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/analytics/compare', methods=['GET'])
+def get_analytics_comparison():
+    """Period-over-period figures for the top groups of a period."""
+    try:
+        return jsonify(analytics_comparison(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/analytics/stats', methods=['GET'])
+def get_analytics_stats():
+    return jsonify(analytics_store.stats())
 
 def get_pdf_data(invoice_id):
     """Fetches all data needed for any PDF template."""
-    conn = get_db_connection()
-    data = {}
-    
-    invoice = conn.execute('SELECT * FROM Invoices WHERE id = ?', (invoice_id,)).fetchone()
-    if not invoice:
-        conn.close()
-        return None
-    data['invoice'] = dict(invoice)
-        
-    data['customer'] = dict(conn.execute('SELECT * FROM Customers WHERE id = ?', (invoice['customer_id'],)).fetchone())
-    data['business'] = dict(conn.execute('SELECT * FROM Business LIMIT 1').fetchone())
-    data['items'] = [dict(row) for row in conn.execute('SELECT ii.*, i.name, i.hsn_code FROM Invoice_Items ii JOIN Items i ON ii.item_id = i.id WHERE ii.invoice_id = ?', (invoice_id,)).fetchall()]
+    batch = get_pdf_data_batch([invoice_id])
+    return batch[0] if batch else None
 
-    data['total_quantity'] = sum(item['quantity'] for item in data['items'])
-    
-    tax_summary = {}
-    for item in data['items']:
-        rate = item['gst_rate']
-        if rate not in tax_summary:
-            tax_summary[rate] = {'cgst': 0, 'sgst': 0}
-        tax_summary[rate]['cgst'] += item['cgst_amount']
-        tax_summary[rate]['sgst'] += item['sgst_amount']
-    data['tax_summary'] = tax_summary
-    
-    amount_in_rupees = int(invoice['total_value'])
-    data['amount_in_words'] = f"{num2words(amount_in_rupees, lang='en_IN').title()} Rupees Only"
-    
-    conn.close()
-    return data
+def get_pdf_data_batch(invoice_ids):
+    """Fetches PDF template data for many invoices with a fixed number of set-based queries, in the given order."""
+    start = time.perf_counter()
+    conn = get_db_connection(readonly=True)
+    try:
+        return load_pdf_data(conn, invoice_ids)
+    finally:
+        conn.close()
+        # The data does not depend on the theme, so this phase has no template label.
+        metrics.observe_pdf_timings('', {'data': time.perf_counter() - start})
+
+def pdf_filename(invoice):
+    return f'invoice_{invoice["invoice_no"].replace("/", "-")}.pdf'
+
+def get_template_mtime(template_name):
+    return os.path.getmtime(os.path.join(app.root_path, app.template_folder, template_name))
+
+def pdf_response_headers(template_name, data):
+    """Returns the ETag (also the pdf_cache key) and response headers for rendering `data` with `template_name`."""
+    etag = PdfCache.make_key(data, template_name, get_template_mtime(template_name))
+    filename = pdf_filename(data['invoice'])
+    return etag, {
+        'Content-Disposition': f'inline; filename={filename}',
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'private, no-cache'
+    }
 
-def create_pdf_response(template_name, data):
-    """Renders an HTML template and converts it to a PDF response."""
+def create_pdf_response(template_name, data, invoice_id=None):
+    """Renders an HTML template and converts it to a PDF response, reusing a cached rendering when possible."""
     if not data:
         return "Invoice not found", 404
-    
-    html = render_template(template_name, **data)
-    pdf = HTML(string=html).write_pdf()
-    
-    filename = f'invoice_{data["invoice"]["invoice_no"].replace("/", "-")}.pdf'
-    return Response(pdf, mimetype='application/pdf', headers={
-        'Content-Disposition': f'inline; filename={filename}'
-    })
+    if invoice_id is None:
+        invoice_id = data['invoice']['id']
+
+    etag, headers = pdf_response_headers(template_name, data)
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    pdf = pdf_cache.get(invoice_id, etag)
+    if pdf is None:
+        if PDF_RENDER_IN_POOL:
+            pdf = pdf_service.render(template_name, data)
+        else:
+            timings = {}
+            pdf = pdf_renderer.write_pdf(template_name, data, timings)
+            metrics.observe_pdf_timings(template_name, timings)
+        pdf_cache.put(invoice_id, etag, pdf)
+
+    return Response(pdf, mimetype='application/pdf', headers=headers)
 
 @app.route('/api/invoices/<int:invoice_id>/pdf')
 def generate_invoice_pdf(invoice_id):
     theme = request.args.get('theme', 'default')
     
-    valid_themes = ['default', 'modern', 'minimalist', 'classic', 'creative', 'technical']
-    if theme not in valid_themes:
+    if theme not in PDF_THEMES:
         return "Invalid theme selected", 400
 
-    template_name = f"invoice_pdf_{theme}.html" if theme != 'default' else "invoice_pdf.html"
+    template_name = PDF_THEMES[theme]
     
     pdf_data = get_pdf_data(invoice_id)
     if not pdf_data:
         return "Invoice not found", 404
 
-    html = render_template(template_name, **pdf_data)
-    pdf = HTML(string=html).write_pdf()
-    
-    filename = f'invoice_{pdf_data["invoice"]["invoice_no"].replace("/", "-")}.pdf'
-    return Response(pdf, mimetype='application/pdf', headers={
-        'Content-Disposition': f'inline; filename={filename}'
+    return create_pdf_response(template_name, pdf_data, invoice_id)
+
+def job_status_json(job):
+    return {
+        'job_id': job['id'],
+        'invoice_id': job['invoice_id'],
+        'status': job['status'],
+        'error': job['error'],
+        'status_url': f"/api/pdf_jobs/{job['id']}",
+        'result_url': f"/api/pdf_jobs/{job['id']}/result" if job['status'] == 'done' else None
+    }
+
+@app.route('/api/invoices/<int:invoice_id>/pdf/jobs', methods=['POST'])
+def enqueue_invoice_pdf(invoice_id):
+    """Queues a PDF render on the background worker pool and returns a job to poll."""
+    theme = request.args.get('theme', 'default')
+    if theme not in PDF_THEMES:
+        return jsonify({'error': 'Invalid theme selected'}), 400
+    template_name = PDF_THEMES[theme]
+
+    pdf_data = get_pdf_data(invoice_id)
+    if not pdf_data:
+        return jsonify({'error': 'Invoice not found'}), 404
+
+    cache_key = PdfCache.make_key(pdf_data, template_name, get_template_mtime(template_name))
+    try:
+        job = pdf_service.submit(invoice_id, template_name, pdf_data, cache_key=cache_key,
+                                 pdf=pdf_cache.get(invoice_id, cache_key))
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '5'}
+    return jsonify(job_status_json(job)), 202
+
+@app.route('/api/pdf_jobs/<job_id>', methods=['GET'])
+def get_pdf_job(job_id):
+    job = pdf_service.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_status_json(job))
+
+@app.route('/api/pdf_jobs/<job_id>/result', methods=['GET'])
+def get_pdf_job_result(job_id):
+    job = pdf_service.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] == 'failed':
+        return jsonify(job_status_json(job)), 500
+    if job['status'] != 'done':
+        return jsonify(job_status_json(job)), 409
+    return Response(job['result'], mimetype='application/pdf', headers={
+        'Content-Disposition': f"inline; filename={job['filename']}",
+        'ETag': f'"{job["cache_key"]}"'
+    })
+
+def iter_export_pdfs(invoice_ids, template_name):
+    """Yields (filename, pdf) for each invoice as soon as it is rendered, loading data a chunk at a time."""
+    def render_tasks():
+        for start in range(0, len(invoice_ids), EXPORT_BATCH_SIZE):
+            for data in get_pdf_data_batch(invoice_ids[start:start + EXPORT_BATCH_SIZE]):
+                yield pdf_filename(data['invoice']), template_name, data
+
+    yield from pdf_service.render_many(render_tasks())
+
+@app.route('/api/invoices/export/pdf', methods=['GET'])
+def export_invoice_pdfs():
+    """Streams the PDFs of every invoice matching the listing filters as a ZIP, or as one merged PDF."""
+    theme = request.args.get('theme', 'default')
+    if theme not in PDF_THEMES:
+        return jsonify({'error': 'Invalid theme selected'}), 400
+    template_name = PDF_THEMES[theme]
+    merged = request.args.get('format', 'zip') == 'merged'
+
+    where_clause, params = build_invoice_filters(request.args)
+    conn = get_db_connection(readonly=True)
+    invoice_ids = [row['id'] for row in conn.execute(
+        "SELECT i.id FROM Invoices i JOIN Customers c ON i.customer_id = c.id" + where_clause +
+        " ORDER BY i.date, i.id", params)]
+    conn.close()
+    if not invoice_ids:
+        return jsonify({'error': 'No invoices match the given filters'}), 404
+
+    export_name = f"invoices_{request.args.get('start_date') or 'all'}_{request.args.get('end_date') or 'all'}"
+    if merged:
+        if len(invoice_ids) > MAX_MERGED_INVOICES:
+            return jsonify({'error': f'Merged export is limited to {MAX_MERGED_INVOICES} invoices; use the ZIP format'}), 400
+        pdf = pdf_service.render_merged(template_name, get_pdf_data_batch(invoice_ids))
+        return Response(pdf, mimetype='application/pdf', headers={
+            'Content-Disposition': f'attachment; filename={export_name}.pdf'
+        })
+
+    return Response(stream_zip(iter_export_pdfs(invoice_ids, template_name)), mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename={export_name}.zip'
     })
 
+@app.route('/api/exports/<report>', methods=['GET'])
+def export_report(report):
+    """Streams the invoices, line_items or hsn_summary report for a date range as CSV or XLSX."""
+    if report not in exports.REPORTS:
+        return jsonify({'error': f"Unknown report; expected one of: {', '.join(exports.REPORTS)}"}), 404
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'xlsx'):
+        return jsonify({'error': 'Invalid format; expected csv or xlsx'}), 400
+    try:
+        start_date, end_date = exports.parse_date_range(request.args)
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+
+    sheet_name, header, query = exports.REPORTS[report]
+    filename = f"{report}_{request.args.get('start_date') or 'all'}_{request.args.get('end_date') or 'all'}.{export_format}"
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+    if export_format == 'xlsx':
+        return stream_query(query, (start_date, end_date), lambda batches: stream_xlsx(sheet_name, header, batches),
+                            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', headers)
+    return stream_query(query, (start_date, end_date), lambda batches: stream_csv(header, batches),
+                        'text/csv', headers)
+
 # --- START: MODIFIED/NEW CUSTOMER AND ITEM ENDPOINTS ---
 
+def list_customers_by_cursor(search_term):
+    """Keyset-paginated customer listing ordered by (name, id); deep pages cost the same as page 1."""
+    try:
+        page_size = min(max(int(request.args.get('limit', CUSTOMER_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    conditions, params = [], []
+
+    customer_match = search_index.match_expression(search_term) if FTS_ENABLED else None
+    if customer_match:
+        conditions.append("id IN (SELECT rowid FROM Customers_FTS WHERE Customers_FTS MATCH ?)")
+        params.append(customer_match)
+    elif search_term:
+        conditions.append("(name LIKE ? OR phone LIKE ? OR gstin LIKE ?)")
+        params.extend([f'%{search_term}%'] * 3)
+
+    if request.args.get('cursor'):
+        try:
+            last_name, last_id = decode_cursor(request.args['cursor'], 2)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    response = {}
+    conn = get_db_connection(readonly=True)
+    try:
+        if request.args.get('include_total') == '1':
+            where_clause = " WHERE " + " AND ".join(conditions) if conditions else ""
+            response['total'] = conn.execute("SELECT COUNT(*) FROM Customers" + where_clause, params).fetchone()[0]
+
+        if request.args.get('cursor'):
+            conditions.append("(name, id) > (?, ?)")
+            params.extend([last_name, last_id])
+
+        where_clause = " WHERE " + " AND ".join(conditions) if conditions else ""
+        rows = conn.execute(
+            "SELECT * FROM Customers" + where_clause + " ORDER BY name, id LIMIT ?", params + [page_size + 1]
+        ).fetchall()
+    finally:
+        conn.close()
+
+    customers = [dict(row) for row in rows[:page_size]]
+    response['customers'] = customers
+    response['limit'] = page_size
+    response['next_cursor'] = encode_cursor(customers[-1]['name'], customers[-1]['id']) if len(rows) > page_size else None
+    return jsonify(response)
+
 @app.route('/api/customers', methods=['GET', 'POST'])
 def handle_customers():
     """Handles fetching a paginated list of customers and creating new ones."""
+    if request.method == 'GET' and 'cursor' in request.args:
+        return list_customers_by_cursor(request.args.get('search', ''))
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -300,6 +801,7 @@ def handle_customers():
             cursor.execute("SELECT * FROM Customers WHERE id = ?", (new_customer_id,))
             new_customer = dict(cursor.fetchone())
             conn.close()
+            suggest_index.customers.upsert(new_customer)
             return jsonify(new_customer), 201
         except sqlite3.IntegrityError:
             conn.close()
@@ -316,8 +818,17 @@ def handle_customers():
     
     base_query = "FROM Customers"
     conditions = []
-
-    if search_term:
+    order_by = "name"
+
+    customer_match = search_index.match_expression(search_term) if FTS_ENABLED else None
+    if customer_match:
+        # Full-text matches come from the trigram index, best (bm25) matches first.
+        base_query = "FROM Customers_FTS JOIN Customers ON Customers.id = Customers_FTS.rowid"
+        conditions.append("Customers_FTS MATCH ?")
+        params.append(customer_match)
+        count_params.append(customer_match)
+        order_by = "Customers_FTS.rank, name"
+    elif search_term:
         conditions.append("(name LIKE ? OR phone LIKE ? OR gstin LIKE ?)")
         search_like = f'%{search_term}%'
         params.extend([search_like, search_like, search_like])
@@ -326,10 +837,10 @@ def handle_customers():
     if conditions:
         base_query += " WHERE " + " AND ".join(conditions)
 
-    count_query = "SELECT COUNT(id) " + base_query
+    count_query = "SELECT COUNT(*) " + base_query
     total_customers = cursor.execute(count_query, count_params).fetchone()[0]
 
-    data_query = "SELECT * " + base_query + " ORDER BY name LIMIT ? OFFSET ?"
+    data_query = "SELECT Customers.* " + base_query + f" ORDER BY {order_by} LIMIT ? OFFSET ?"
     params.extend([limit, offset])
     cursor.execute(data_query, params)
     
@@ -350,11 +861,11 @@ def handle_customer_by_id(customer_id):
     cursor = conn.cursor()
 
     if request.method == 'GET':
-        customer = cursor.execute('SELECT * FROM Customers WHERE id = ?', (customer_id,)).fetchone()
+        customer = load_customer(conn, customer_id)
         conn.close()
         if customer is None:
             return jsonify({'error': 'Customer not found'}), 404
-        return jsonify(dict(customer))
+        return jsonify(customer)
 
     if request.method == 'PUT':
         data = request.get_json()
@@ -375,6 +886,7 @@ def handle_customer_by_id(customer_id):
             cursor.execute("SELECT * FROM Customers WHERE id = ?", (customer_id,))
             updated_customer = dict(cursor.fetchone())
             conn.close()
+            suggest_index.customers.upsert(updated_customer)
             return jsonify(updated_customer)
         except Exception as e:
             conn.close()
@@ -382,7 +894,7 @@ def handle_customer_by_id(customer_id):
 
     if request.method == 'DELETE':
         try:
-            invoice_count = cursor.execute("SELECT COUNT(id) FROM Invoices WHERE customer_id = ?", (customer_id,)).fetchone()[0]
+            invoice_count = customer_stats.get_stats(conn, customer_id)['invoice_count']
             if invoice_count > 0:
                 return jsonify({'error': f'Cannot delete. Customer has {invoice_count} associated invoice(s).'}), 409
             
@@ -390,23 +902,113 @@ def handle_customer_by_id(customer_id):
             conn.commit()
             if cursor.rowcount == 0:
                 return jsonify({'error': 'Customer not found'}), 404
+            suggest_index.customers.remove(customer_id)
             return jsonify({'message': 'Customer deleted successfully'}), 200
         except Exception as e:
             return jsonify({'error': str(e)}), 500
         finally:
             conn.close()
 
+def load_customer(conn, customer_id):
+    """Returns a customer with their Customer_Stats figures under 'stats', or None if there is no such customer."""
+    customer = conn.execute('SELECT * FROM Customers WHERE id = ?', (customer_id,)).fetchone()
+    if customer is None:
+        return None
+    return dict(customer, stats=customer_stats.get_stats(conn, customer_id))
+
+def load_customer_ledger(conn, customer_id, args):
+    """Builds one page of a customer's statement: their invoices, newest first, each with the balance outstanding after it.
+
+    The balance of the newest line is the customer's credit_outstanding from Customer_Stats;
+    each older line's is worked back from the one after it, and the cursor carries it to the
+    next page. Every page therefore costs O(limit) however long the customer's history (a
+    cursor taken before an invoice changed keeps the balance it was issued with). Returns
+    None if there is no such customer; raises ValueError for a malformed cursor or limit.
+    """
+    if conn.execute("SELECT 1 FROM Customers WHERE id = ?", (customer_id,)).fetchone() is None:
+        return None
+    try:
+        page_size = min(max(int(args.get('limit', LEDGER_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    stats = customer_stats.get_stats(conn, customer_id)
+    if args.get('cursor'):
+        last_date, last_id, balance = decode_cursor(args['cursor'], 3)
+        if not (isinstance(last_date, str) and isinstance(last_id, int) and isinstance(balance, (int, float))):
+            raise ValueError('Invalid cursor')
+        before = (last_date, last_id)
+    else:
+        before, balance = None, stats['credit_outstanding']
+
+    # Fetch one extra line to learn whether there is a next page.
+    lines = customer_stats.get_ledger_lines(conn, customer_id, page_size + 1, before)
+    has_more = len(lines) > page_size
+    lines = lines[:page_size]
+    for line in lines:
+        line['balance'] = round(balance, 2)
+        balance -= line['amount_due']
+    return {
+        'customer_id': customer_id,
+        'stats': stats,
+        'lines': lines,
+        'limit': page_size,
+        'next_cursor': encode_cursor(lines[-1]['date'], lines[-1]['invoice_id'], round(balance, 2)) if has_more else None
+    }
+
+@app.route('/api/customers/<int:customer_id>/ledger', methods=['GET'])
+def get_customer_ledger(customer_id):
+    """Paginated statement for one customer; pass the returned next_cursor as `cursor` for the next page."""
+    conn = get_db_connection(readonly=True)
+    try:
+        ledger = load_customer_ledger(conn, customer_id, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+    if ledger is None:
+        return jsonify({'error': 'Customer not found'}), 404
+    return jsonify(ledger)
+
+
+def search_items(conn, search_term):
+    """Returns up to 20 items matching `search_term` (all items' first page when it is empty)."""
+    item_match = search_index.match_expression(search_term) if FTS_ENABLED else None
+    if item_match:
+        query = """
+            SELECT Items.* FROM Items_FTS JOIN Items ON Items.id = Items_FTS.rowid
+            WHERE Items_FTS MATCH ? ORDER BY Items_FTS.rank LIMIT 20
+        """
+        rows = conn.execute(query, (item_match,))
+    elif search_term:
+        rows = conn.execute("SELECT * FROM Items WHERE name LIKE ? LIMIT 20", (f'%{search_term}%',))
+    else:
+        rows = conn.execute("SELECT * FROM Items LIMIT 20")
+    return [dict(row) for row in rows]
+
+item_search = CachedQuery('item_search', search_items, max_keys=ITEM_SEARCH_CACHE_SIZE)
+
+def reference_response(cache, key=None):
+    """Serves a reference_cache entry as JSON with an ETag, answering 304 when the client's copy is current."""
+    entry = cache.entry(lambda: get_db_connection(readonly=True), key)
+    headers = {'ETag': f'"{entry.etag}"', 'Cache-Control': 'private, no-cache'}
+    if request.if_none_match.contains(entry.etag):
+        return Response(status=304, headers=headers)
+    return Response(entry.body, mimetype='application/json', headers=headers)
+
+@app.route('/api/reference_cache/stats', methods=['GET'])
+def get_reference_cache_stats():
+    """Hit/miss counters for the reference data caches."""
+    return jsonify(reference_cache.stats())
 
 @app.route('/api/items', methods=['GET', 'POST'])
 def handle_items():
     """Handles fetching and creating items."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
     if request.method == 'POST':
         data = request.get_json()
         if not data or not data.get('name'):
             return jsonify({'error': 'Item Name is required'}), 400
+        conn = get_db_connection()
+        cursor = conn.cursor()
         try:
             cursor.execute(
                 """
@@ -422,10 +1024,12 @@ def handle_items():
             )
             new_item_id = cursor.lastrowid
             conn.commit()
+            item_search.invalidate()
 
             cursor.execute("SELECT * FROM Items WHERE id = ?", (new_item_id,))
             new_item = dict(cursor.fetchone())
             conn.close()
+            suggest_index.items.upsert(new_item)
             return jsonify(new_item), 201
         except sqlite3.IntegrityError:
             conn.close()
@@ -434,192 +1038,281 @@ def handle_items():
             conn.close()
             return jsonify({'error': f'Database error: {e}'}), 500
 
-    # GET request logic
-    search_term = request.args.get('search', '')
-    if search_term:
-        query = "SELECT * FROM Items WHERE name LIKE ? LIMIT 20"
-        cursor.execute(query, (f'%{search_term}%',))
-    else:
-        query = "SELECT * FROM Items LIMIT 20"
-        cursor.execute(query)
-    items = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(items)
+    # GET request logic: autocomplete results are cached per search term until an item is added
+    return reference_response(item_search, request.args.get('search', '').strip().lower())
 
 
+@app.route('/api/suggest', methods=['GET'])
+def suggest():
+    """Top matches for the invoice editor's customer and item pickers, from the in-memory suggest_index.
+
+    Query args: type (customers or items), q, limit, and seq. The client numbers its
+    requests with seq, which is echoed back so a response that arrives after a newer
+    keystroke's can be dropped.
+    """
+    try:
+        index, query, limit, seq = parse_suggest_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'seq': seq, 'q': query, 'results': suggest_matches(index, query, limit)})
+
+def parse_suggest_args(args):
+    """Returns (index, q, limit, seq) from /api/suggest's query args; raises ValueError if they are invalid."""
+    index = suggest_index.INDEXES.get(args.get('type'))
+    if index is None:
+        raise ValueError(f"type must be one of: {', '.join(suggest_index.INDEXES)}")
+    try:
+        limit = min(max(int(args.get('limit', SUGGEST_LIMIT)), 1), MAX_SUGGEST_LIMIT)
+        seq = int(args['seq']) if 'seq' in args else None
+    except ValueError:
+        raise ValueError('limit and seq must be integers')
+    return index, args.get('q', ''), limit, seq
+
+def suggest_matches(index, query, limit):
+    index.ensure_loaded(lambda: get_db_connection(readonly=True))
+    return index.search(query, limit)
+
 @app.route('/api/units', methods=['GET'])
 def get_units():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM Units ORDER BY name")
-    units = [row['name'] for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(units)
+    return reference_response(units)
 
 @app.route('/api/invoice_prefixes', methods=['GET'])
 def get_invoice_prefixes():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM Invoice_Prefixes ORDER BY is_default DESC, prefix DESC")
-    prefixes = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(prefixes)
+    return reference_response(invoice_prefixes)
 
 @app.route('/api/latest_invoice_number', methods=['GET'])
 def get_latest_invoice_number():
+    """Returns the number the next invoice for `prefix` will get.
+
+    This only peeks at the prefix's counter: the number is allocated when the invoice is
+    saved, so two people opening the new-invoice screen at once see the same suggestion
+    but still end up with different numbers.
+    """
     prefix = request.args.get('prefix')
     if not prefix:
         return jsonify({'error': 'Prefix is required'}), 400
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = "SELECT invoice_no FROM Invoices WHERE invoice_no LIKE ? ORDER BY CAST(SUBSTR(invoice_no, INSTR(invoice_no, '/') + 1) AS INTEGER) DESC LIMIT 1"
-    cursor.execute(query, (f'{prefix}%',))
-    last_invoice = cursor.fetchone()
-    next_num = 1
-    if last_invoice:
-        last_num_str = re.search(r'/(\d+)$', last_invoice['invoice_no'])
-        if last_num_str:
-            next_num = int(last_num_str.group(1)) + 1
+    conn = get_db_connection(readonly=True)
+    next_num = peek_invoice_number(conn, prefix)
     conn.close()
     return jsonify({'next_number': f"{next_num:04d}"})
 
+@app.route('/api/invoice_numbers/reserve', methods=['POST'])
+def reserve_invoice_number_block():
+    """Reserves a block of consecutive invoice numbers for a prefix, for clients that number invoices themselves.
+
+    Body: {"prefix": "FY25-26/", "count": 100}. The numbers are never handed out again,
+    whether or not the client ends up using them.
+    """
+    data = request.get_json(silent=True) or {}
+    prefix = data.get('prefix')
+    count = data.get('count', 1)
+    if not prefix:
+        return jsonify({'error': 'Prefix is required'}), 400
+    if not isinstance(count, int) or not 1 <= count <= MAX_RESERVED_INVOICE_NUMBERS:
+        return jsonify({'error': f'count must be an integer from 1 to {MAX_RESERVED_INVOICE_NUMBERS}'}), 400
+
+    conn = get_db_connection()
+    try:
+        first = reserve_invoice_numbers(conn, prefix, count)
+        conn.commit()
+        invoice_prefixes.invalidate()  # the prefix may be new
+    except Exception as e:
+        conn.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+    return jsonify({
+        'prefix': prefix, 'count': count,
+        'first_number': first, 'last_number': first + count - 1,
+        'first_invoice_no': format_invoice_number(prefix, first),
+        'last_invoice_no': format_invoice_number(prefix, first + count - 1),
+    }), 201
+
+def compute_invoice_amounts(conn, data):
+    """Returns the invoice payload with every line and total recomputed by tax_engine.
+
+    Whether the supply pays CGST+SGST or IGST follows from the customer's place of supply
+    and the state in the business GSTIN. Raises TaxError for amounts that cannot be taxed.
+    """
+    customer = conn.execute("SELECT place_of_supply FROM Customers WHERE id = ?", (data['customer_id'],)).fetchone()
+    if customer is None:
+        raise TaxError(f"Customer {data['customer_id']} does not exist")
+    business = business_profile.get(conn)
+    return apply_to_invoice(data, is_inter_state(business.get('gstin'), customer['place_of_supply']))
+
 @app.route('/api/invoices', methods=['POST'])
 def create_invoice():
-    """Creates a new invoice and its associated items."""
+    """Creates a new invoice and its associated items.
+
+    Send `prefix` without `invoice_no` to have the next number for that prefix allocated
+    in the same transaction as the insert; the number used is returned as `invoice_no`.
+    """
     data = request.get_json()
     if not data or not data.get('customer_id') or not data.get('items'):
         return jsonify({'error': 'Missing required invoice data'}), 400
+    if not data.get('invoice_no') and not data.get('prefix'):
+        return jsonify({'error': 'Either invoice_no or prefix is required'}), 400
 
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        # Insert into Invoices table
-        cursor.execute("""
-            INSERT INTO Invoices (invoice_no, date, customer_id, sale_type, notes, 
-                                  total_value, taxable_value, cgst, sgst, igst, cess, round_off, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data['invoice_no'], data['date'], data['customer_id'], data.get('sale_type', 'CASH'),
-            data.get('notes'), data['total_value'], data['taxable_value'], data['cgst'],
-            data['sgst'], data.get('igst', 0), data.get('cess', 0), data['round_off'], 'PAID'
-        ))
-        invoice_id = cursor.lastrowid
-
-        # Insert into Invoice_Items table
-        items_to_insert = []
-        for item in data['items']:
-            items_to_insert.append((
-                invoice_id, item['item_id'], item.get('quantity', 1), item.get('free_quantity', 0),
-                item.get('unit', 'PCS'), item['price_per_unit'], item.get('discount', 0),
-                item['gst_rate'], item['cgst_amount'], item['sgst_amount'], item.get('igst_amount', 0),
-                item.get('cess_amount', 0), item['total_amount'], item.get('hsn_code')
-            ))
-
-        cursor.executemany("""
-            INSERT INTO Invoice_Items (invoice_id, item_id, quantity, free_quantity, unit, 
-                                       price_per_unit, discount, gst_rate, cgst_amount, 
-                                       sgst_amount, igst_amount, cess_amount, total_amount, hsn_code)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, items_to_insert)
-
+        data = compute_invoice_amounts(conn, data)
+        if data.get('invoice_no'):
+            record_invoice_number(conn, data['invoice_no'])
+        else:
+            data['invoice_no'] = format_invoice_number(data['prefix'], reserve_invoice_numbers(conn, data['prefix']))
+        invoice_id = insert_invoice(cursor, data)
+        sales_rollup.refresh_days(conn, [data['date']])
+        customer_stats.refresh_customers(conn, [data['customer_id']])
         conn.commit()
-        return jsonify({'message': 'Invoice created successfully', 'invoice_id': invoice_id}), 201
+        analytics_store.invoices_changed([invoice_id])
+        if data.get('prefix'):
+            invoice_prefixes.invalidate()  # the prefix may be new
+        return jsonify({'message': 'Invoice created successfully', 'invoice_id': invoice_id,
+                        'invoice_no': data['invoice_no']}), 201
+    except TaxError as e:
+        conn.rollback()
+        return jsonify({'error': str(e)}), 400
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        return jsonify({'error': f"Invoice number {data['invoice_no']} is already in use"}), 409
     except Exception as e:
         conn.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
 
+@app.route('/api/invoices/bulk', methods=['POST'])
+def bulk_import_invoices():
+    """Imports many invoices from a JSON array or an NDJSON upload (Content-Type: application/x-ndjson).
+
+    Records are validated and inserted in transactions of `chunk_size` invoices; records
+    without an invoice_no get the next numbers for their `prefix` (or the `prefix` query
+    argument). Invalid records are reported by index and do not stop the import.
+    """
+    try:
+        chunk_size = min(max(int(request.args.get('chunk_size', IMPORT_CHUNK_SIZE)), 1), MAX_IMPORT_CHUNK_SIZE)
+    except ValueError:
+        return jsonify({'error': 'chunk_size must be an integer'}), 400
+
+    if request.mimetype == 'application/x-ndjson':
+        # Read line by line so the upload is never held in memory whole; the buffer makes
+        # readline cheap on the raw WSGI input stream.
+        records = iter_ndjson(io.BufferedReader(request.stream, 256 * 1024))
+    else:
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            return jsonify({'error': 'Expected a JSON array of invoices or an NDJSON body'}), 400
+
+    conn = get_db_connection()
+    summary = import_invoices(conn, records, chunk_size, request.args.get('prefix'))
+    conn.close()
+    invoice_prefixes.invalidate()  # imports may have started new prefixes
+    return jsonify(summary), 200 if summary['imported'] or not summary['failed'] else 400
+
+def load_invoice_details(conn, invoice_id):
+    """Returns an invoice with its customer and line items, or None if there is no such invoice."""
+    invoice = conn.execute('SELECT * FROM Invoices WHERE id = ?', (invoice_id,)).fetchone()
+    if not invoice:
+        return None
+
+    customer = conn.execute('SELECT * FROM Customers WHERE id = ?', (invoice['customer_id'],)).fetchone()
+    items = conn.execute("""
+        SELECT ii.*, i.name as item_name, i.default_mrp
+        FROM Invoice_Items ii
+        JOIN Items i ON ii.item_id = i.id
+        WHERE ii.invoice_id = ?
+    """, (invoice_id,)).fetchall()
+    return {
+        'invoice': dict(invoice),
+        'customer': dict(customer),
+        'items': [dict(item) for item in items]
+    }
+
 @app.route('/api/invoices/<int:invoice_id>', methods=['GET'])
 def get_invoice_details(invoice_id):
     """Fetches full details for a single invoice for editing."""
     try:
-        conn = get_db_connection()
-        # Fetch main invoice details
-        invoice = conn.execute('SELECT * FROM Invoices WHERE id = ?', (invoice_id,)).fetchone()
-        if not invoice:
-            return jsonify({'error': 'Invoice not found'}), 404
-
-        # Fetch customer details
-        customer = conn.execute('SELECT * FROM Customers WHERE id = ?', (invoice['customer_id'],)).fetchone()
-        
-        # Fetch invoice items
-        items = conn.execute("""
-            SELECT ii.*, i.name as item_name, i.default_mrp
-            FROM Invoice_Items ii
-            JOIN Items i ON ii.item_id = i.id
-            WHERE ii.invoice_id = ?
-        """, (invoice_id,)).fetchall()
-
+        conn = get_db_connection(readonly=True)
+        details = load_invoice_details(conn, invoice_id)
         conn.close()
-
-        # Prepare the response
-        response_data = {
-            'invoice': dict(invoice),
-            'customer': dict(customer),
-            'items': [dict(item) for item in items]
-        }
-        return jsonify(response_data)
+        if details is None:
+            return jsonify({'error': 'Invoice not found'}), 404
+        return jsonify(details)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/invoices/<int:invoice_id>', methods=['PUT'])
 def update_invoice(invoice_id):
-    """Updates an existing invoice."""
+    """Updates an existing invoice.
+
+    Lines sent with their `id` (as returned by GET /api/invoices/<id>) are updated in place
+    when they changed, lines without one are added, and stored lines that are not sent are
+    removed. Send the invoice's `version` to have the save refused with 409 if someone else
+    saved the invoice since it was loaded; the response carries the new version.
+    """
     data = request.get_json()
     if not data or not data.get('customer_id') or not data.get('items'):
         return jsonify({'error': 'Missing required invoice data'}), 400
+    try:
+        version = None if data.get('version') is None else int(data['version'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'version must be an integer'}), 400
 
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
+        data = compute_invoice_amounts(conn, data)
+
         # Start a transaction
-        cursor.execute("BEGIN TRANSACTION;")
-
-        # 1. Delete old invoice items
-        cursor.execute("DELETE FROM Invoice_Items WHERE invoice_id = ?", (invoice_id,))
-
-        # 2. Update the main invoice table
-        cursor.execute("""
-            UPDATE Invoices 
-            SET invoice_no = ?, date = ?, customer_id = ?, sale_type = ?, notes = ?, 
-                total_value = ?, taxable_value = ?, cgst = ?, sgst = ?, igst = ?, 
-                cess = ?, round_off = ?, status = ?
-            WHERE id = ?
-        """, (
+        cursor.execute("BEGIN IMMEDIATE")
+
+        previous = cursor.execute("SELECT date, customer_id, version FROM Invoices WHERE id = ?", (invoice_id,)).fetchone()
+        if previous is None:
+            conn.rollback()
+            return jsonify({'error': 'Invoice not found'}), 404
+
+        # 1. Update the main invoice table, only if it is still at the version the client loaded
+        values = (
             data['invoice_no'], data['date'], data['customer_id'], data.get('sale_type', 'CASH'),
             data.get('notes'), data['total_value'], data['taxable_value'], data['cgst'],
             data['sgst'], data.get('igst', 0), data.get('cess', 0), data['round_off'], 'PAID',
             invoice_id
-        ))
-
-        # 3. Insert the new/updated invoice items
-        items_to_insert = []
-        for item in data['items']:
-            items_to_insert.append((
-                invoice_id, item['item_id'], item.get('quantity', 1), item.get('free_quantity', 0),
-                item.get('unit', 'PCS'), item['price_per_unit'], item.get('discount', 0),
-                item['gst_rate'], item['cgst_amount'], item['sgst_amount'], item.get('igst_amount', 0),
-                item.get('cess_amount', 0), item['total_amount'], item.get('hsn_code')
-            ))
-
-        cursor.executemany("""
-            INSERT INTO Invoice_Items (invoice_id, item_id, quantity, free_quantity, unit, 
-                                       price_per_unit, discount, gst_rate, cgst_amount, 
-                                       sgst_amount, igst_amount, cess_amount, total_amount, hsn_code)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, items_to_insert)
+        )
+        if version is None:
+            cursor.execute(UPDATE_INVOICE_SQL, values)
+        else:
+            cursor.execute(UPDATE_INVOICE_SQL + " AND version = ?", values + (version,))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return jsonify({'error': 'The invoice was changed by someone else; reload it and try again',
+                            'version': previous['version']}), 409
+
+        # 2. Apply the line changes
+        lines = save_invoice_lines(conn, invoice_id, data['items'])
+        record_invoice_number(conn, data['invoice_no'])
+
+        # 3. Refresh the sales rollup for the old and new invoice dates, and the stats of the old and new customer
+        sales_rollup.refresh_days(conn, [data['date'], previous['date']])
+        customer_stats.refresh_customers(conn, [data['customer_id'], previous['customer_id']])
 
         conn.commit()
-        return jsonify({'message': 'Invoice updated successfully', 'invoice_id': invoice_id}), 200
+        pdf_cache.invalidate_invoice(invoice_id)
+        analytics_store.invoices_changed([invoice_id])
+        return jsonify({'message': 'Invoice updated successfully', 'invoice_id': invoice_id,
+                        'version': previous['version'] + 1, 'lines': lines}), 200
+    except (TaxError, ValueError) as e:
+        conn.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         conn.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
 
-
 if __name__ == '__main__':
-    print("Starting Flask server...")
+    # Development only: single process, with the reloader and debugger. For production,
+    # run `gunicorn -c gunicorn.conf.py` (see the README).
+    print("Starting Flask development server...")
     app.run(debug=True, port=5000)
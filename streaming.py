@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+FETCH_BATCH_SIZE = 500
+
+
+class ChunkBuffer(io.RawIOBase):
+    """A write-only, non-seekable sink that collects bytes until they are drained.
+
+    Handing this to zipfile makes it emit entries with data descriptors, so an archive
+    can be sent to the client piece by piece without ever being held in memory whole.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_STORED):
+    """Yields a ZIP archive chunk by chunk from an iterable of (filename, bytes) pairs."""
+    buffer = ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=compression) as archive:
+        for filename, data in entries:
+            archive.writestr(filename, data)
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def iter_batches(cursor, batch_size=FETCH_BATCH_SIZE):
+    """Yields the rows of an executed cursor batch_size rows at a time."""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def stream_ndjson(batches):
+    """Yields one newline-delimited JSON chunk per batch of sqlite3.Row rows."""
+    for batch in batches:
+        yield ''.join(json.dumps(dict(row), default=str) + '\n' for row in batch)
+
+
+def stream_json_array(batches):
+    """Yields a JSON array piece by piece; the concatenated output equals json.dumps(all_rows)."""
+    yield '['
+    separator = ''
+    for batch in batches:
+        yield separator + ', '.join(json.dumps(dict(row), default=str) for row in batch)
+        separator = ', '
+    yield ']'
+
+
+def stream_csv(header, batches):
+    """Yields a CSV file one chunk per batch; rows are written as-is, in column order, after `header`.
+
+    The output starts with a UTF-8 byte-order mark so Excel opens it with the right encoding.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield '\ufeff' + buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+# --- Minimal XLSX (SpreadsheetML) writer ---
+# An .xlsx file is a ZIP of XML parts. Only the worksheet grows with the data, so it is
+# written as a single streamed ZIP entry; strings are stored inline so no shared-string
+# table has to be built up in memory.
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+# Control characters are not allowed in XML 1.0 text.
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value!r}</v></c>'
+    text = escape(_XML_ILLEGAL.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(values):
+    return '<row>' + ''.join(xlsx_cell(value) for value in values) + '</row>'
+
+
+def stream_xlsx(sheet_name, header, batches):
+    """Yields a single-sheet .xlsx workbook chunk by chunk; rows are written in column order after `header`."""
+    buffer = ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(sheet_name=escape(sheet_name, {'"': '&quot;'})))
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((XLSX_SHEET_START + xlsx_row(header)).encode('utf-8'))
+            yield buffer.drain()
+            for batch in batches:
+                sheet.write(''.join(map(xlsx_row, batch)).encode('utf-8'))
+                yield buffer.drain()
+            sheet.write(XLSX_SHEET_END.encode('utf-8'))
+    yield buffer.drain()
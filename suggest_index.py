@@ -0,0 +1,220 @@
+"""In-memory prefix index behind the invoice editor's customer and item pickers.
+
+Every searchable field is split into lower-cased word tokens: customer names, phones
+and GSTINs, and item names and HSN codes. Each token goes into one sorted list, next
+to a parallel list of record ids. A lookup is a bisect to the first token starting
+with the query, followed by a short walk along the list, with no SQLite round trip.
+Queries with several words must match a token prefix for every word, so "sha tra"
+finds "Sharma Traders".
+
+The index loads lazily on the first lookup. It reloads in full after `max_age`
+seconds, which picks up writes from other processes. Writes made through the API
+update it in place with upsert() and remove().
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_MAX_AGE = 300
+# Word-index entries examined per lookup; bounds the work for short, common words.
+SCAN_LIMIT = 500
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).casefold()) if text else []
+
+
+def customer_tokens(record):
+    tokens = tokenize(record.get('name'))
+    phone = re.sub(r'\D', '', record.get('phone') or '')
+    if phone:
+        # Both the full number and the local 10 digits, so "+91 98..." and "98..." both match.
+        tokens += [phone, phone[-10:]]
+    if record.get('gstin'):
+        tokens.append(record['gstin'].casefold())
+    return tokens
+
+
+def item_tokens(record):
+    return tokenize(record.get('name')) + tokenize(record.get('hsn_code'))
+
+
+def name_key(record):
+    return ' '.join(tokenize(record.get('name')))
+
+
+def insert_sorted(keys, ids, key, record_id):
+    position = bisect_left(keys, key)
+    keys.insert(position, key)
+    ids.insert(position, record_id)
+
+
+def delete_sorted(keys, ids, key, record_id):
+    position = bisect_left(keys, key)
+    while position < len(keys) and keys[position] == key:
+        if ids[position] == record_id:
+            del keys[position]
+            del ids[position]
+            return
+        position += 1
+
+
+class SuggestIndex:
+    """A sorted token -> record id index over one table, with `fields` of each record kept for display.
+
+    Alongside the word tokens there is a second sorted list of whole names, so the
+    common case (typing a name from its first letter) is one contiguous range that is
+    already in display order.
+    """
+
+    def __init__(self, name, table, fields, tokens, max_age=DEFAULT_MAX_AGE):
+        self.name = name
+        self.fields = fields
+        self.query = f"SELECT {', '.join(fields)} FROM {table}"
+        self.tokens = tokens
+        self.max_age = max_age
+        self._keys = []           # sorted word tokens
+        self._ids = []            # record id for each token, parallel to _keys
+        self._name_keys = []      # sorted normalised names
+        self._name_ids = []       # parallel to _name_keys
+        self._records = {}        # id -> record dict
+        self._record_tokens = {}  # id -> tokens, for removal and multi-word matching
+        self._loaded_at = None
+        self._journal = None      # writes seen while a load is reading the table
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def load(self, conn):
+        """Rebuilds the index from the table.
+
+        Writes that arrive while the table is being read are journaled and replayed
+        onto the new index, so a concurrent upsert() is never lost.
+        """
+        with self._lock:
+            self._journal = []
+        records = {row['id']: dict(row) for row in conn.execute(self.query)}
+        record_tokens = {record_id: set(self.tokens(record)) for record_id, record in records.items()}
+        pairs = sorted((token, record_id) for record_id, tokens in record_tokens.items() for token in tokens)
+        names = sorted((name_key(record), record_id) for record_id, record in records.items())
+        with self._lock:
+            self._keys = [token for token, _ in pairs]
+            self._ids = [record_id for _, record_id in pairs]
+            self._name_keys = [key for key, _ in names]
+            self._name_ids = [record_id for _, record_id in names]
+            self._records = records
+            self._record_tokens = record_tokens
+            journal, self._journal = self._journal, None
+            for record, record_id in journal:
+                if record is None:
+                    self._remove_locked(record_id)
+                else:
+                    self._upsert_locked(record)
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, connect):
+        """Loads (or reloads, once `max_age` has passed) using a connection from `connect()`."""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age:
+            return
+        with self._load_lock:
+            # Another thread may have finished loading while this one waited.
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age:
+                return
+            conn = connect()
+            try:
+                self.load(conn)
+            finally:
+                conn.close()
+
+    def _remove_locked(self, record_id):
+        record = self._records.pop(record_id, None)
+        if record is None:
+            return
+        for token in self._record_tokens.pop(record_id):
+            delete_sorted(self._keys, self._ids, token, record_id)
+        delete_sorted(self._name_keys, self._name_ids, name_key(record), record_id)
+
+    def _upsert_locked(self, record):
+        self._remove_locked(record['id'])
+        tokens = set(self.tokens(record))
+        for token in tokens:
+            insert_sorted(self._keys, self._ids, token, record['id'])
+        insert_sorted(self._name_keys, self._name_ids, name_key(record), record['id'])
+        self._records[record['id']] = record
+        self._record_tokens[record['id']] = tokens
+
+    def upsert(self, record):
+        """Adds or replaces one record (a row with at least `fields`) after it was written to the table."""
+        record = {field: record[field] for field in self.fields}
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((record, record['id']))
+            if self._loaded_at is not None:
+                self._upsert_locked(record)
+
+    def remove(self, record_id):
+        """Drops one record after it was deleted from the table."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((None, record_id))
+            if self._loaded_at is not None:
+                self._remove_locked(record_id)
+
+    def search(self, query, limit=10):
+        """Returns up to `limit` records whose tokens start with every word of `query`.
+
+        Records whose name starts with the query come first (in name order), then other
+        matches such as a later word of the name, a phone number or a GSTIN.
+        """
+        words = tokenize(query)
+        query_text = ' '.join(words)
+        with self._lock:
+            records = self._records
+            results = []
+            position = bisect_left(self._name_keys, query_text)
+            while (len(results) < limit and position < len(self._name_keys)
+                   and self._name_keys[position].startswith(query_text)):
+                results.append(self._name_ids[position])
+                position += 1
+            if len(results) == limit or not words:
+                return [records[record_id] for record_id in results]
+
+            # Walk the narrowest word's range (two bisects per word to size them) and
+            # check the remaining words against each candidate's tokens.
+            ranges = []
+            for word in words:
+                low = bisect_left(self._keys, word)
+                high = bisect_left(self._keys, word + '\U0010ffff', low)
+                ranges.append((high - low, low, high, word))
+            _, low, high, anchor = min(ranges)
+            others = [word for word in words if word != anchor]
+            seen = set(results)
+            extra = []
+            for position in range(low, min(high, low + SCAN_LIMIT)):
+                record_id = self._ids[position]
+                if record_id in seen:
+                    continue
+                seen.add(record_id)
+                record_tokens = self._record_tokens[record_id]
+                if all(any(token.startswith(word) for token in record_tokens) for word in others):
+                    extra.append(records[record_id])
+                    if len(results) + len(extra) == limit:
+                        break
+        extra.sort(key=lambda record: str(record.get('name') or '').casefold())
+        return [records[record_id] for record_id in results] + extra
+
+    def stats(self):
+        with self._lock:
+            return {'records': len(self._records), 'tokens': len(self._keys),
+                    'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None}
+
+
+customers = SuggestIndex(
+    'customers', 'Customers', ('id', 'name', 'phone', 'gstin', 'address', 'place_of_supply'), customer_tokens)
+items = SuggestIndex(
+    'items', 'Items', ('id', 'name', 'hsn_code', 'default_unit', 'default_mrp', 'default_sale_price',
+                       'default_tax_rate', 'inclusive_of_tax'), item_tokens)
+
+INDEXES = {index.name: index for index in (customers, items)}
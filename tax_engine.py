@@ -0,0 +1,293 @@
+"""GST and invoice-total calculations: one set of rules for the API, the importer and the seeder.
+
+Rules (matching what invoice.js shows while an invoice is being edited):
+
+* A line's price is tax-exclusive unless `inclusive_of_tax` is set, in which case the
+  tax is taken out first: base = price * 100 / (100 + rate).
+* Line taxable value = round(base * quantity) - line discount (an amount, not a percent).
+* Intra-state supplies pay CGST and SGST of rate/2 each; inter-state supplies (the
+  customer's place of supply is not the business's state) pay IGST at the full rate.
+  Each is rounded to the paisa per line. Cess is passed through as an amount.
+* An invoice-level discount comes off the taxable value. It is shared between the
+  tax-rate slabs in proportion to their taxable value, and each slab's tax is reduced
+  by the tax on its share, so without a discount the invoice tax is exactly the sum of
+  the line taxes (which is what the PDF tax summary adds up).
+* The grand total is rounded to the rupee; round_off is the difference.
+
+All rounding is half-up. compute_invoice() works on Decimals for one invoice.
+compute_batch() applies the same rules with NumPy to many invoices at once, in
+integer paise, and returns identical amounts.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+PAISA = Decimal('0.01')
+RUPEE = Decimal('1')
+HUNDRED = Decimal('100')
+
+GST_STATE_CODES = {
+    '01': 'Jammu and Kashmir', '02': 'Himachal Pradesh', '03': 'Punjab', '04': 'Chandigarh',
+    '05': 'Uttarakhand', '06': 'Haryana', '07': 'Delhi', '08': 'Rajasthan', '09': 'Uttar Pradesh',
+    '10': 'Bihar', '11': 'Sikkim', '12': 'Arunachal Pradesh', '13': 'Nagaland', '14': 'Manipur',
+    '15': 'Mizoram', '16': 'Tripura', '17': 'Meghalaya', '18': 'Assam', '19': 'West Bengal',
+    '20': 'Jharkhand', '21': 'Odisha', '22': 'Chhattisgarh', '23': 'Madhya Pradesh', '24': 'Gujarat',
+    '25': 'Daman and Diu', '26': 'Dadra and Nagar Haveli', '27': 'Maharashtra',
+    '28': 'Andhra Pradesh (Old)', '29': 'Karnataka', '30': 'Goa', '31': 'Lakshadweep', '32': 'Kerala',
+    '33': 'Tamil Nadu', '34': 'Puducherry', '35': 'Andaman and Nicobar Islands', '36': 'Telangana',
+    '37': 'Andhra Pradesh (New)', '97': 'Other Territory',
+}
+
+# The batch API multiplies integer paise by quantities and rates; inputs beyond this
+# (about ₹92 crore per line) would overflow int64 and must go through compute_invoice().
+MAX_BATCH_PRODUCT = 2 ** 62
+
+
+class TaxError(ValueError):
+    """Raised for line or invoice values that cannot be taxed (e.g. a discount larger than the amount)."""
+
+
+def business_state(gstin):
+    """The state a GSTIN is registered in (its first two digits), or None if unknown."""
+    return GST_STATE_CODES.get((gstin or '')[:2])
+
+
+def is_inter_state(business_gstin, place_of_supply):
+    """True if the supply goes to another state (IGST). Unknown states are treated as intra-state."""
+    state = business_state(business_gstin)
+    return bool(state and place_of_supply and place_of_supply.strip().lower() != state.lower())
+
+
+def to_decimal(value):
+    return Decimal(str(value or 0))
+
+
+def round_paise(value):
+    return value.quantize(PAISA, rounding=ROUND_HALF_UP)
+
+
+def compute_line(item, inter_state=False):
+    """Returns the stored amounts for one line as Decimals (price_per_unit is the tax-exclusive price)."""
+    quantity = to_decimal(item.get('quantity', 1))
+    price = to_decimal(item.get('price_per_unit'))
+    rate = to_decimal(item.get('gst_rate'))
+    discount = round_paise(to_decimal(item.get('discount')))
+    if quantity < 0 or price < 0 or rate < 0 or discount < 0:
+        raise TaxError('Quantity, price, tax rate and discount cannot be negative')
+
+    if item.get('inclusive_of_tax'):
+        base_price = price * HUNDRED / (HUNDRED + rate)
+        gross = price * quantity * HUNDRED / (HUNDRED + rate)
+    else:
+        base_price = price
+        gross = price * quantity
+    gross = round_paise(gross)
+    taxable = gross - discount
+    if taxable < 0:
+        raise TaxError('Line discount is larger than the line amount')
+
+    if inter_state:
+        cgst = sgst = Decimal('0.00')
+        igst = round_paise(taxable * rate / HUNDRED)
+    else:
+        cgst = sgst = round_paise(taxable * rate / 200)
+        igst = Decimal('0.00')
+    cess = round_paise(to_decimal(item.get('cess_amount')))
+    return {
+        'price_per_unit': round_paise(base_price),
+        'discount': discount,
+        'gross': gross,
+        'taxable_value': taxable,
+        'cgst_amount': cgst,
+        'sgst_amount': sgst,
+        'igst_amount': igst,
+        'cess_amount': cess,
+        'total_amount': taxable + cgst + sgst + igst + cess,
+    }
+
+
+def compute_invoice(items, discount=0, inter_state=False):
+    """Computes every line and the invoice totals for one invoice; all amounts are Decimals.
+
+    Returns {'items': [line amounts...], 'sub_total', 'discount', 'taxable_value', 'cgst',
+    'sgst', 'igst', 'cess', 'round_off', 'total_value'}.
+    """
+    lines = [compute_line(item, inter_state) for item in items]
+    discount = round_paise(to_decimal(discount))
+    line_taxable = sum((line['taxable_value'] for line in lines), Decimal('0.00'))
+    if discount < 0 or discount > line_taxable:
+        raise TaxError('Invoice discount must be between zero and the taxable value')
+
+    cgst = sum((line['cgst_amount'] for line in lines), Decimal('0.00'))
+    sgst = sum((line['sgst_amount'] for line in lines), Decimal('0.00'))
+    igst = sum((line['igst_amount'] for line in lines), Decimal('0.00'))
+    cess = sum((line['cess_amount'] for line in lines), Decimal('0.00'))
+
+    if discount:
+        slabs = {}
+        for item, line in zip(items, lines):
+            rate = to_decimal(item.get('gst_rate'))
+            slabs[rate] = slabs.get(rate, Decimal('0.00')) + line['taxable_value']
+        for rate, slab_taxable in slabs.items():
+            share = round_paise(discount * slab_taxable / line_taxable)
+            if inter_state:
+                igst -= round_paise(share * rate / HUNDRED)
+            else:
+                reduction = round_paise(share * rate / 200)
+                cgst -= reduction
+                sgst -= reduction
+
+    taxable_value = line_taxable - discount
+    exact_total = taxable_value + cgst + sgst + igst + cess
+    total_value = exact_total.quantize(RUPEE, rounding=ROUND_HALF_UP)
+    return {
+        'items': lines,
+        'sub_total': sum((line['gross'] for line in lines), Decimal('0.00')),
+        'discount': discount,
+        'taxable_value': taxable_value,
+        'cgst': cgst,
+        'sgst': sgst,
+        'igst': igst,
+        'cess': cess,
+        'round_off': total_value - exact_total,
+        'total_value': total_value,
+    }
+
+
+def apply_to_invoice(data, inter_state=False):
+    """Returns a copy of an invoice payload with every amount replaced by the computed one.
+
+    Amounts are converted to float for storage; the client's own totals are ignored.
+    """
+    result = compute_invoice(data['items'], data.get('discount', 0), inter_state)
+    invoice = dict(data)
+    for field in ('taxable_value', 'cgst', 'sgst', 'igst', 'cess', 'round_off', 'total_value'):
+        invoice[field] = float(result[field])
+    invoice['items'] = []
+    for item, line in zip(data['items'], result['items']):
+        item = dict(item)
+        for field in ('price_per_unit', 'discount', 'cgst_amount', 'sgst_amount', 'igst_amount',
+                      'cess_amount', 'total_amount'):
+            item[field] = float(line[field])
+        invoice['items'].append(item)
+    return invoice
+
+
+# --- Vectorized batch mode ---
+
+def _to_int(values, scale):
+    import numpy as np
+
+    # Inputs are decimal amounts (prices in rupees, rates in percent, quantities); scaling and
+    # rounding gives the exact integer the Decimal path would see for up to 2 (or 3) decimals.
+    return np.rint(np.asarray(values, dtype=np.float64) * scale).astype(np.int64)
+
+
+def _round_div(numerator, denominator):
+    """Half-up rounded numerator / denominator for non-negative int64 arrays."""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def compute_batch(lines, invoices):
+    """Computes many invoices at once; same rules and results as compute_invoice().
+
+    `lines` is a mapping of equal-length sequences, one entry per line: 'invoice' (the
+    0-based position of its invoice), 'quantity', 'price_per_unit', 'gst_rate' and,
+    optionally, 'discount', 'cess_amount' and 'inclusive_of_tax'. `invoices` holds
+    per-invoice 'inter_state' and, optionally, 'discount'. Quantities may have up to
+    3 decimals and amounts up to 2.
+
+    Returns (line_amounts, invoice_totals, errors): dicts of float arrays in rupees
+    with the same keys compute_invoice() returns, and a boolean array marking invoices
+    whose values cannot be taxed (their amounts are meaningless).
+    """
+    # NumPy is imported on first use, so API processes that never import in bulk never load it.
+    import numpy as np
+
+    invoice_index = np.asarray(lines['invoice'], dtype=np.int64)
+    line_count = len(invoice_index)
+    inter_state = np.asarray(invoices['inter_state'], dtype=bool)
+    invoice_count = len(inter_state)
+
+    def column(source, key, count):
+        return source[key] if key in source else np.zeros(count)
+
+    quantity = _to_int(lines['quantity'], 1000)
+    price = _to_int(lines['price_per_unit'], 100)
+    rate = _to_int(lines['gst_rate'], 100)
+    line_discount = _to_int(column(lines, 'discount', line_count), 100)
+    cess = _to_int(column(lines, 'cess_amount', line_count), 100)
+    inclusive = np.asarray(column(lines, 'inclusive_of_tax', line_count), dtype=bool)
+    invoice_discount = _to_int(column(invoices, 'discount', invoice_count), 100)
+
+    if line_count and (np.max(price * np.maximum(quantity, 1), initial=0) > MAX_BATCH_PRODUCT // 10 ** 6):
+        raise TaxError('Amounts are too large for batch mode; use compute_invoice()')
+
+    # Base price and gross amount, in paise; inclusive prices have the tax taken out.
+    tax_divisor = np.where(inclusive, 10000 + rate, 10000)
+    base_price = _round_div(price * 10000, tax_divisor)
+    gross = _round_div(price * quantity * 10000, tax_divisor * 1000)
+    taxable = gross - line_discount
+
+    line_inter_state = inter_state[invoice_index]
+    safe_taxable = np.maximum(taxable, 0)
+    half_tax = _round_div(safe_taxable * rate, 20000)
+    cgst = np.where(line_inter_state, 0, half_tax)
+    igst = np.where(line_inter_state, _round_div(safe_taxable * rate, 10000), 0)
+    total = taxable + 2 * cgst + igst + cess
+
+    bad_line = (quantity < 0) | (price < 0) | (rate < 0) | (line_discount < 0) | (taxable < 0)
+    errors = np.bincount(invoice_index, weights=bad_line, minlength=invoice_count) > 0
+
+    def per_invoice(values):
+        return np.bincount(invoice_index, weights=values, minlength=invoice_count).astype(np.int64)
+
+    line_taxable = per_invoice(taxable)
+    invoice_cgst = per_invoice(cgst)
+    invoice_igst = per_invoice(igst)
+    errors |= (invoice_discount < 0) | (invoice_discount > line_taxable)
+
+    # Invoice discount: share it across (invoice, rate) slabs and take the tax on each share off.
+    discounted = (invoice_discount > 0) & ~errors
+    if discounted.any():
+        slab_lines = discounted[invoice_index]
+        slab_keys, slab_of_line = np.unique(
+            np.stack([invoice_index[slab_lines], rate[slab_lines]], axis=1), axis=0, return_inverse=True)
+        slab_of_line = slab_of_line.reshape(-1)
+        slab_invoice, slab_rate = slab_keys[:, 0], slab_keys[:, 1]
+        slab_taxable = np.bincount(slab_of_line, weights=taxable[slab_lines]).astype(np.int64)
+        if np.max(invoice_discount[slab_invoice] * slab_taxable.astype(np.float64)) > MAX_BATCH_PRODUCT // 10:
+            raise TaxError('Amounts are too large for batch mode; use compute_invoice()')
+        share = _round_div(invoice_discount[slab_invoice] * slab_taxable, line_taxable[slab_invoice])
+        slab_inter_state = inter_state[slab_invoice]
+        cgst_reduction = np.where(slab_inter_state, 0, _round_div(share * slab_rate, 20000))
+        igst_reduction = np.where(slab_inter_state, _round_div(share * slab_rate, 10000), 0)
+        invoice_cgst -= np.bincount(slab_invoice, weights=cgst_reduction, minlength=invoice_count).astype(np.int64)
+        invoice_igst -= np.bincount(slab_invoice, weights=igst_reduction, minlength=invoice_count).astype(np.int64)
+
+    invoice_cess = per_invoice(cess)
+    taxable_value = line_taxable - invoice_discount
+    exact_total = taxable_value + 2 * invoice_cgst + invoice_igst + invoice_cess
+    total_value = _round_div(np.maximum(exact_total, 0), 100) * 100
+
+    line_amounts = {
+        'price_per_unit': base_price / 100,
+        'discount': line_discount / 100,
+        'gross': gross / 100,
+        'taxable_value': taxable / 100,
+        'cgst_amount': cgst / 100,
+        'sgst_amount': cgst / 100,
+        'igst_amount': igst / 100,
+        'cess_amount': cess / 100,
+        'total_amount': total / 100,
+    }
+    invoice_totals = {
+        'sub_total': per_invoice(gross) / 100,
+        'discount': invoice_discount / 100,
+        'taxable_value': taxable_value / 100,
+        'cgst': invoice_cgst / 100,
+        'sgst': invoice_cgst / 100,
+        'igst': invoice_igst / 100,
+        'cess': invoice_cess / 100,
+        'round_off': (total_value - exact_total) / 100,
+        'total_value': total_value / 100,
+    }
+    return line_amounts, invoice_totals, errors
@@ -0,0 +1,4 @@
+"""WSGI entry point for production servers: `gunicorn -c gunicorn.conf.py` (which points here)."""
+from server import app
+
+application = app